@@ -0,0 +1,340 @@
+"""Бенчмарк горячего пути: поток свечей -> handle_kline -> сигналы/позиции, индикаторы utils,
+simulate_realtime_pnl, проверка книги позиций, оптимизация и время импорта main.
+
+    python benchmark.py --symbols 20 --messages 20000 --output baseline.json
+    python benchmark.py --compare baseline.json          # код выхода 1 при регрессии
+
+Данные синтетические и детерминированные (--seed), поэтому результаты разных коммитов
+сравнимы между собой. Все файлы (кеш свечей, журнал позиций) пишутся во временный каталог.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import telegram_bot
+import binance_client
+import logger
+import pnl_utils
+from config import BBRSI_PARAM_GRID, BREAKOUT_PARAM_GRID, KLINES_LIMIT, OPT_SEARCH_BUDGET
+from data_store import (
+    klines_cache, indicators_cache, signals_cache, user_data_cache, indicator_matrix_cache
+)
+from event_bus import bus, CANDLE_UPDATED
+from kline_store import KlineStore
+from metrics import LatencyHistogram, histograms
+from import_profile import profile_imports, total_seconds
+from optimizer import optimize_symbols
+from utils import ema200, bol_h, bol_l, rsi
+
+STEP_MS = 300_000  # 5m
+
+
+# ---------- синтетические данные ----------
+def synthetic_klines(n: int, rng, start_price: float = 100.0, start_time: int = 0):
+    """(open_times, ohlcv (n, 5)) - геометрическое случайное блуждание"""
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.uniform(100, 1000, n)
+    open_times = start_time + np.arange(n, dtype=np.int64) * STEP_MS
+    return open_times, np.column_stack([open_, high, low, close, volume])
+
+
+def synthetic_stream(symbols, n_messages: int, updates_per_candle: int, rng, start_times: dict,
+                     last_close: dict, interval: str = "5m") -> list:
+    """Сообщения kline как в combined stream (поле data): каждые updates_per_candle
+    обновлений по символу свеча закрывается (k["x"]) и начинается следующая"""
+    state = {s: [start_times[s], last_close[s], last_close[s], last_close[s], last_close[s], 0]
+             for s in symbols}
+    picks = rng.integers(0, len(symbols), n_messages)
+    moves = np.exp(rng.normal(0, 0.001, n_messages))
+    messages = []
+    for i in range(n_messages):
+        s = symbols[picks[i]]
+        st = state[s]
+        t, o, h, l, c, count = st
+        c = c * moves[i]
+        h, l, count = max(h, c), min(l, c), count + 1
+        closed = count >= updates_per_candle
+        messages.append({"e": "kline", "E": t + count * 1000, "s": s, "k": {
+            "t": t, "i": interval, "o": f"{o:.8f}", "h": f"{h:.8f}", "l": f"{l:.8f}",
+            "c": f"{c:.8f}", "v": f"{count * 10:.3f}", "x": closed}})
+        st[:] = [t + STEP_MS, c, c, c, c, 0] if closed else [t, o, h, l, c, count]
+    return messages
+
+
+def reset_state():
+    klines_cache.clear()
+    indicators_cache.clear()
+    signals_cache.clear()
+    indicator_matrix_cache.clear()
+    user_data_cache["positions"].clear()
+    pnl_utils._states.clear()
+    logger.opened_positions.clear()
+    bus.clear()
+    histograms.clear()
+
+
+def seed_history(symbols, history: int, rng) -> tuple:
+    start_times, last_close = {}, {}
+    for i, s in enumerate(symbols):
+        open_times, ohlcv = synthetic_klines(history, rng, start_price=10.0 + i)
+        store = KlineStore(capacity=max(history, KLINES_LIMIT))
+        store.extend(open_times, ohlcv)
+        klines_cache[s] = store
+        start_times[s] = int(open_times[-1]) + STEP_MS
+        last_close[s] = float(ohlcv[-1, 3])
+    return start_times, last_close
+
+
+# ---------- сценарии ----------
+def bench_handle_kline(args, rng):
+    """Полный путь сообщения: KlineStore -> шина -> сигналы -> позиции/журнал"""
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    start_times, last_close = seed_history(symbols, args.history, rng)
+    messages = synthetic_stream(symbols, args.messages, args.updates_per_candle, rng,
+                                start_times, last_close)
+    bus.subscribe(CANDLE_UPDATED, binance_client.on_candle_update)
+    hist = LatencyHistogram()
+
+    async def run():
+        started = time.perf_counter()
+        for i, msg in enumerate(messages):
+            due = started + i / args.rate if args.rate else None
+            if due is not None:
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            t0 = time.perf_counter()
+            await binance_client.handle_kline(msg)
+            # при заданном темпе задержка считается от запланированного момента прихода
+            hist.record((time.perf_counter() - (due if due is not None else t0)) * 1e6)
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    return hist, len(messages), elapsed, "msg/s"
+
+
+def bench_indicators(args, rng):
+    """ema200 + bol_h + bol_l + rsi из utils на окне KLINES_LIMIT"""
+    arrays = [synthetic_klines(args.history, rng)[1][:, 3] for _ in range(args.symbols)]
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for arr in arrays:
+        t0 = time.perf_counter_ns()
+        ema200(arr)
+        bol_h(arr, 40, 2)
+        bol_l(arr, 40, 2)
+        rsi(arr, 14)
+        hist.record((time.perf_counter_ns() - t0) // 1000)
+    return hist, len(arrays), time.perf_counter() - started, "symbols/s"
+
+
+def bench_pnl(args, rng):
+    """simulate_realtime_pnl после каждого обновления свечи при открытой позиции по каждому символу"""
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    start_times, last_close = seed_history(symbols, args.history, rng)
+    for s in symbols:
+        price = last_close[s]
+        user_data_cache["positions"][s] = {
+            "side": "BUY" if len(s) % 2 else "SELL", "qty": 1.0, "entry": price,
+            "tp": None, "sl": None, "trail_percent": 0.5,
+            "open_time": klines_cache[s].last_open_time, "status": "OPEN"}
+    messages = synthetic_stream(symbols, args.messages, args.updates_per_candle, rng,
+                                start_times, last_close)
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for msg in messages:
+        k = msg["k"]
+        klines_cache[msg["s"]].update(k["t"], float(k["o"]), float(k["h"]), float(k["l"]),
+                                      float(k["c"]), float(k["v"]))
+        t0 = time.perf_counter_ns()
+        pnl_utils.simulate_realtime_pnl(msg["s"])
+        hist.record((time.perf_counter_ns() - t0) // 1000)
+    return hist, len(messages), time.perf_counter() - started, "msg/s"
+
+
+def bench_positions(args, rng):
+    """Трейлинг и TP/SL книги позиций: --positions позиций, одна векторная проверка на тик"""
+    book = user_data_cache["positions"]
+    symbols = [f"SYM{i}USDT" for i in range(args.positions)]
+    prices = 10.0 + np.arange(len(symbols), dtype=np.float64)
+
+    def open_(i):
+        sign = 1 if i % 2 else -1
+        book[symbols[i]] = {"side": "BUY" if sign > 0 else "SELL", "qty": 1.0, "entry": prices[i],
+                            "tp": prices[i] * (1 + 0.05 * sign), "sl": prices[i] * (1 - 0.05 * sign),
+                            "trail_percent": 0.5, "status": "OPEN"}
+    for i in range(len(symbols)):
+        open_(i)
+    ticks = max(1, args.messages // 20)
+    moves = np.exp(rng.normal(0, 0.002, (ticks, len(symbols))))
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for tick in range(ticks):
+        prices *= moves[tick]
+        t0 = time.perf_counter_ns()
+        _, exits = book.evaluate(book.price_vector(dict(zip(symbols, prices))))
+        hist.record((time.perf_counter_ns() - t0) // 1000)
+        for symbol, _ in exits:
+            open_(symbols.index(symbol))
+    return hist, ticks * len(symbols), time.perf_counter() - started, "checks/s"
+
+
+def bench_optimization(args, rng):
+    """BBRSI и BREAKOUT по всем символам в одном процессе, без кеша результатов.
+    --search: сетки (grid) или поиск по пространствам с бюджетом OPT_SEARCH_BUDGET"""
+    symbols = [f"SYM{i}USDT" for i in range(args.opt_symbols)]
+    seed_history(symbols, args.history, rng)
+    grids = {"BBRSI": BBRSI_PARAM_GRID, "BREAKOUT": BREAKOUT_PARAM_GRID}
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for s in symbols:
+        t0 = time.perf_counter_ns()
+        optimize_symbols([s], grids, workers=1, search=args.search)
+        hist.record((time.perf_counter_ns() - t0) // 1000)
+    elapsed = time.perf_counter() - started
+    if args.search == "grid":
+        backtests = len(symbols) * (len(BBRSI_PARAM_GRID) + len(BREAKOUT_PARAM_GRID))
+    else:
+        backtests = len(symbols) * len(grids) * OPT_SEARCH_BUDGET
+    return hist, backtests, elapsed, "backtests/s"
+
+
+def bench_startup(args, rng):
+    """import main в чистом интерпретаторе (-X importtime), --startup-runs раз"""
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for _ in range(args.startup_runs):
+        hist.record(int(total_seconds(profile_imports("main")) * 1e6))
+    return hist, args.startup_runs, time.perf_counter() - started, "imports/s"
+
+
+CASES = {
+    "handle_kline": bench_handle_kline,
+    "indicators": bench_indicators,
+    "pnl": bench_pnl,
+    "positions": bench_positions,
+    "optimization": bench_optimization,
+    "startup": bench_startup,
+}
+
+
+def run_case(name: str, args) -> dict:
+    reset_state()
+    hist, count, elapsed, unit = CASES[name](args, np.random.default_rng(args.seed))
+    result = {"unit": unit, "count": count, "seconds": round(elapsed, 4),
+              "throughput": count / elapsed if elapsed else 0.0}
+    result.update({f"{k}_us": v for k, v in hist.summary().items() if k != "count"})
+    if args.memory:
+        # отдельный прогон под tracemalloc, чтобы он не искажал время
+        reset_state()
+        tracemalloc.start()
+        CASES[name](args, np.random.default_rng(args.seed))
+        result["peak_alloc_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Печатает разницу с baseline, возвращает сценарии с регрессией больше tolerance %"""
+    regressions = []
+    print(f"\nСравнение с {baseline['meta'].get('commit')} (допуск {tolerance:g}%):")
+    keys = ("symbols", "messages", "rate", "updates_per_candle", "history", "positions", "opt_symbols", "seed")
+    cur_args, base_args = current["meta"]["args"], baseline["meta"].get("args", {})
+    differ = [k for k in keys if cur_args.get(k) != base_args.get(k)]
+    if differ:
+        print("  [WARN] параметры прогонов отличаются:", ", ".join(differ))
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        d_thr = (cur["throughput"] / base["throughput"] - 1) * 100 if base["throughput"] else 0.0
+        d_p99 = (cur["p99_us"] / base["p99_us"] - 1) * 100 if base["p99_us"] else 0.0
+        bad = d_thr < -tolerance or d_p99 > tolerance
+        print(f"  {name:<14} throughput {d_thr:+7.1f}%   p99 {d_p99:+7.1f}%" + ("   <- РЕГРЕССИЯ" if bad else ""))
+        if bad:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="сообщений/с для handle_kline (0 = без паузы)")
+    parser.add_argument("--updates-per-candle", type=int, default=30)
+    parser.add_argument("--history", type=int, default=KLINES_LIMIT)
+    parser.add_argument("--positions", type=int, default=500, help="открытых позиций для positions")
+    parser.add_argument("--opt-symbols", type=int, default=3)
+    parser.add_argument("--search", default="grid", choices=("grid", "halving", "tpe"),
+                        help="стратегия поиска для optimization")
+    parser.add_argument("--startup-runs", type=int, default=5, help="запусков для startup")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--output", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--compare", help="baseline JSON для сравнения")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="допуск регрессии, %%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    telegram_bot.TELEGRAM_BOT_TOKEN = None  # никаких реальных уведомлений
+    workdir = tempfile.mkdtemp(prefix="binance_bot_bench_")
+    os.chdir(workdir)
+
+    report = {"meta": {
+        "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(), "numpy": np.__version__,
+        "platform": platform.platform(), "args": vars(args)}, "results": {}}
+    for name in args.cases.split(","):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run_case(name, args)
+        report["results"][name] = result
+        print(f"{name:<14} {result['throughput']:>12.1f} {result['unit']:<12} "
+              f"p50={result['p50_us']:.0f} p99={result['p99_us']:.0f} max={result['max_us']} мкс"
+              + (f"  peak={result['peak_alloc_kb']} KB" if "peak_alloc_kb" in result else ""))
+    report["meta"]["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"max RSS: {report['meta']['max_rss_kb']} KB")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print("Результаты сохранены:", output)
+    if baseline is not None and compare(report, baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,35 @@
 import asyncio
-import pandas as pd
+import json
+import websockets
 import time
 from typing import List
-from binance import AsyncClient, BinanceSocketManager
-from config import API_KEY, API_SECRET, TIMEFRAME, DRY_RUN
-from data_store import klines_cache
-from utils import bol_h, bol_l, rsi
+from client_manager import get_client
+from config import (
+    TIMEFRAME, DRY_RUN, RESAMPLE_ENABLED, BASE_TIMEFRAME,
+    WS_MULTIPLEX, WS_STREAMS_PER_CONNECTION, FUTURES_WS_URL, KLINE_CACHE_ENABLED,
+    SCREENER_ENABLED, SCREENER_STALE
+)
+from data_store import get_timeframe_store
+from resampler import get_resampler
+from screener import screener
+from kline_disk_cache import persist_closed_candle
+from event_bus import bus, CandleEvent, CANDLE_UPDATED, CANDLE_CLOSED
+from signals import get_signals
+from metrics import record, timed
+from utils import interval_ms
 from pos_manager import get_open_position, open_position, close_position
 from telegram_bot import send_telegram_message
 from logger import log_position
 # ---------- fetch_historical_klines ----------
 async def fetch_historical_klines(symbol: str, interval="5m", limit=500):
+    import pandas as pd
     if DRY_RUN:
         df = pd.DataFrame([{"Open": 0, "High": 0, "Low": 0, "Close": 0, "Volume": 0}] * limit)
-        df.index = pd.date_range(end=pd.Timestamp.now(), periods=limit, freq=interval)
+        df.index = pd.date_range(end=pd.Timestamp.now(), periods=limit,
+                                 freq=pd.Timedelta(milliseconds=interval_ms(interval)))
         return df
 
-    client = await AsyncClient.create(API_KEY, API_SECRET)
+    client = await get_client()
     try:
         raw = await client.futures_klines(symbol=symbol, interval=interval, limit=limit)
         df = pd.DataFrame(raw, columns=[
@@ -33,104 +46,109 @@ async def fetch_historical_klines(symbol: str, interval="5m", limit=500):
     except Exception as e:
         print(f"❌ Ошибка загрузки {symbol}: {e}")
         return pd.DataFrame()
-    finally:
-        await client.close_connection()
 
 # ---------- WebSocket handler ----------
 async def handle_kline(msg):
+    """Пишет свечу в KlineStore и публикует события для подписчиков шины.
+    Свеча BASE_TIMEFRAME при RESAMPLE_ENABLED ещё и обновляет собранные из неё таймфреймы."""
+    received = time.perf_counter_ns()
     try:
         k = msg["k"]
         symbol = msg["s"]
-        row = {
-            "Open": float(k["o"]),
-            "High": float(k["h"]),
-            "Low": float(k["l"]),
-            "Close": float(k["c"]),
-            "Volume": float(k["v"]),
-        }
-        idx = pd.to_datetime(k["t"], unit="ms")
-
-        # Обновляем кэш свечей
-        df = klines_cache.get(symbol)
-        if df is None or df.empty:
-            df = pd.DataFrame([row], index=[idx])
-        else:
-            if idx in df.index:
-                df.loc[idx] = row
-            else:
-                df = pd.concat([df, pd.DataFrame([row], index=[idx])])
-                df = df.tail(500)
-        klines_cache[symbol] = df
-
-        # Проверка открытой позиции
-        pos = get_open_position(symbol)
-        price_last = row["Close"]
-        signal = None
-
-        # --- сигналы по индикаторам ---
-        if len(df) > 2:
-            lower = bol_l(df["Close"])[-1]
-            upper = bol_h(df["Close"])[-1]
-            rsi_val = rsi(df["Close"])[-1]
-            if df["Close"].iloc[-2] > lower and df["Close"].iloc[-1] < lower and rsi_val < 30:
-                signal = "BUY"
-            elif df["Close"].iloc[-2] < upper and df["Close"].iloc[-1] > upper and rsi_val > 70:
-                signal = "SELL"
-
-        # --- сигналы по пробою ---
-        period = 20
-        if len(df) > period + 2:
-            highest = df["High"].iloc[-period-1:-1].max()
-            lowest = df["Low"].iloc[-period-1:-1].min()
-            if price_last > highest:
-                signal = "BUY"
-            elif price_last < lowest:
-                signal = "SELL"
-
-        # --- если есть открытая позиция ---
-        if pos:
-            side = pos["side"]
-            entry = pos["entry"]
-
-            # проверка TP / SL и обратного сигнала через logger
-            if side == "BUY" and (signal == "SELL" 
-                                  or pos["sl"] is not None and  price_last <= pos["sl"] 
-                                  or pos["tp"] is not None and price_last >= pos["tp"]):
-                reason = "Обратный сигнал/TP/SL достигнут"
-                close_position(symbol, price_last, reason=reason)
-                log_position("CLOSE", symbol, side, price_last, pos["qty"], 
-                             pnl=(price_last - entry) * pos["qty"], 
-                             tp=pos.get("tp"), sl=pos.get("sl"), 
-                             exit_reason=reason)
-            elif side == "SELL" and (signal == "BUY" 
-                                    or pos["sl"] is not None and price_last >= pos["sl"]
-                                    or pos["tp"] is not None and price_last <= pos["tp"]):
-                reason = "Обратный сигнал/TP/SL достигнут"
-                close_position(symbol, price_last, reason=reason)
-                log_position("CLOSE", symbol, side, price_last, pos["qty"], 
-                             pnl=(entry - price_last) * pos["qty"], 
-                             tp=pos.get("tp"), sl=pos.get("sl"), 
-                             exit_reason=reason)
-            else:
-                print(f"⏳ Ожидаем: {symbol} {side}, entry={entry}, last={price_last}, tp={pos.get('tp')}, sl={pos.get('sl')}")
-
-        # --- если позиции нет и появился сигнал ---
-        elif signal:
-            pos_data = open_position(symbol, signal)
-            if pos_data:
-                log_position("OPEN", symbol, signal, pos_data["entry"], pos_data["qty"], 
-                             tp=pos_data["tp"], sl=pos_data["sl"], reason=f"Сигнал {signal}")
-
+        interval = k["i"]
+        event_time = msg.get("E")
+        if event_time:
+            # задержка от биржи до нас (включает расхождение часов)
+            record("exchange_to_receive", max(0, time.time() * 1000 - event_time) * 1000, symbol)
+        open_time, o, h, l, c, v = (int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]),
+                                    float(k["c"]), float(k["v"]))
+        closed = bool(k.get("x"))
+        # Обновляем кэш свечей: O(1) запись в кольцевой буфер без копирования
+        store = get_timeframe_store(symbol, interval, create=True)
+        with timed("store_update", symbol):
+            new_candle = store.update(open_time, o, h, l, c, v)
+            if new_candle is None:
+                return
+            updates = [(interval, open_time, c, new_candle, closed)]
+            if RESAMPLE_ENABLED and interval == BASE_TIMEFRAME:
+                updates += get_resampler(symbol).update(open_time, o, h, l, c, v, closed)
+        if KLINE_CACHE_ENABLED and closed:
+            # свеча закрыта - дописываем её в дисковый кеш для тёплого перезапуска
+            # (собранные таймфреймы не пишутся: они строятся заново из базового)
+            try:
+                persist_closed_candle(symbol, interval, open_time, o, h, l, c, v, keep=store.capacity)
+            except OSError as e:
+                print(f"[WARN] Не удалось сохранить свечу {symbol} на диск: {e}")
+
+        for tf, tf_open_time, close, tf_new, tf_closed in updates:
+            event = CandleEvent(CANDLE_UPDATED, symbol, tf, tf_open_time, close, tf_new)
+            await bus.publish(event)
+            if tf_closed:
+                await bus.publish(event._replace(kind=CANDLE_CLOSED))
+        record("receive_to_decision", (time.perf_counter_ns() - received) // 1000, symbol)
+        if event_time:
+            record("exchange_to_decision", max(0, time.time() * 1000 - event_time) * 1000, symbol)
     except Exception as e:
         print("Ошибка в обработчике kline:", e)
 
+def on_candle_update(event: CandleEvent):
+    """Сигналы и сопровождение позиции на каждом обновлении свечи (подписчик CANDLE_UPDATED)"""
+    if event.interval != TIMEFRAME:
+        return
+    symbol = event.symbol
+
+    # Проверка открытой позиции
+    pos = get_open_position(symbol)
+    snap = event.signals or get_signals(symbol)
+    price_last = snap.price
+    signal = snap.signal
+
+    # --- если есть открытая позиция ---
+    if pos:
+        side = pos["side"]
+        entry = pos["entry"]
+
+        # проверка TP / SL и обратного сигнала через logger
+        if side == "BUY" and (signal == "SELL" 
+                              or pos["sl"] is not None and  price_last <= pos["sl"] 
+                              or pos["tp"] is not None and price_last >= pos["tp"]):
+            reason = "Обратный сигнал/TP/SL достигнут"
+            close_position(symbol, price_last, reason=reason)
+            log_position("CLOSE", symbol, side, price_last, pos["qty"], 
+                         pnl=(price_last - entry) * pos["qty"], 
+                         tp=pos.get("tp"), sl=pos.get("sl"), 
+                         exit_reason=reason)
+        elif side == "SELL" and (signal == "BUY" 
+                                or pos["sl"] is not None and price_last >= pos["sl"]
+                                or pos["tp"] is not None and price_last <= pos["tp"]):
+            reason = "Обратный сигнал/TP/SL достигнут"
+            close_position(symbol, price_last, reason=reason)
+            log_position("CLOSE", symbol, side, price_last, pos["qty"], 
+                         pnl=(entry - price_last) * pos["qty"], 
+                         tp=pos.get("tp"), sl=pos.get("sl"), 
+                         exit_reason=reason)
+        else:
+            print(f"⏳ Ожидаем: {symbol} {side}, entry={entry}, last={price_last}, tp={pos.get('tp')}, sl={pos.get('sl')}")
+
+    # --- если позиции нет и появился сигнал ---
+    elif signal:
+        pos_data = open_position(symbol, signal)
+        if pos_data:
+            log_position("OPEN", symbol, signal, pos_data["entry"], pos_data["qty"], 
+                         tp=pos_data["tp"], sl=pos_data["sl"], reason=f"Сигнал {signal}")
+
 # ---------- start websockets ----------
 async def start_websockets(symbols: List[str], interval: str = TIMEFRAME):
+    """Запускает приём свечей в фоне и возвращает список задач"""
     if DRY_RUN:
         print("[DRY_RUN] WebSockets не запущены")
-        return
+        return []
+
+    if WS_MULTIPLEX:
+        return await start_multiplexed_websockets(symbols, interval)
 
-    client = await AsyncClient.create(API_KEY, API_SECRET)
+    from binance import BinanceSocketManager
+    client = await get_client()
     bm = BinanceSocketManager(client)
     sockets = [bm.kline_socket(symbol=s, interval=interval) for s in symbols]
 
@@ -142,45 +160,94 @@ async def start_websockets(symbols: List[str], interval: str = TIMEFRAME):
 
     tasks = [asyncio.create_task(listen(sock)) for sock in sockets]
     print("✅ WebSockets запущены для:", symbols)
-    await asyncio.gather(*tasks)
+    return tasks
+
+# ---------- combined streams ----------
+def combined_stream_urls(streams: List[str], per_connection: int = WS_STREAMS_PER_CONNECTION,
+                         base_url: str = FUTURES_WS_URL) -> List[str]:
+    """Режет список стримов на соединения по per_connection штук"""
+    return [f"{base_url}/stream?streams=" + "/".join(streams[i:i + per_connection])
+            for i in range(0, len(streams), per_connection)]
+
+async def _read_combined_stream(url: str, queue: asyncio.Queue):
+    delay = 1
+    while True:
+        try:
+            async with websockets.connect(url, max_queue=None) as ws:
+                delay = 1
+                async for raw in ws:
+                    queue.put_nowait(json.loads(raw))
+            reason = "закрыто сервером"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            reason = e
+        print(f"❌ Combined stream оборвался ({reason}), переподключение через {delay} с")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+
+async def _dispatch_stream_messages(queue: asyncio.Queue, handlers: dict):
+    # единый цикл раздачи: {"stream": ..., "data": {...}} -> обработчик символа
+    while True:
+        msg = await queue.get()
+        data = msg.get("data", msg)
+        handler = handlers.get(data.get("s"))
+        if handler is None:
+            continue
+        try:
+            await handler(data)
+        except Exception as e:
+            print(f"Ошибка в обработчике {data.get('s')}:", e)
+
+async def start_multiplexed_websockets(symbols: List[str], interval: str = TIMEFRAME, handlers: dict = None,
+                                       per_connection: int = WS_STREAMS_PER_CONNECTION,
+                                       base_url: str = FUTURES_WS_URL):
+    """Все symbol@kline_interval через несколько combined-stream соединений и один диспетчер"""
+    if handlers is None:
+        handlers = {s: handle_kline for s in symbols}
+    streams = [f"{s.lower()}@kline_{interval}" for s in symbols]
+    queue = asyncio.Queue()
+    urls = combined_stream_urls(streams, per_connection, base_url)
+    tasks = [asyncio.create_task(_read_combined_stream(url, queue)) for url in urls]
+    tasks.append(asyncio.create_task(_dispatch_stream_messages(queue, handlers)))
+    print(f"✅ Combined streams: {len(streams)} стримов в {len(urls)} соединениях")
+    return tasks
+
+# ---------- all-market ticker stream ----------
+async def run_ticker_screener(base_url: str = FUTURES_WS_URL):
+    """Поток !ticker@arr -> screener: таблица ликвидности обновляется раз в секунду"""
+    queue = asyncio.Queue()
+    reader = asyncio.create_task(_read_combined_stream(f"{base_url}/stream?streams=!ticker@arr", queue))
+    print("✅ Скринер: поток !ticker@arr запущен")
+    try:
+        while True:
+            msg = await queue.get()
+            data = msg.get("data", msg)
+            screener.update(data if isinstance(data, list) else [data])
+    finally:
+        reader.cancel()
 
 # ---------- get_liquid_tickers ----------
 _liquid_tickers_cache = {"timestamp": 0, "tickers": []}
 
 async def get_liquid_tickers(top_n=10, min_price=0.1, min_volume=1_000_000, max_spread_percent=5.0):
+    """Топ символов по объёму. Из живого скринера, если поток !ticker@arr свежий,
+    иначе REST-снимок futures_ticker (не чаще раза в час без скринера)"""
     global _liquid_tickers_cache
     if DRY_RUN:
         if not _liquid_tickers_cache["tickers"]:
             _liquid_tickers_cache["tickers"] = ["BTCUSDT", "ETHUSDT", "BNBUSDT"]
         return _liquid_tickers_cache["tickers"]
 
-    client = await AsyncClient.create(API_KEY, API_SECRET)
+    if SCREENER_ENABLED and screener.age() < SCREENER_STALE:
+        return screener.top(top_n, min_price, min_volume, max_spread_percent)
+
     now = time.time()
     if now - _liquid_tickers_cache["timestamp"] < 3600:
-        await client.close_connection()
         return _liquid_tickers_cache["tickers"]
 
-    try:
-        tickers = await client.futures_ticker()
-        filtered = []
-        for t in tickers:
-            symbol = t.get("symbol")
-            if not symbol or "USDT" not in symbol:
-                continue
-            try:
-                price = float(t.get("lastPrice", 0))
-                volume = float(t.get("quoteVolume", 0))
-                high = float(t.get("highPrice", 0))
-                low = float(t.get("lowPrice", 0))
-                spread_percent = ((high - low) / price) * 100 if price else 100
-                if price >= min_price and volume >= min_volume and spread_percent <= max_spread_percent:
-                    filtered.append({"symbol": symbol, "volume": volume})
-            except Exception:
-                continue
-
-        filtered.sort(key=lambda x: x["volume"], reverse=True)
-        top_symbols = [x["symbol"] for x in filtered[:top_n]]
-        _liquid_tickers_cache = {"timestamp": now, "tickers": top_symbols}
-        return top_symbols
-    finally:
-        await client.close_connection()
+    client = await get_client()
+    screener.update(await client.futures_ticker())
+    top_symbols = screener.top(top_n, min_price, min_volume, max_spread_percent)
+    _liquid_tickers_cache = {"timestamp": now, "tickers": top_symbols}
+    return top_symbols
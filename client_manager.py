@@ -0,0 +1,58 @@
+import asyncio
+import aiohttp
+from config import API_KEY, API_SECRET, REST_POOL_SIZE, REST_KEEPALIVE, EXCHANGE_REST_URL
+
+# Один AsyncClient (и одна aiohttp-сессия с пулом keep-alive соединений) на всё приложение.
+# Создаётся при первом обращении, закрывается close_client() при остановке main_async.
+# Пакет binance (вместе с dateparser) импортируется тогда же, а не при старте процесса.
+
+_client = None
+_client_loop = None
+_lock = None
+
+
+async def get_client() -> "AsyncClient":
+    global _client, _client_loop, _lock
+    loop = asyncio.get_running_loop()
+    if _client is not None and _client_loop is loop:
+        return _client
+    if _lock is None or _client_loop is not loop:
+        # после перезапуска main_async старый клиент привязан к закрытому loop
+        _client = None
+        _client_loop = loop
+        _lock = asyncio.Lock()
+    async with _lock:
+        if _client is None:
+            connector = aiohttp.TCPConnector(limit=REST_POOL_SIZE, keepalive_timeout=REST_KEEPALIVE,
+                                             ttl_dns_cache=300)
+            _client = await _create_client({"connector": connector})
+            print("✅ REST клиент создан (пул соединений:", REST_POOL_SIZE, ")")
+    return _client
+
+
+async def _create_client(session_params: dict) -> "AsyncClient":
+    from binance import AsyncClient
+    if not EXCHANGE_REST_URL:
+        return await AsyncClient.create(API_KEY, API_SECRET, session_params=session_params)
+    # локальный симулятор биржи (exchange_sim.py) вместо Binance
+    client = AsyncClient(API_KEY, API_SECRET, session_params=session_params)
+    client.API_URL = EXCHANGE_REST_URL.rstrip("/") + "/api"
+    client.FUTURES_URL = EXCHANGE_REST_URL.rstrip("/") + "/fapi"
+    try:
+        await client.ping()
+    except Exception:
+        await client.close_connection()
+        raise
+    print("🧪 REST клиент направлен на", EXCHANGE_REST_URL)
+    return client
+
+
+async def close_client():
+    global _client, _client_loop, _lock
+    client = _client
+    _client = _client_loop = _lock = None
+    if client is not None:
+        try:
+            await client.close_connection()
+        except Exception as e:
+            print("Ошибка закрытия REST клиента:", e)
@@ -9,17 +9,61 @@ TELEGRAM_CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID") or "0")
 DRY_RUN = os.getenv("DRY_RUN", "True").lower() == "true"
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
-print("TELEGRAM_TOKEN =", TELEGRAM_TOKEN)
-print("TELEGRAM_BOT_TOKEN =", TELEGRAM_BOT_TOKEN)
-print("TELEGRAM_CHAT_ID =", TELEGRAM_CHAT_ID)
-
 # Trading / timing
 TIMEFRAME = "5m"
-CHECK_INTERVAL = 60  # seconds
+KLINES_LIMIT = 500  # свечей в кеше на символ
 TOP_N_TICKERS = 10
 MIN_PRICE = 0.1
 MIN_VOLUME = 1_000_000
 MAX_SPREAD_PERCENT = 5.0
+# Мультитаймфрейм: один стрим BASE_TIMEFRAME на символ, TIMEFRAME и остальные
+# DERIVED_TIMEFRAMES собираются из него (resampler.py) без своих стримов и REST
+RESAMPLE_ENABLED = True
+BASE_TIMEFRAME = "1m"
+DERIVED_TIMEFRAMES = ("5m", "15m", "1h", "4h")
+RESAMPLE_MIN_HISTORY = 150  # свечей истории на каждый таймфрейм кроме TIMEFRAME (MIN_CANDLES оптимизатора)
+# Скринер рынка: поток !ticker@arr вместо REST-снимка futures_ticker раз в час
+SCREENER_ENABLED = True
+SCREENER_STALE = 30  # seconds: данные скринера старше - снова REST
+SCREENER_ROW_TTL = 600  # seconds: символ без тикеров дольше (делистинг, остановка торгов) не попадает в top
+UNIVERSE_REFRESH_INTERVAL = 60  # seconds между пересмотрами набора символов
+UNIVERSE_DROP_GRACE = 3600  # seconds: столько символ держится после выпадения из кандидатов
+# Шардирование по процессам: ingest-процесс пишет свечи в shared memory, SHARD_WORKERS
+# процессов считают сигналы своих символов, главный процесс ведёт позиции и риск
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))  # 0 - всё в одном процессе
+SHARD_VNODES = 64  # виртуальных узлов на воркер в кольце консистентного хеширования
+SHARD_WATCHDOG_INTERVAL = 5  # секунд между проверками, живы ли процессы шардов
+
+# WebSocket: все свечи одним/несколькими combined-stream соединениями
+WS_MULTIPLEX = True
+WS_STREAMS_PER_CONNECTION = 200
+FUTURES_WS_URL = os.getenv("FUTURES_WS_URL", "wss://fstream.binance.com")
+# REST вместо Binance, например локальный exchange_sim.py: http://127.0.0.1:9200
+# (для стримов симулятора: FUTURES_WS_URL=ws://127.0.0.1:9200 и WS_MULTIPLEX = True)
+EXCHANGE_REST_URL = os.getenv("EXCHANGE_REST_URL")
+
+# REST: общий клиент с пулом keep-alive соединений
+REST_POOL_SIZE = 20
+REST_KEEPALIVE = 60  # seconds
+
+# Загрузка истории: параллельность и бюджет веса запросов (лимит Binance Futures 2400/мин)
+HISTORY_CONCURRENCY = 10
+HISTORY_WEIGHT_LIMIT = 2000
+HISTORY_RETRIES = 5
+
+# Локальный кеш закрытых свечей (тёплый перезапуск)
+KLINE_CACHE_ENABLED = True
+KLINE_CACHE_DIR = os.getenv("KLINE_CACHE_DIR", "kline_cache")
+
+# Telegram: очередь уведомлений, склейка всплесков и лимит Telegram ~1 сообщение/с в чат
+TELEGRAM_QUEUE_SIZE = 500
+TELEGRAM_BATCH_WINDOW = 1.0  # seconds
+TELEGRAM_MIN_INTERVAL = 1.0  # seconds между отправками в один чат
+TELEGRAM_FLUSH_TIMEOUT = 5.0  # seconds на досылку очереди при остановке
+
+# Параметры стратегий по умолчанию (пока оптимизация не подобрала свои)
+BBRSI_DEFAULT_PARAMS = {"bol_period": 40, "bol_dev": 2, "rsi_period": 14}
+BREAKOUT_DEFAULT_PARAMS = {"period": 20}
 
 # Strategies optimization grids
 BBRSI_PARAM_GRID = [
@@ -29,14 +73,68 @@ BBRSI_PARAM_GRID = [
     for r in range(12, 19, 2)
 ]
 BREAKOUT_PARAM_GRID = [{"period": p} for p in range(10, 31, 5)]
+# Поиск параметров (param_search.py): "grid" - полный перебор сеток выше,
+# "halving" - successive halving на растущих окнах свечей, "tpe" - TPE-сэмплер.
+# Для halving/tpe - пространства параметров: ("int", lo, hi), ("float", lo, hi, step), ("choice", [...])
+OPT_SEARCH = os.getenv("OPT_SEARCH", "grid")
+OPT_SEARCH_BUDGET = 40  # бэктестов (в пересчёте на полное окно) на символ и стратегию
+OPT_SEARCH_SEED = 0
+OPT_HALVING_ETA = 3      # на каждом шаге остаётся 1/ETA кандидатов, окно растёт в ETA раз
+OPT_TPE_STARTUP = 12     # случайных точек до построения модели
+OPT_TPE_BATCH = 4        # точек за раунд (раунд считается пулом параллельно)
+OPT_TPE_GAMMA = 0.25     # доля лучших наблюдений в "хорошей" плотности
+OPT_TPE_CANDIDATES = 64  # кандидатов из "хорошей" плотности на раунд
+ATR_PERIOD = 14
+BBRSI_PARAM_SPACE = {
+    "bol_period": ("int", 15, 50),
+    "bol_dev": ("float", 1.0, 3.5, 0.05),
+    "rsi_period": ("int", 8, 24),
+    "atr_stop": ("float", 0.0, 5.0, 0.25),  # стоп в ATR от цены входа, 0 - без стопа
+}
+BREAKOUT_PARAM_SPACE = {"period": ("int", 5, 60)}
 USE_BBRSI = True
 USE_BREAKOUT = True
+# процессов для оптимизации (0 = по числу ядер)
+OPTIMIZATION_WORKERS = int(os.getenv("OPTIMIZATION_WORKERS", "0"))
+# векторный бэктест сетки вместо FractionalBacktest на каждую комбинацию
+VECTOR_BACKTEST = True
+INDICATOR_CACHE_SIZE = 32  # окон свечей с готовыми рядами индикаторов на процесс
+# Кеш результатов оптимизации (ключ: символ, стратегия, параметры, отпечаток свечей, комиссия)
+OPT_CACHE_ENABLED = True
+OPT_CACHE_FILE = os.getenv("OPT_CACHE_FILE", "optimization_cache.sqlite")
+OPT_CACHE_MAX_ROWS = 100_000  # LRU-вытеснение сверх этого числа результатов
+OPT_CACHE_STALE_CANDLES = 3   # до стольких новых свечей результаты берутся как есть
+OPT_CACHE_TOP_K = 5           # дальше пересчитываются только лучшие K параметров...
+OPT_CACHE_TOP_K_CANDLES = 48  # ...пока с полного прогона прошло не больше стольких свечей
+# Фоновая переоптимизация: скользящее окно последних свечей, выбор топ символов
+REOPT_INTERVAL = 3600  # seconds
+REOPT_WINDOW_CANDLES = 500
+TOP_SYMBOLS = 5
+# Быстрый старт: без выбора символов и первой оптимизации - символы и параметры последней
+# переоптимизации из STRATEGY_STATE_FILE. Перезапуск после падения всегда стартует так.
+FAST_START = os.getenv("FAST_START", "False").lower() == "true"
+STRATEGY_STATE_FILE = os.getenv("STRATEGY_STATE_FILE", "strategy_state.json")
+STRATEGY_STATE_MAX_AGE = 24 * 3600  # seconds: сохранённое состояние старше - обычный старт
+STARTUP_IMPORT_BUDGET = 1.0  # seconds на import main (import_profile.py --budget)
 
 # Trading / risk
 INITIAL_CASH = 500.0
 LEVERAGE = 5
 RISK_FRACTION = 0.2
+COMMISSION = 0.005
+MAX_OPEN_POSITIONS = 20
 
 # Logging / files
 LOG_FILE = "trades_testnet.log"
 POSITIONS_LOG_FILE = "positions_log.json"
+# Метрики задержек горячего пути
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_SUMMARY_INTERVAL = 300  # seconds
+LOOP_LAG_INTERVAL = 0.1  # seconds
+# Журнал позиций: буфер сбрасывается по размеру или по времени
+LOG_FLUSH_ENTRIES = 50
+LOG_FLUSH_INTERVAL = 1.0  # seconds
+LOG_FSYNC = os.getenv("LOG_FSYNC", "periodic")  # "always" | "periodic" | "never"
+LOG_FSYNC_INTERVAL = 10.0  # seconds, для LOG_FSYNC = "periodic"
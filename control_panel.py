@@ -1,6 +1,5 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update # pyright: ignore[reportMissingImports]
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes # pyright: ignore[reportMissingImports]
-import matplotlib.pyplot as plt # pyright: ignore[reportMissingImports]
 from io import BytesIO
 from pos_manager import user_data_cache, INITIAL_CASH  # твои существующие данные
 from logger import realized_total_pnl
@@ -42,6 +41,7 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif query.data == "stats":
         # Пример графика PnL (заменить на реальные данные)
+        import matplotlib.pyplot as plt  # pyright: ignore[reportMissingImports]
         equity_history = user_data_cache.get("equity_history", [INITIAL_CASH])
         plt.figure(figsize=(6,4))
         plt.plot(equity_history, marker='o')
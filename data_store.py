@@ -1,10 +1,104 @@
-import pandas as pd
+import json
+import os
+import time
+from typing import NamedTuple
+from config import TIMEFRAME, STRATEGY_STATE_FILE, STRATEGY_STATE_MAX_AGE
+from kline_store import KlineStore
+from position_book import PositionBook
+from utils import interval_ms
 
 # Кеш свечей для каждого символа
-# Формат: {"SYMBOL": pd.DataFrame с колонками ["Open", "High", "Low", "Close", "Volume"]}
+# Формат: {"SYMBOL": KlineStore} - кольцевой буфер Open/High/Low/Close/Volume + open time
 klines_cache = {}
 
+# Потоковые индикаторы по символам: {"SYMBOL": indicators.SymbolIndicators}
+indicators_cache = {}
+
+# Сигналы по последней свече: {"SYMBOL": (ключ, signals.SignalSnapshot)}
+signals_cache = {}
+
+# Свечи остальных таймфреймов (базовый стрим и собранные из него resampler'ом):
+# {("SYMBOL", "1h"): KlineStore}. Свечи TIMEFRAME по-прежнему в klines_cache.
+timeframe_cache = {}
+
+# Резэмплеры базового стрима по символам: {"SYMBOL": resampler.SymbolResampler}
+resampler_cache = {}
+
+# Матрицы индикаторов окон свечей для оптимизации (LRU, см. indicator_cache.py):
+# {отпечаток (High, Low, Close): indicator_cache.IndicatorMatrix}
+indicator_matrix_cache = {}
+
+def drop_symbol(symbol: str):
+    """Убирает символ из всех кешей свечей, индикаторов и сигналов"""
+    for cache in (klines_cache, indicators_cache, signals_cache, resampler_cache):
+        cache.pop(symbol, None)
+    for key in [k for k in timeframe_cache if k[0] == symbol]:
+        del timeframe_cache[key]
+
+def get_kline_store(symbol: str) -> KlineStore:
+    """Возвращает буфер свечей символа, создавая пустой при первом обращении"""
+    store = klines_cache.get(symbol)
+    if store is None:
+        store = klines_cache[symbol] = KlineStore()
+    return store
+
+def get_timeframe_store(symbol: str, interval: str, create: bool = False):
+    """Буфер свечей символа на любом таймфрейме (для TIMEFRAME - тот же, что в klines_cache)"""
+    if interval == TIMEFRAME:
+        return get_kline_store(symbol) if create else klines_cache.get(symbol)
+    store = timeframe_cache.get((symbol, interval))
+    if store is None and create:
+        store = timeframe_cache[(symbol, interval)] = KlineStore()
+    return store
+
+def set_timeframe_store(symbol: str, interval: str, store: KlineStore):
+    if interval == TIMEFRAME:
+        klines_cache[symbol] = store
+    else:
+        timeframe_cache[(symbol, interval)] = store
+
+# Активные символы и параметры стратегий по символам.
+# Меняется только целиком (set_strategy_state) - читатели всегда видят согласованную пару.
+class StrategyState(NamedTuple):
+    version: int
+    symbols: frozenset
+    params: dict      # {"SYMBOL": {"BBRSI": {...}, "BREAKOUT": {...}}}
+    updated: float
+
+_strategy_state = StrategyState(0, frozenset(), {}, 0.0)
+
+def get_strategy_state() -> StrategyState:
+    return _strategy_state
+
+def set_strategy_state(state: StrategyState):
+    global _strategy_state
+    _strategy_state = state
+
+def save_strategy_state(state: StrategyState, candidates, path: str = STRATEGY_STATE_FILE):
+    """Состояние + список кандидатов переоптимизации на диск (для быстрого старта).
+    Запись через временный файл - при падении посреди записи старый файл цел."""
+    data = {"version": state.version, "symbols": sorted(state.symbols), "params": state.params,
+            "updated": state.updated, "candidates": list(candidates)}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_strategy_state(path: str = STRATEGY_STATE_FILE, max_age: float = STRATEGY_STATE_MAX_AGE):
+    """(StrategyState, кандидаты) из save_strategy_state или None - нет файла, битый или старее max_age"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        state = StrategyState(int(data["version"]), frozenset(data["symbols"]), dict(data["params"]),
+                              float(data["updated"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not state.symbols or time.time() - state.updated > max_age:
+        return None
+    return state, list(data.get("candidates") or state.symbols)
+
 # Пользовательские данные (позиции, баланс и т.д.)
+# "positions" - position_book.PositionBook: массивы по слотам, снаружи как dict.
 # Структура:
 # {
 #   "positions": {
@@ -22,7 +116,7 @@ klines_cache = {}
 #   }
 # }
 user_data_cache = {
-    "positions": {}
+    "positions": PositionBook()
 }
 
 # Вспомогательная функция для инициализации свечей (пример)
@@ -34,5 +128,8 @@ def load_sample_klines(symbol: str, n=100):
     low = close - np.random.rand(n) * 2
     open_ = close + np.random.randn(n)
     volume = np.random.randint(100, 1000, size=n)
-    df = pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume})
-    klines_cache[symbol] = df
+    step = interval_ms(TIMEFRAME)
+    open_times = (int(time.time() * 1000) // step - n + 1) * step + np.arange(n) * step
+    store = KlineStore()
+    store.extend(open_times, np.column_stack([open_, high, low, close, volume]))
+    klines_cache[symbol] = store
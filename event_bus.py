@@ -0,0 +1,59 @@
+import asyncio
+import time
+from typing import NamedTuple
+from metrics import record
+
+# Шина событий свечей: handle_kline публикует событие сразу после записи в KlineStore,
+# стратегии подписываются на нужные символы. Нет событий - нет работы (вместо опроса
+# по таймеру). Обработчики могут быть обычными функциями или корутинами.
+
+CANDLE_UPDATED = "candle_updated"  # каждое сообщение kline, включая закрытие
+CANDLE_CLOSED = "candle_closed"    # k["x"] == True
+
+
+class CandleEvent(NamedTuple):
+    kind: str
+    symbol: str
+    interval: str
+    open_time: int
+    close: float
+    new_candle: bool  # первое сообщение по этой свече
+    signals: object = None  # signals.SignalSnapshot, уже посчитанный воркером шарда
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers = {}  # (kind, symbol или None) -> [handler, ...]
+
+    def subscribe(self, kind: str, handler, symbol: str = None):
+        """symbol=None - на события всех символов"""
+        handlers = self._handlers.setdefault((kind, symbol), [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe(self, kind: str, handler, symbol: str = None):
+        handlers = self._handlers.get((kind, symbol), [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def clear(self):
+        self._handlers.clear()
+
+    def has_subscribers(self, kind: str, symbol: str) -> bool:
+        return bool(self._handlers.get((kind, symbol)) or self._handlers.get((kind, None)))
+
+    async def publish(self, event: CandleEvent):
+        for key in ((event.kind, event.symbol), (event.kind, None)):
+            for handler in tuple(self._handlers.get(key, ())):
+                start = time.perf_counter_ns()
+                try:
+                    result = handler(event)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"❌ Ошибка обработчика {event.kind} для {event.symbol}: {e}")
+                record(getattr(handler, "__name__", "handler"),
+                       (time.perf_counter_ns() - start) // 1000, event.symbol)
+
+
+bus = EventBus()
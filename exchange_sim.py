@@ -0,0 +1,416 @@
+"""Локальный симулятор Binance Futures для нагрузочных тестов без сети.
+
+    python exchange_sim.py --symbols 300 --speed 10 --port 9200 \\
+        --disconnect-every 120 --spike-prob 0.01 --spike-ms 800 --burst-every 30 --burst-size 5000
+
+Бот направляется на него через окружение:
+    EXCHANGE_REST_URL=http://127.0.0.1:9200 FUTURES_WS_URL=ws://127.0.0.1:9200
+
+REST: /fapi/v1/klines, /fapi/v1/ticker/24hr, /fapi/v1/ping|time, /api/v3/ping|time
+(с заголовком X-MBX-USED-WEIGHT-1M). WebSocket: /stream?streams=... и /ws/<stream>
+для <symbol>@kline_<interval>, <symbol>@ticker, !ticker@arr, <symbol>@aggTrade. Стрим kline - один таймфрейм
+(--interval, по умолчанию BASE_TIMEFRAME), REST отдаёт и кратные ему. Свечи синтетические или из кеша kline_disk_cache (--replay-dir). Время симуляции идёт
+в --speed раз быстрее реального. Сбои: периодические или по запросу
+(POST /_sim/disconnect, /_sim/burst?n=, /_sim/latency?ms=&seconds=), статистика - GET /_sim/stats.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import numpy as np
+from aiohttp import web, WSMsgType
+from config import BASE_TIMEFRAME
+from resampler import resample_arrays
+from utils import interval_ms
+
+
+class SymbolFeed:
+    """Свечи одного символа: закрытая история + текущая свеча, которая строится тиками
+    по пути open -> high/low -> close заранее известной (синтетической или записанной) свечи"""
+
+    def __init__(self, symbol: str, history: np.ndarray, upcoming, rng, candle_ms: int):
+        self.symbol = symbol
+        self.candle_ms = candle_ms
+        self.closed = [tuple(row) for row in history]  # (t, o, h, l, c, v)
+        self.upcoming = upcoming   # итератор будущих свечей (o, h, l, c, v) или None
+        self.rng = rng
+        self.current = None        # [t, o, h, l, c, v]
+        self.target = None
+        self.path = None
+        self.trade_id = 0
+
+    def _next_target(self, last_close: float):
+        if self.upcoming is not None:
+            try:
+                return next(self.upcoming)
+            except StopIteration:
+                self.upcoming = None
+        c = last_close * float(np.exp(self.rng.normal(0, 0.003)))
+        spread = abs(float(self.rng.normal(0, 0.002))) * c
+        return (last_close, max(last_close, c) + spread, min(last_close, c) - spread, c,
+                float(self.rng.uniform(100, 1000)))
+
+    def start_candle(self, open_time: int, ticks: int):
+        last_close = self.closed[-1][4] if self.closed else 100.0
+        o, h, l, c, v = self.target = self._next_target(last_close)
+        # экстремумы в случайном порядке, между ними - линейная интерполяция
+        points = [o, h, l, c] if self.rng.random() < 0.5 else [o, l, h, c]
+        knots = np.linspace(0, max(ticks - 1, 1), len(points))
+        self.path = np.interp(np.arange(ticks), knots, points)
+        self.current = [open_time, o, o, o, o, 0.0]
+
+    def tick(self, i: int, ticks: int):
+        price = float(self.path[min(i, len(self.path) - 1)])
+        t, o, h, l, _, _ = self.current
+        self.current = [t, o, max(h, price), min(l, price), price, self.target[4] * (i + 1) / ticks]
+        return price
+
+    def close_candle(self):
+        self.closed.append(tuple(self.current))
+        if len(self.closed) > 5000:
+            del self.closed[:1000]
+
+    def klines(self, limit: int, start_time=None, end_time=None, candle_ms: int = None) -> list:
+        """Свечи как в /fapi/v1/klines; candle_ms крупнее своего - собираются из своих свечей"""
+        rows = self.closed + ([tuple(self.current)] if self.current else [])
+        candle_ms = candle_ms or self.candle_ms
+        if candle_ms != self.candle_ms:
+            arr = np.array(rows, dtype=np.float64)
+            times, ohlcv = resample_arrays(arr[:, 0].astype(np.int64), arr[:, 1:], candle_ms)
+            rows = [(t, *row) for t, row in zip(times.tolist(), ohlcv.tolist())]
+        if start_time is not None:
+            rows = [r for r in rows if r[0] >= start_time][:limit]
+        else:
+            if end_time is not None:
+                rows = [r for r in rows if r[0] <= end_time]
+            rows = rows[-limit:]
+        return [[int(t), f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.3f}",
+                 int(t) + candle_ms - 1, f"{v * c:.4f}", 100, f"{v / 2:.3f}", f"{v * c / 2:.4f}", "0"]
+                for t, o, h, l, c, v in rows]
+
+    def ticker(self, now_ms: int) -> dict:
+        day = self.closed[-(86_400_000 // self.candle_ms):] + ([tuple(self.current)] if self.current else [])
+        last = day[-1][4]
+        first = day[0][1]
+        high = max(r[2] for r in day)
+        low = min(r[3] for r in day)
+        volume = sum(r[5] for r in day) * 1000
+        return {"symbol": self.symbol, "priceChange": f"{last - first:.8f}",
+                "priceChangePercent": f"{(last / first - 1) * 100:.3f}",
+                "lastPrice": f"{last:.8f}", "openPrice": f"{first:.8f}",
+                "highPrice": f"{high:.8f}", "lowPrice": f"{low:.8f}",
+                "volume": f"{volume:.3f}", "quoteVolume": f"{volume * last:.4f}",
+                "openTime": now_ms - 86_400_000, "closeTime": now_ms, "count": self.trade_id}
+
+
+def load_recorded(replay_dir: str, interval: str = BASE_TIMEFRAME) -> dict:
+    """{symbol: (open_times, ohlcv)} из файлов kline_disk_cache"""
+    from kline_disk_cache import KLINE_DTYPE
+    out = {}
+    suffix = f"_{interval}.bin"
+    for name in sorted(os.listdir(replay_dir)):
+        if name.endswith(suffix):
+            data = np.fromfile(os.path.join(replay_dir, name), dtype=KLINE_DTYPE)
+            if len(data):
+                out[name[:-len(suffix)]] = (data["t"], np.column_stack(
+                    [data["o"], data["h"], data["l"], data["c"], data["v"]]))
+    return out
+
+
+class ExchangeSimulator:
+    def __init__(self, symbols: int = 50, history: int = 1500, speed: float = 1.0,
+                 tick_ms: int = 250, replay_dir: str = None, seed: int = 1,
+                 interval: str = BASE_TIMEFRAME,
+                 disconnect_every: float = 0, spike_prob: float = 0.0, spike_ms: float = 0,
+                 burst_every: float = 0, burst_size: int = 0, rest_latency_ms: float = 0):
+        self.rng = np.random.default_rng(seed)
+        self.speed = speed
+        self.tick_ms = tick_ms
+        self.interval = interval
+        self.candle_ms = interval_ms(interval)
+        self.ticks_per_candle = max(1, self.candle_ms // tick_ms)
+        self.disconnect_every = disconnect_every
+        self.spike_prob = spike_prob
+        self.spike_ms = spike_ms
+        self.burst_every = burst_every
+        self.burst_size = burst_size
+        self.rest_latency_ms = rest_latency_ms
+        self.latency_until = 0.0   # ручной всплеск задержки (POST /_sim/latency)
+        self.latency_extra_ms = 0.0
+
+        now = int(time.time() * 1000)
+        self.sim_time = now - now % self.candle_ms  # начало текущей свечи
+        self.feeds = {}
+        if replay_dir:
+            for sym, (times, ohlcv) in load_recorded(replay_dir, interval).items():
+                split = min(history, max(1, len(times) - 1))
+                hist = np.column_stack([self.sim_time - (split - np.arange(split)) * self.candle_ms,
+                                        ohlcv[:split]])
+                self.feeds[sym] = SymbolFeed(sym, hist, iter(map(tuple, ohlcv[split:])), self.rng,
+                                             self.candle_ms)
+        for i in range(len(self.feeds), symbols):
+            sym = f"SIM{i:03d}USDT"
+            times = self.sim_time - (history - np.arange(history)) * self.candle_ms
+            close = (10.0 + i) * np.exp(np.cumsum(self.rng.normal(0, 0.003, history)))
+            open_ = np.concatenate([[close[0]], close[:-1]])
+            spread = np.abs(self.rng.normal(0, 0.002, history)) * close
+            hist = np.column_stack([times, open_, np.maximum(open_, close) + spread,
+                                    np.minimum(open_, close) - spread, close,
+                                    self.rng.uniform(100, 1000, history)])
+            self.feeds[sym] = SymbolFeed(sym, hist, None, self.rng, self.candle_ms)
+        for feed in self.feeds.values():
+            feed.start_candle(self.sim_time, self.ticks_per_candle)
+
+        self.tick_index = 0
+        self.connections = {}  # ws -> set(streams)
+        self.stats = {"connections": 0, "disconnects": 0, "messages": 0, "bursts": 0,
+                      "spikes": 0, "rest_requests": 0}
+        self._weight = [0, 0]  # (minute, used)
+
+    # ---------- генерация событий ----------
+    def _kline_event(self, feed: SymbolFeed, closed: bool) -> dict:
+        t, o, h, l, c, v = feed.current
+        return {"e": "kline", "E": self.sim_time, "s": feed.symbol, "k": {
+            "t": int(t), "T": int(t) + self.candle_ms - 1, "s": feed.symbol, "i": self.interval,
+            "o": f"{o:.8f}", "c": f"{c:.8f}", "h": f"{h:.8f}", "l": f"{l:.8f}",
+            "v": f"{v:.3f}", "n": feed.trade_id, "x": closed, "q": f"{v * c:.4f}"}}
+
+    def _trade_event(self, feed: SymbolFeed, price: float) -> dict:
+        feed.trade_id += 1
+        return {"e": "aggTrade", "E": self.sim_time, "s": feed.symbol, "a": feed.trade_id,
+                "p": f"{price:.8f}", "q": f"{float(self.rng.uniform(0.01, 5)):.3f}",
+                "T": self.sim_time, "m": bool(self.rng.random() < 0.5)}
+
+    def _ticker_event(self, feed: SymbolFeed) -> dict:
+        t = feed.ticker(self.sim_time)
+        return {"e": "24hrTicker", "E": self.sim_time, "s": feed.symbol, "p": t["priceChange"],
+                "P": t["priceChangePercent"], "c": t["lastPrice"], "o": t["openPrice"],
+                "h": t["highPrice"], "l": t["lowPrice"], "v": t["volume"], "q": t["quoteVolume"],
+                "O": t["openTime"], "C": t["closeTime"], "n": t["count"]}
+
+    def step(self) -> dict:
+        """Один тик симуляции: {stream: [payload, ...]}"""
+        events = {}
+        i = self.tick_index
+        last_tick = i == self.ticks_per_candle - 1
+        # тикеры раз в секунду времени симуляции и только если на них кто-то подписан
+        send_ticker = (i * self.tick_ms) % 1000 < self.tick_ms and any(
+            s.endswith("@ticker") or s == "!ticker@arr" for streams in self.connections.values() for s in streams)
+        tickers = []
+        for feed in self.feeds.values():
+            price = feed.tick(i, self.ticks_per_candle)
+            sym = feed.symbol.lower()
+            events[f"{sym}@kline_{self.interval}"] = [self._kline_event(feed, last_tick)]
+            events[f"{sym}@aggTrade"] = [self._trade_event(feed, price)]
+            if send_ticker:
+                tickers.append(self._ticker_event(feed))
+                events[f"{sym}@ticker"] = [tickers[-1]]
+        if tickers:
+            events["!ticker@arr"] = [tickers]
+        self.sim_time += self.tick_ms
+        self.tick_index += 1
+        if last_tick:
+            self.tick_index = 0
+            for feed in self.feeds.values():
+                feed.close_candle()
+                feed.start_candle(feed.current[0] + self.candle_ms, self.ticks_per_candle)
+        return events
+
+    def burst_events(self, n: int) -> dict:
+        """n дополнительных обновлений kline (повтор текущего состояния) разом"""
+        feeds = list(self.feeds.values())
+        events = {}
+        for j in range(n):
+            feed = feeds[j % len(feeds)]
+            events.setdefault(f"{feed.symbol.lower()}@kline_{self.interval}", []).append(
+                self._kline_event(feed, False))
+        return events
+
+    # ---------- websockets ----------
+    async def broadcast(self, events: dict):
+        async def send(ws, streams):
+            try:
+                for stream in streams:
+                    for payload in events.get(stream, ()):
+                        await ws.send_str(json.dumps({"stream": stream, "data": payload}))
+                        self.stats["messages"] += 1
+            except (ConnectionResetError, RuntimeError):
+                pass
+        await asyncio.gather(*(send(ws, streams) for ws, streams in list(self.connections.items())))
+
+    async def handle_ws(self, request):
+        if "streams" in request.query:
+            streams = set(request.query["streams"].split("/"))
+        else:
+            streams = {request.match_info.get("stream", "")}
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.connections[ws] = {s.lower() for s in streams if s}
+        self.stats["connections"] += 1
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    # {"method": "SUBSCRIBE"/"UNSUBSCRIBE", "params": [...], "id": n}
+                    req = json.loads(msg.data)
+                    params = {p.lower() for p in req.get("params", [])}
+                    if req.get("method") == "SUBSCRIBE":
+                        self.connections[ws] |= params
+                    elif req.get("method") == "UNSUBSCRIBE":
+                        self.connections[ws] -= params
+                    await ws.send_str(json.dumps({"result": None, "id": req.get("id")}))
+        finally:
+            self.connections.pop(ws, None)
+        return ws
+
+    async def disconnect_all(self):
+        for ws in list(self.connections):
+            await ws.close(code=1001, message=b"simulated disconnect")
+        self.stats["disconnects"] += 1
+
+    # ---------- REST ----------
+    def _weight_headers(self, weight: int) -> dict:
+        minute = int(time.time() // 60)
+        if self._weight[0] != minute:
+            self._weight = [minute, 0]
+        self._weight[1] += weight
+        return {"X-MBX-USED-WEIGHT-1M": str(self._weight[1])}
+
+    async def _rest_delay(self):
+        delay = self.rest_latency_ms
+        if time.monotonic() < self.latency_until:
+            delay += self.latency_extra_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+    async def handle_klines(self, request):
+        self.stats["rest_requests"] += 1
+        await self._rest_delay()
+        q = request.query
+        feed = self.feeds.get(q.get("symbol", "").upper())
+        if feed is None:
+            return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400)
+        candle_ms = interval_ms(q.get("interval", self.interval))
+        if candle_ms < self.candle_ms or candle_ms % self.candle_ms:
+            return web.json_response({"code": -1120, "msg": "Invalid interval."}, status=400)
+        limit = min(int(q.get("limit", 500)), 1500)
+        rows = feed.klines(limit, int(q["startTime"]) if "startTime" in q else None,
+                           int(q["endTime"]) if "endTime" in q else None, candle_ms)
+        weight = 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+        return web.json_response(rows, headers=self._weight_headers(weight))
+
+    async def handle_ticker(self, request):
+        self.stats["rest_requests"] += 1
+        await self._rest_delay()
+        symbol = request.query.get("symbol")
+        if symbol:
+            feed = self.feeds.get(symbol.upper())
+            if feed is None:
+                return web.json_response({"code": -1121, "msg": "Invalid symbol."}, status=400)
+            return web.json_response(feed.ticker(self.sim_time), headers=self._weight_headers(1))
+        return web.json_response([f.ticker(self.sim_time) for f in self.feeds.values()],
+                                 headers=self._weight_headers(40))
+
+    async def handle_ping(self, request):
+        return web.json_response({})
+
+    async def handle_time(self, request):
+        return web.json_response({"serverTime": self.sim_time})
+
+    async def handle_admin(self, request):
+        action = request.match_info["action"]
+        if action == "disconnect":
+            await self.disconnect_all()
+        elif action == "burst":
+            await self.broadcast(self.burst_events(int(request.query.get("n", 1000))))
+            self.stats["bursts"] += 1
+        elif action == "latency":
+            self.latency_extra_ms = float(request.query.get("ms", 500))
+            self.latency_until = time.monotonic() + float(request.query.get("seconds", 10))
+        elif action != "stats":
+            raise web.HTTPNotFound()
+        return web.json_response(dict(self.stats, symbols=len(self.feeds), sim_time=self.sim_time,
+                                      open_connections=len(self.connections)))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/stream", self.handle_ws)
+        app.router.add_get("/ws/{stream}", self.handle_ws)
+        app.router.add_get("/fapi/v1/klines", self.handle_klines)
+        app.router.add_get("/fapi/v1/ticker/24hr", self.handle_ticker)
+        for prefix in ("/fapi/v1", "/api/v3"):
+            app.router.add_get(f"{prefix}/ping", self.handle_ping)
+            app.router.add_get(f"{prefix}/time", self.handle_time)
+        app.router.add_route("*", "/_sim/{action}", self.handle_admin)
+        return app
+
+    # ---------- главный цикл ----------
+    async def run_market(self):
+        interval = self.tick_ms / 1000 / self.speed
+        next_tick = time.monotonic()
+        last_disconnect = last_burst = time.monotonic()
+        while True:
+            events = self.step()
+            if self.spike_prob and random.random() < self.spike_prob:
+                self.stats["spikes"] += 1
+                await asyncio.sleep(self.spike_ms / 1000)
+            if time.monotonic() < self.latency_until:
+                await asyncio.sleep(self.latency_extra_ms / 1000)
+            await self.broadcast(events)
+
+            now = time.monotonic()
+            if self.disconnect_every and now - last_disconnect >= self.disconnect_every:
+                last_disconnect = now
+                await self.disconnect_all()
+            if self.burst_every and self.burst_size and now - last_burst >= self.burst_every:
+                last_burst = now
+                self.stats["bursts"] += 1
+                await self.broadcast(self.burst_events(self.burst_size))
+
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9200):
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"🧪 Симулятор биржи: http://{host}:{port} ({len(self.feeds)} символов, x{self.speed})")
+        try:
+            await self.run_market()
+        finally:
+            await runner.cleanup()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--symbols", type=int, default=50, help="число синтетических символов")
+    parser.add_argument("--history", type=int, default=1500, help="закрытых свечей до старта")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение времени")
+    parser.add_argument("--interval", default=BASE_TIMEFRAME, help="таймфрейм стрима kline")
+    parser.add_argument("--tick-ms", type=int, default=250, help="шаг обновлений (время симуляции)")
+    parser.add_argument("--replay-dir", help="каталог kline_disk_cache для воспроизведения записей")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--disconnect-every", type=float, default=0, help="секунд между разрывами")
+    parser.add_argument("--spike-prob", type=float, default=0.0, help="вероятность всплеска задержки на тик")
+    parser.add_argument("--spike-ms", type=float, default=500)
+    parser.add_argument("--burst-every", type=float, default=0, help="секунд между пачками сообщений")
+    parser.add_argument("--burst-size", type=int, default=0)
+    parser.add_argument("--rest-latency-ms", type=float, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sim = ExchangeSimulator(
+        symbols=args.symbols, history=args.history, speed=args.speed, tick_ms=args.tick_ms,
+        interval=args.interval,
+        replay_dir=args.replay_dir, seed=args.seed, disconnect_every=args.disconnect_every,
+        spike_prob=args.spike_prob, spike_ms=args.spike_ms, burst_every=args.burst_every,
+        burst_size=args.burst_size, rest_latency_ms=args.rest_latency_ms)
+    try:
+        asyncio.run(sim.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,245 @@
+import asyncio
+import time
+import aiohttp
+import numpy as np
+from config import (
+    DRY_RUN, KLINES_LIMIT, HISTORY_CONCURRENCY, HISTORY_WEIGHT_LIMIT, HISTORY_RETRIES,
+    KLINE_CACHE_ENABLED, BASE_TIMEFRAME, RESAMPLE_MIN_HISTORY
+)
+from binance_client import fetch_historical_klines
+from client_manager import get_client
+from data_store import set_timeframe_store, get_timeframe_store
+from kline_disk_cache import load_cached, append_candles, is_contiguous
+from kline_store import KlineStore
+from resampler import seed_resampler, TARGET_TIMEFRAMES
+from utils import interval_ms
+
+# Параллельная загрузка истории свечей для многих символов сразу.
+# Ограничения: семафор на число одновременных запросов + бюджет веса запросов
+# в минуту (по заголовку X-MBX-USED-WEIGHT-1M). Свечи пишутся прямо в KlineStore.
+# Если есть локальный кеш закрытых свечей (kline_disk_cache), догружается только разрыв.
+
+MAX_PAGE = 1500  # максимум futures_klines за один запрос
+
+
+def klines_weight(limit: int) -> int:
+    """Вес futures_klines по документации Binance"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class WeightBudget:
+    """Бюджет веса REST-запросов в текущей минуте"""
+
+    def __init__(self, limit: int = HISTORY_WEIGHT_LIMIT):
+        self.limit = limit
+        self.used = 0
+        self._minute = int(time.time() // 60)
+        self._lock = asyncio.Lock()
+
+    def _roll(self, now: float):
+        minute = int(now // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self.used = 0
+
+    async def acquire(self, weight: int):
+        async with self._lock:
+            while True:
+                now = time.time()
+                self._roll(now)
+                if self.used + weight <= self.limit:
+                    self.used += weight
+                    return
+                wait = 60 - now % 60 + 0.1
+                print(f"[history] лимит веса {self.used}/{self.limit}, ждём {wait:.1f} с")
+                await asyncio.sleep(wait)
+
+    def observe(self, headers):
+        """Сервер знает точный вес (включая чужие запросы с этого IP) - доверяем ему"""
+        used = headers.get("X-MBX-USED-WEIGHT-1M") if headers is not None else None
+        if used:
+            self._roll(time.time())
+            self.used = max(self.used, int(used))
+
+
+async def _request_klines(client, budget: WeightBudget, **params):
+    from binance.exceptions import BinanceAPIException
+    delay = 1
+    for attempt in range(HISTORY_RETRIES):
+        await budget.acquire(klines_weight(params.get("limit", 500)))
+        try:
+            raw = await client.futures_klines(**params)
+            budget.observe(getattr(client.response, "headers", None))
+            return raw
+        except BinanceAPIException as e:
+            if e.status_code not in (418, 429) and (e.status_code or 0) < 500:
+                raise
+            headers = getattr(e.response, "headers", None)
+            budget.observe(headers)
+            retry_after = headers.get("Retry-After") if headers is not None else None
+            wait = float(retry_after) if retry_after else delay
+            print(f"[history] {params['symbol']}: {e.status_code} {e.message}, повтор через {wait} с")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            wait = delay
+            print(f"[history] {params['symbol']}: {e!r}, повтор через {wait} с")
+        await asyncio.sleep(wait)
+        delay = min(delay * 2, 30)
+    raise RuntimeError(f"{params['symbol']}: история не загружена за {HISTORY_RETRIES} попыток")
+
+
+async def fetch_klines_raw(symbol: str, interval: str, limit: int, budget: WeightBudget,
+                           start_time: int = None) -> list:
+    """Последние limit свечей страницами по MAX_PAGE (назад по endTime).
+    С start_time - свечи начиная с него вперёд, но не больше limit."""
+    client = await get_client()
+    pages = []
+    remaining = limit
+    end_time = None
+    while remaining > 0:
+        params = {"symbol": symbol, "interval": interval, "limit": min(remaining, MAX_PAGE)}
+        if start_time is not None:
+            params["startTime"] = start_time
+        elif end_time is not None:
+            params["endTime"] = end_time
+        page = await _request_klines(client, budget, **params)
+        if not page:
+            break
+        pages.append(page)
+        remaining -= len(page)
+        if len(page) < params["limit"]:
+            break
+        if start_time is not None:
+            start_time = int(page[-1][0]) + 1
+        else:
+            end_time = int(page[0][0]) - 1
+    if start_time is None:
+        pages.reverse()
+    return [row for page in pages for row in page]
+
+
+def fill_store(store: KlineStore, rows: list):
+    if not rows:
+        return
+    arr = np.array([r[:6] for r in rows], dtype=np.float64)
+    store.extend(arr[:, 0].astype(np.int64), arr[:, 1:6])
+
+
+def save_closed_rows(symbol: str, interval: str, rows: list, keep: int):
+    """Сохраняет в дисковый кеш только закрытые свечи (close time уже в прошлом)"""
+    now_ms = int(time.time() * 1000)
+    closed = [r[:6] for r in rows if int(r[6]) < now_ms]
+    if closed:
+        arr = np.array(closed, dtype=np.float64)
+        append_candles(symbol, interval, arr[:, 0].astype(np.int64), arr[:, 1:6], keep=keep)
+
+
+async def fetch_with_cache(symbol: str, interval: str, limit: int, budget: WeightBudget,
+                           store: KlineStore) -> list:
+    """Заполняет store из дискового кеша и возвращает только недостающие свечи с REST"""
+    cached = load_cached(symbol, interval, limit)
+    if cached is not None and not is_contiguous(cached[0], interval):
+        # файл старого формата с дырами - надёжнее загрузить всё заново
+        print(f"[history] {symbol}: разрыв в дисковом кеше, полная загрузка")
+        cached = None
+    if cached is not None:
+        open_times, ohlcv = cached
+        gap = (int(time.time() * 1000) - int(open_times[-1])) // interval_ms(interval)
+        if len(open_times) + gap >= limit and gap < limit:
+            store.extend(open_times, ohlcv)
+            return await fetch_klines_raw(symbol, interval, gap + 1, budget,
+                                          start_time=int(open_times[-1]) + 1)
+    return await fetch_klines_raw(symbol, interval, limit, budget)
+
+
+async def load_history(symbols, interval: str, limit: int = KLINES_LIMIT,
+                       concurrency: int = HISTORY_CONCURRENCY, budget: WeightBudget = None,
+                       use_cache: bool = KLINE_CACHE_ENABLED) -> dict:
+    """Загружает историю всех символов в klines_cache (или timeframe_cache, если interval
+    не TIMEFRAME). Возвращает {symbol: число свечей}"""
+    if DRY_RUN:
+        loaded = {}
+        for s in symbols:
+            df = await fetch_historical_klines(s, interval=interval, limit=limit)
+            store = KlineStore.from_dataframe(df, capacity=max(limit, KLINES_LIMIT))
+            set_timeframe_store(s, interval, store)
+            loaded[s] = len(store)
+        return loaded
+
+    budget = budget or WeightBudget()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    capacity = max(limit, KLINES_LIMIT)
+
+    async def load_one(symbol):
+        store = KlineStore(capacity=capacity)
+        async with semaphore:
+            try:
+                if use_cache:
+                    rows = await fetch_with_cache(symbol, interval, limit, budget, store)
+                else:
+                    rows = await fetch_klines_raw(symbol, interval, limit, budget)
+            except Exception as e:
+                print(f"❌ Ошибка загрузки {symbol}: {e}")
+                return symbol, 0
+        fill_store(store, rows)
+        if use_cache:
+            try:
+                save_closed_rows(symbol, interval, rows, keep=capacity)
+            except OSError as e:
+                print(f"[WARN] Не удалось сохранить свечи {symbol} на диск: {e}")
+        if not store.empty:
+            set_timeframe_store(symbol, interval, store)
+        return symbol, len(store)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(load_one(s) for s in symbols))
+    print(f"[history] {len(symbols)} символов за {time.perf_counter() - started:.2f} с, "
+          f"вес в минуте: {budget.used}")
+    return dict(results)
+
+
+def history_plan(timeframe: str, targets, limit: int = KLINES_LIMIT, base: str = BASE_TIMEFRAME,
+                 min_history: int = RESAMPLE_MIN_HISTORY, now_ms: int = None) -> dict:
+    """Что грузить с REST для резэмплера: {таймфрейм: число свечей}.
+    База - только свечи текущего бакета самого длинного таймфрейма (с них продолжается стрим);
+    TIMEFRAME нужен на limit свечей, остальные цели - на min_history. Цель, которую можно
+    собрать из уже загружаемого более мелкого таймфрейма, отдельно не грузится."""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    base_ms = interval_ms(base)
+    longest = max([interval_ms(tf) for tf in targets] + [base_ms])
+    fetch = {base: now_ms % longest // base_ms + 1}
+    if timeframe == base:
+        fetch[base] = max(fetch[base], limit)
+    for tf in sorted(targets, key=interval_ms):
+        ms = interval_ms(tf)
+        need = limit if tf == timeframe else min_history
+        if not any(ms % interval_ms(f) == 0 and n * interval_ms(f) // ms >= need for f, n in fetch.items()):
+            fetch[tf] = need
+    return fetch
+
+
+async def load_resampled_history(symbols, interval: str, limit: int = KLINES_LIMIT,
+                                 budget: WeightBudget = None, **kwargs) -> dict:
+    """История для резэмплера по history_plan: вес REST - по реально нужной глубине каждого
+    таймфрейма, а не limit свечей interval в пересчёте на базовый. Остальное собирает
+    seed_resampler. Возвращает {symbol: число свечей interval}"""
+    plan = history_plan(interval, TARGET_TIMEFRAMES, limit)
+    print("[history] план загрузки:", ", ".join(f"{tf} x{n}" for tf, n in plan.items()))
+    budget = budget or WeightBudget()
+    loads = await asyncio.gather(*(load_history(symbols, tf, limit=n, budget=budget, **kwargs)
+                                   for tf, n in plan.items()))
+    result = {}
+    for s in symbols:
+        if not all(loaded.get(s) for loaded in loads):
+            result[s] = 0
+            continue
+        seed_resampler(s)
+        store = get_timeframe_store(s, interval)
+        result[s] = len(store) if store is not None else 0
+    return result
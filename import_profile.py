@@ -0,0 +1,75 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import NamedTuple
+from config import STARTUP_IMPORT_BUDGET
+
+# Время импорта модуля (по умолчанию main) в чистом интерпретаторе: python -X importtime.
+# Отчёт - самые дорогие модули по накопленному времени и сводка по пакетам верхнего уровня.
+# Запуск: python import_profile.py [module] [--top 20] [--budget 1.0]
+# (с --budget код выхода 1, если импорт дольше бюджета - для проверки перед релизом).
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str = "main") -> list:
+    """Записи -X importtime для `import module` в отдельном процессе"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} упал:\n{proc.stderr[-2000:]}")
+    records = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative),
+                                    (len(name) - len(name.lstrip())) // 2))
+    return records
+
+
+def total_seconds(records: list, module: str = "main") -> float:
+    return next((r.cumulative_us for r in records if r.module == module and r.depth == 0), 0) / 1e6
+
+
+def report(records: list, module: str = "main", top: int = 20) -> str:
+    lines = [f"import {module}: {total_seconds(records, module):.3f} с", "",
+             f"{'накопл., мс':>12} {'своё, мс':>9}  модуль"]
+    for r in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        lines.append(f"{r.cumulative_us / 1000:>12.1f} {r.self_us / 1000:>9.1f}  {'  ' * r.depth}{r.module}")
+    packages = {}
+    for r in records:
+        name = r.module.split(".")[0]
+        packages[name] = packages.get(name, 0) + r.self_us
+    lines += ["", "по пакетам (своё время, мс):"]
+    for name, us in sorted(packages.items(), key=lambda x: x[1], reverse=True)[:top]:
+        lines.append(f"{us / 1000:>12.1f}  {name}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Профиль времени импорта")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget", type=float, nargs="?", const=STARTUP_IMPORT_BUDGET,
+                        help=f"бюджет, с (без значения - STARTUP_IMPORT_BUDGET = {STARTUP_IMPORT_BUDGET})")
+    args = parser.parse_args(argv)
+    records = profile_imports(args.module)
+    print(report(records, args.module, args.top))
+    if args.budget is not None:
+        seconds = total_seconds(records, args.module)
+        if seconds > args.budget:
+            print(f"\n❌ import {args.module}: {seconds:.3f} с > бюджета {args.budget} с")
+            return 1
+        print(f"\n✅ import {args.module}: {seconds:.3f} с в пределах {args.budget} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
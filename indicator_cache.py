@@ -0,0 +1,83 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from config import INDICATOR_CACHE_SIZE
+from data_store import indicator_matrix_cache
+from utils import rsi, atr
+
+# Матрица индикаторов одного окна свечей для оптимизации: каждый ряд (индикатор, период)
+# считается один раз и переиспользуется всеми точками сетки/поиска - векторным бэктестом
+# и BBRSI_EMA_Strategy/Breakout_Strategy.init в FractionalBacktest.
+# Полосы Боллинджера для любого bol_dev собираются из общих rolling mean/std периода
+# теми же операциями, что в ta.volatility.BollingerBands, поэтому значения совпадают
+# с utils.bol_h/bol_l бит в бит.
+# Матрицы лежат в indicator_matrix_cache по отпечатку (High, Low, Close) окна, LRU по
+# INDICATOR_CACHE_SIZE окон - в каждом процессе пула свой кеш.
+
+
+class IndicatorMatrix:
+    def __init__(self, high, low, close):
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self._series = {}
+        self.stats = {"computed": 0, "reused": 0}
+
+    def _get(self, key, compute):
+        value = self._series.get(key)
+        if value is None:
+            value = self._series[key] = compute()
+            self.stats["computed"] += 1
+        else:
+            self.stats["reused"] += 1
+        return value
+
+    def ema(self, span: int = 200) -> np.ndarray:
+        return self._get(("ema", span),
+                         lambda: pd.Series(self.close).ewm(span=span, adjust=False).mean().to_numpy())
+
+    def rsi(self, period: int = 14) -> np.ndarray:
+        return self._get(("rsi", period), lambda: rsi(self.close, period))
+
+    def mean(self, period: int) -> np.ndarray:
+        return self._get(("mean", period), lambda: pd.Series(self.close).rolling(period).mean().to_numpy())
+
+    def std(self, period: int) -> np.ndarray:
+        return self._get(("std", period), lambda: pd.Series(self.close).rolling(period).std(ddof=0).to_numpy())
+
+    def bol_h(self, period: int = 40, dev: float = 2) -> np.ndarray:
+        return self._get(("bol_h", period, dev), lambda: self.mean(period) + dev * self.std(period))
+
+    def bol_l(self, period: int = 40, dev: float = 2) -> np.ndarray:
+        return self._get(("bol_l", period, dev), lambda: self.mean(period) - dev * self.std(period))
+
+    def atr(self, period: int = 14) -> np.ndarray:
+        # ta.AverageTrueRange не считается на окне короче периода - тогда ATR нет (нули)
+        return self._get(("atr", period),
+                         lambda: atr(self.high, self.low, self.close, period)
+                         if len(self.close) >= period else np.zeros(len(self.close)))
+
+    def highest(self, period: int) -> np.ndarray:
+        return self._get(("highest", period), lambda: pd.Series(self.high).rolling(period).max().to_numpy())
+
+    def lowest(self, period: int) -> np.ndarray:
+        return self._get(("lowest", period), lambda: pd.Series(self.low).rolling(period).min().to_numpy())
+
+
+def window_fingerprint(high, low, close) -> str:
+    h = hashlib.sha1()
+    for arr in (high, low, close):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def get_matrix(high, low, close) -> IndicatorMatrix:
+    """Матрица индикаторов окна (High, Low, Close) из кеша или новая"""
+    key = window_fingerprint(high, low, close)
+    matrix = indicator_matrix_cache.pop(key, None)
+    if matrix is None:
+        matrix = IndicatorMatrix(high, low, close)
+        while len(indicator_matrix_cache) >= INDICATOR_CACHE_SIZE:
+            indicator_matrix_cache.pop(next(iter(indicator_matrix_cache)))
+    indicator_matrix_cache[key] = matrix  # в конец - самая свежая
+    return matrix
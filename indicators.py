@@ -0,0 +1,335 @@
+import math
+from collections import deque
+from data_store import klines_cache, indicators_cache
+
+# Потоковые индикаторы: O(1) на обновление свечи.
+# Каждый индикатор хранит "зафиксированное" состояние по предыдущим свечам и значение
+# с учётом текущей (открытой) свечи. Пока свеча не закрыта, её обновление просто
+# пересчитывает значение от зафиксированного состояния - это и есть откат.
+# Формулы совпадают с ta / pandas (см. utils.bol_h, bol_l, rsi, ema200, atr).
+
+NAN = float("nan")
+
+
+class StreamingIndicator:
+    source = "Close"
+
+    def __init__(self):
+        self.value = NAN  # значение на текущей свече
+        self.prev = NAN   # значение на предыдущей свече
+        self._pending = None
+
+    def reset(self):
+        self.__init__(*self.args)
+
+    def update(self, x: float, new_candle: bool):
+        if new_candle and self._pending is not None:
+            self._commit(self._pending)
+            self.prev = self.value
+        self._pending = x
+        self.value = self._peek(x)
+        return self.value
+
+    def _peek(self, x):
+        raise NotImplementedError
+
+    def _commit(self, x):
+        raise NotImplementedError
+
+
+class EMA(StreamingIndicator):
+    """pandas ewm(span, adjust=False).mean()"""
+
+    def __init__(self, span: int = 200):
+        super().__init__()
+        self.args = (span,)
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self._ema = None
+
+    def _peek(self, x):
+        return x if self._ema is None else self._ema + self.alpha * (x - self._ema)
+
+    def _commit(self, x):
+        self._ema = self._peek(x)
+
+
+class RSI(StreamingIndicator):
+    """ta.momentum.RSIIndicator: сглаживание Уайлдера (alpha = 1 / period)"""
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.args = (period,)
+        self.period = period
+        self.alpha = 1 / period
+        self._prev_close = None
+        self._up = 0.0
+        self._down = 0.0
+        self._count = 0
+
+    def _step(self, x):
+        if self._prev_close is None:
+            return 0.0, 0.0
+        diff = x - self._prev_close
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else 0.0
+        if self._count == 0:
+            return up, down
+        return (self._up + self.alpha * (up - self._up),
+                self._down + self.alpha * (down - self._down))
+
+    def _peek(self, x):
+        if self._count + 1 < self.period:
+            return NAN
+        up, down = self._step(x)
+        if down == 0:
+            return 100.0
+        return 100 - 100 / (1 + up / down)
+
+    def _commit(self, x):
+        self._up, self._down = self._step(x)
+        self._prev_close = x
+        self._count += 1
+
+
+class ATR(StreamingIndicator):
+    """ta.volatility.AverageTrueRange: первое значение - среднее TR за period свечей,
+    дальше сглаживание Уайлдера; до period-й свечи 0, как в ta"""
+    source = ("High", "Low", "Close")
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.args = (period,)
+        self.period = period
+        self._prev_close = None
+        self._sum = 0.0  # сумма TR первых period свечей
+        self._atr = 0.0
+        self._count = 0
+
+    def _tr(self, x):
+        high, low, _ = x
+        if self._prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+
+    def _peek(self, x):
+        n = self._count + 1
+        if n < self.period:
+            return 0.0
+        if n == self.period:
+            return (self._sum + self._tr(x)) / self.period
+        return (self._atr * (self.period - 1) + self._tr(x)) / self.period
+
+    def _commit(self, x):
+        self._atr = self._peek(x)
+        if self._count < self.period:
+            self._sum += self._tr(x)
+        self._prev_close = x[2]
+        self._count += 1
+
+
+class Bollinger(StreamingIndicator):
+    """ta.volatility.BollingerBands: скользящее среднее и std (ddof=0).
+    value = (mavg, std); суммы считаются со сдвигом и периодически пересобираются,
+    чтобы не копить ошибку округления."""
+
+    def __init__(self, period: int = 40, dev: float = 2):
+        super().__init__()
+        self.args = (period, dev)
+        self.period = period
+        self.dev = dev
+        self.value = self.prev = (NAN, NAN)
+        self._window = deque()  # последние period - 1 зафиксированных значений
+        self._shift = None
+        self._sum = 0.0
+        self._sq = 0.0
+        self._since_resync = 0
+
+    def _peek(self, x):
+        if len(self._window) + 1 < self.period:
+            return NAN, NAN
+        shift = self._shift if self._shift is not None else x
+        d = x - shift
+        mean = (self._sum + d) / self.period
+        var = (self._sq + d * d) / self.period - mean * mean
+        return shift + mean, math.sqrt(var) if var > 0 else 0.0
+
+    def _commit(self, x):
+        if self.period <= 1:
+            return
+        if self._shift is None:
+            self._shift = x
+        d = x - self._shift
+        self._window.append(x)
+        self._sum += d
+        self._sq += d * d
+        if len(self._window) > self.period - 1:
+            old = self._window.popleft() - self._shift
+            self._sum -= old
+            self._sq -= old * old
+        self._since_resync += 1
+        if self._since_resync >= self.period:
+            self._resync()
+
+    def _resync(self):
+        self._since_resync = 0
+        self._shift = sum(self._window) / len(self._window)
+        self._sum = sum(v - self._shift for v in self._window)
+        self._sq = sum((v - self._shift) ** 2 for v in self._window)
+
+    @property
+    def mavg(self) -> float:
+        return self.value[0]
+
+    @property
+    def hband(self) -> float:
+        return self.value[0] + self.dev * self.value[1]
+
+    @property
+    def lband(self) -> float:
+        return self.value[0] - self.dev * self.value[1]
+
+    @property
+    def prev_hband(self) -> float:
+        return self.prev[0] + self.dev * self.prev[1]
+
+    @property
+    def prev_lband(self) -> float:
+        return self.prev[0] - self.dev * self.prev[1]
+
+
+class RollingMax(StreamingIndicator):
+    """pandas rolling(period).max() на монотонной деке"""
+    source = "High"
+
+    def __init__(self, period: int = 20):
+        super().__init__()
+        self.args = (period,)
+        self.period = period
+        self._deque = deque()  # (индекс, значение), значения убывают
+        self._count = 0
+
+    def _better(self, a, b):
+        return a >= b
+
+    def _peek(self, x):
+        if self._count + 1 < self.period:
+            return NAN
+        if self._deque and self._better(self._deque[0][1], x):
+            return self._deque[0][1]
+        return x
+
+    def _commit(self, x):
+        dq = self._deque
+        while dq and self._better(x, dq[-1][1]):
+            dq.pop()
+        dq.append((self._count, x))
+        self._count += 1
+        # в деке остаются только последние period - 1 свечей
+        while dq and dq[0][0] <= self._count - self.period:
+            dq.popleft()
+
+
+class RollingMin(RollingMax):
+    """pandas rolling(period).min()"""
+    source = "Low"
+
+    def _better(self, a, b):
+        return a <= b
+
+
+class SymbolIndicators:
+    """Набор потоковых индикаторов одного символа, синхронизируемый с его KlineStore.
+    Индикаторы создаются лениво по параметрам и сразу прогреваются по истории."""
+
+    def __init__(self, store):
+        self.store = store
+        self._items = {}
+        self._revision = None
+        self._rewrites = None
+        self._open_time = None
+
+    def _get(self, key, factory):
+        ind = self._items.get(key)
+        if ind is None:
+            ind = self._items[key] = factory()
+            self._replay(ind)
+        return ind
+
+    def bollinger(self, period: int = 40, dev: float = 2) -> Bollinger:
+        return self._get(("bb", period, dev), lambda: Bollinger(period, dev))
+
+    def rsi(self, period: int = 14) -> RSI:
+        return self._get(("rsi", period), lambda: RSI(period))
+
+    def ema(self, span: int = 200) -> EMA:
+        return self._get(("ema", span), lambda: EMA(span))
+
+    def highest(self, period: int = 20) -> RollingMax:
+        return self._get(("max", period), lambda: RollingMax(period))
+
+    def lowest(self, period: int = 20) -> RollingMin:
+        return self._get(("min", period), lambda: RollingMin(period))
+
+    def atr(self, period: int = 14) -> ATR:
+        return self._get(("atr", period), lambda: ATR(period))
+
+    def _value(self, ind, i: int):
+        """Вход индикатора на свече i: число или кортеж (для source из нескольких колонок)"""
+        if isinstance(ind.source, tuple):
+            return tuple(float(self.store[c][i]) for c in ind.source)
+        return float(self.store[ind.source][i])
+
+    def _replay(self, ind):
+        if isinstance(ind.source, tuple):
+            rows = zip(*(self.store[c].tolist() for c in ind.source))
+        else:
+            rows = (float(x) for x in self.store[ind.source])
+        for x in rows:
+            ind.update(x, True)
+
+    def sync(self):
+        """Подтягивает индикаторы к текущему состоянию буфера: O(1), если с прошлой
+        синхронизации менялась только последняя свеча и добавилось не больше одной новой
+        (обновления между синхронизациями могут быть пропущены - буфер пишет другой процесс),
+        иначе полный прогрев."""
+        store = self.store
+        if self._revision == store.revision:
+            return self
+        n = len(store)
+        open_time = store.last_open_time if n else None
+        incremental = (
+            self._revision is not None
+            and self._open_time is not None
+            and open_time is not None
+            and store.rewrites == self._rewrites
+            and (open_time == self._open_time
+                 or n >= 2 and int(store.open_time[-2]) == self._open_time)
+        )
+        if incremental:
+            new_candle = open_time > self._open_time
+            for ind in self._items.values():
+                if new_candle:
+                    # финальное значение предыдущей свечи могло прийти без синхронизации
+                    ind.update(self._value(ind, -2), False)
+                ind.update(self._value(ind, -1), new_candle)
+        else:
+            # откат на несколько свечей или перезаливка истории - пересчёт с нуля
+            for ind in self._items.values():
+                ind.reset()
+                self._replay(ind)
+        self._revision = store.revision
+        self._rewrites = store.rewrites
+        self._open_time = open_time
+        return self
+
+
+def get_indicators(symbol: str):
+    """Индикаторы символа, синхронизированные с klines_cache, или None, если свечей нет"""
+    store = klines_cache.get(symbol)
+    if store is None or store.empty:
+        return None
+    ind = indicators_cache.get(symbol)
+    if ind is None or ind.store is not store:
+        ind = indicators_cache[symbol] = SymbolIndicators(store)
+    return ind.sync()
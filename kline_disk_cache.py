@@ -0,0 +1,127 @@
+import os
+import numpy as np
+from config import KLINE_CACHE_DIR
+from utils import interval_ms
+
+# Локальный кеш закрытых свечей: один бинарный файл записей фиксированной длины
+# на symbol/interval. Дописывается по мере закрытия свечей, читается через memmap,
+# так что после перезапуска с REST догружается только разрыв.
+# Файл всегда хранит непрерывный ряд: если новые свечи не продолжают его (свечи,
+# закрывшиеся пока стрим лежал), остаётся только последний непрерывный участок -
+# тогда при старте история грузится с REST целиком и снова ложится в файл.
+
+KLINE_DTYPE = np.dtype([("t", "<i8"), ("o", "<f8"), ("h", "<f8"),
+                        ("l", "<f8"), ("c", "<f8"), ("v", "<f8")])
+COMPACT_FACTOR = 4  # файл переписывается, когда в нём больше COMPACT_FACTOR * keep свечей
+
+_last_saved = {}  # path -> open time последней записанной свечи
+
+
+def cache_path(symbol: str, interval: str) -> str:
+    return os.path.join(KLINE_CACHE_DIR, f"{symbol}_{interval}.bin")
+
+
+def _read(path: str):
+    if not os.path.exists(path) or os.path.getsize(path) < KLINE_DTYPE.itemsize:
+        return None
+    rows = os.path.getsize(path) // KLINE_DTYPE.itemsize
+    return np.memmap(path, dtype=KLINE_DTYPE, mode="r", shape=(rows,))
+
+
+def load_cached(symbol: str, interval: str, limit: int):
+    """Последние limit закрытых свечей из кеша: (open_times, ohlcv) или None"""
+    data = _read(cache_path(symbol, interval))
+    if data is None:
+        return None
+    tail = np.array(data[-limit:])  # копия, чтобы не держать файл открытым
+    ohlcv = np.column_stack([tail["o"], tail["h"], tail["l"], tail["c"], tail["v"]])
+    return tail["t"], ohlcv
+
+
+def remove_cached(symbol: str, interval: str):
+    path = cache_path(symbol, interval)
+    _last_saved.pop(path, None)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _last_time(path: str):
+    if path not in _last_saved:
+        data = _read(path)
+        _last_saved[path] = int(data["t"][-1]) if data is not None else None
+    return _last_saved[path]
+
+
+def is_contiguous(open_times, interval: str) -> bool:
+    return bool(np.all(np.diff(open_times) == interval_ms(interval)))
+
+
+def append_candles(symbol: str, interval: str, open_times, ohlcv, keep: int = None):
+    """Дописывает закрытые свечи новее последней сохранённой. Возвращает число новых"""
+    path = cache_path(symbol, interval)
+    open_times = np.asarray(open_times, dtype=np.int64)
+    if not len(open_times):
+        return 0
+    records = np.empty(len(open_times), dtype=KLINE_DTYPE)
+    records["t"] = open_times
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    for i, name in enumerate(("o", "h", "l", "c", "v")):
+        records[name] = ohlcv[:, i]
+
+    step = interval_ms(interval)
+    last = _last_time(path)
+    os.makedirs(KLINE_CACHE_DIR, exist_ok=True)
+    if last is None or (open_times[0] == last + step and is_contiguous(open_times, interval)):
+        # обычный случай - свечи продолжают файл
+        with open(path, "ab") as f:
+            f.write(records.tobytes())
+        _last_saved[path] = int(records["t"][-1])
+        added = len(records)
+    else:
+        added = _merge(path, records, step)
+        if not added:
+            return 0
+
+    if keep and os.path.getsize(path) > COMPACT_FACTOR * keep * KLINE_DTYPE.itemsize:
+        _compact(path, keep)
+    return added
+
+
+def _merge(path: str, records, step: int) -> int:
+    """Сливает файл с records и оставляет последний непрерывный участок ряда"""
+    old = _read(path)
+    old = np.array(old) if old is not None else np.empty(0, dtype=KLINE_DTYPE)
+    merged = np.concatenate([old, records])
+    # при повторе open time остаётся последняя запись (новые свечи после старых)
+    _, last_index = np.unique(merged["t"][::-1], return_index=True)
+    merged = merged[len(merged) - 1 - last_index]  # np.unique сортирует по t
+    breaks = np.flatnonzero(np.diff(merged["t"]) != step)
+    if len(breaks):
+        merged = merged[breaks[-1] + 1:]
+    added = int(np.isin(merged["t"], old["t"], invert=True).sum())
+    if not added and len(merged) == len(old):
+        return 0
+    if len(breaks):
+        print(f"[kline cache] разрыв в свечах {os.path.basename(path)}: "
+              f"оставлено {len(merged)} непрерывных")
+    _write(path, merged)
+    _last_saved[path] = int(merged["t"][-1])
+    return added
+
+
+def persist_closed_candle(symbol: str, interval: str, open_time: int,
+                          o: float, h: float, l: float, c: float, v: float, keep: int = None):
+    append_candles(symbol, interval, [open_time], [[o, h, l, c, v]], keep)
+
+
+def _compact(path: str, keep: int):
+    _write(path, np.array(_read(path)[-keep:]))
+
+
+def _write(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data.tobytes())
+    os.replace(tmp, path)
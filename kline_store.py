@@ -0,0 +1,161 @@
+import numpy as np
+from config import KLINES_LIMIT
+
+COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class KlineStore:
+    """Кольцевой буфер свечей фиксированной ёмкости на NumPy-массивах.
+
+    Каждое значение пишется дважды (в ячейку i и i + capacity), поэтому последние
+    len(store) свечей всегда лежат в памяти подряд и отдаются как view без копирования.
+    Добавление свечи и обновление текущей - O(1).
+    """
+
+    def __init__(self, capacity: int = KLINES_LIMIT):
+        self.capacity = capacity
+        self._time = np.zeros(2 * capacity, dtype=np.int64)  # open time, ms
+        self._data = np.zeros((len(COLUMNS), 2 * capacity), dtype=np.float64)
+        self._pos = 0  # индекс следующей записи в [0, capacity)
+        self._len = 0
+        self.revision = 0  # растёт при каждом изменении буфера
+        self.rewrites = 0  # растёт при записи не в последнюю свечу (старые свечи, extend, clear)
+        self.updated_open_time = None  # open time последней записанной свечи
+
+    # ---------- запись ----------
+    def _write(self, i: int, open_time: int, o: float, h: float, l: float, c: float, v: float):
+        j = i + self.capacity
+        self.updated_open_time = open_time
+        self._time[i] = self._time[j] = open_time
+        data = self._data
+        data[0, i] = data[0, j] = o
+        data[1, i] = data[1, j] = h
+        data[2, i] = data[2, j] = l
+        data[3, i] = data[3, j] = c
+        data[4, i] = data[4, j] = v
+
+    def append(self, open_time: int, o: float, h: float, l: float, c: float, v: float):
+        self._write(self._pos, open_time, o, h, l, c, v)
+        self._pos = (self._pos + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+        self.revision += 1
+
+    def update(self, open_time: int, o: float, h: float, l: float, c: float, v: float):
+        """Обновляет свечу по open time. Возвращает True - новая свеча, False - обновлена
+        существующая, None - сообщение старше буфера (игнорируется)."""
+        if self._len:
+            last_time = self._time[self._pos - 1 + self.capacity]
+            if open_time == last_time:
+                self._write((self._pos - 1) % self.capacity, open_time, o, h, l, c, v)
+                self.revision += 1
+                return False
+            if open_time < last_time:
+                # запоздавшее обновление одной из предыдущих свечей
+                k = int(np.searchsorted(self.open_time, open_time))
+                if k < self._len and self.open_time[k] == open_time:
+                    self._write((self._pos - self._len + k) % self.capacity, open_time, o, h, l, c, v)
+                    self.revision += 1
+                    self.rewrites += 1
+                    return False
+                return None
+        self.append(open_time, o, h, l, c, v)
+        return True
+
+    def extend(self, open_times, ohlcv):
+        """Массовая загрузка: open_times (n,), ohlcv (n, 5). Берутся последние capacity строк."""
+        open_times = np.asarray(open_times, dtype=np.int64)[-self.capacity:]
+        ohlcv = np.asarray(ohlcv, dtype=np.float64)[-self.capacity:]
+        self.rewrites += 1
+        for t, row in zip(open_times, ohlcv):
+            if self._len and t <= self._time[self._pos - 1 + self.capacity]:
+                self.update(int(t), *row)
+            else:
+                self.append(int(t), *row)
+
+    def clear(self):
+        self._pos = 0
+        self._len = 0
+        self.revision += 1
+        self.rewrites += 1
+
+    # ---------- чтение (zero-copy) ----------
+    def __len__(self):
+        return self._len
+
+    @property
+    def empty(self) -> bool:
+        return self._len == 0
+
+    def _view(self, arr):
+        end = self._pos + self.capacity
+        view = arr[..., end - self._len:end]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def open_time(self) -> np.ndarray:
+        return self._view(self._time)
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._view(self._data[0])
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._view(self._data[1])
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._view(self._data[2])
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._view(self._data[3])
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._view(self._data[4])
+
+    @property
+    def ohlcv(self) -> np.ndarray:
+        """Матрица (5, n) в порядке COLUMNS, тоже view"""
+        return self._view(self._data)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self._view(self._data[COLUMNS.index(column)])
+
+    @property
+    def last_close(self) -> float:
+        return float(self._data[3, self._pos - 1 + self.capacity])
+
+    @property
+    def last_open_time(self) -> int:
+        return int(self._time[self._pos - 1 + self.capacity])
+
+    def last_candle(self) -> tuple:
+        """(open_time, open, high, low, close, volume) последней свечи"""
+        i = self._pos - 1 + self.capacity
+        d = self._data
+        return (int(self._time[i]), float(d[0, i]), float(d[1, i]), float(d[2, i]),
+                float(d[3, i]), float(d[4, i]))
+
+    # ---------- DataFrame только для бэктестера (pandas импортируется здесь) ----------
+    def to_dataframe(self) -> "pd.DataFrame":
+        import pandas as pd
+        index = pd.to_datetime(self.open_time, unit="ms")
+        return pd.DataFrame(self.ohlcv.T.copy(), index=index, columns=list(COLUMNS))
+
+    @classmethod
+    def from_dataframe(cls, df: "pd.DataFrame", capacity: int = KLINES_LIMIT):
+        import pandas as pd
+        store = cls(capacity)
+        if df is None or df.empty:
+            return store
+        if "Open time" in df.columns:
+            times = pd.to_datetime(df["Open time"])
+        else:
+            times = pd.to_datetime(df.index)
+        open_times = np.asarray(times, dtype="datetime64[ms]").astype(np.int64)
+        store.extend(open_times, df[list(COLUMNS)].to_numpy(dtype=np.float64))
+        return store
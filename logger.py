@@ -1,15 +1,15 @@
-import json
-import pandas as pd
+from datetime import datetime
 from telegram_bot import send_telegram_message
-from config import POSITIONS_LOG_FILE, INITIAL_CASH, DRY_RUN
-from data_store import user_data_cache
-from pnl_utils import simulate_realtime_pnl
+from config import INITIAL_CASH, DRY_RUN
+from position_log import append_entry, recent_entries, symbol_entries
+from metrics import timed_call
+from pnl_utils import portfolio_unrealized
 
 realized_total_pnl = 0.0
 opened_positions = set()  # (symbol, side, entry_price) для отслеживания открытых позиций
 def _write_log_entry(entry: dict):
-    with open(POSITIONS_LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    # в event loop - в буфер фонового писателя, без блокирующего I/O
+    append_entry(entry)
 
 def escape_markdown(text):
     if text is None:
@@ -19,6 +19,7 @@ def escape_markdown(text):
         text = text.replace(ch, f"\\{ch}")
     return text
 
+@timed_call("log_position", symbol_arg=1)
 def log_position(action, symbol, side, price, qty, pnl=0.0,
                  reason="DRY_RUN", exit_reason=None, tp=None, sl=None):
     global realized_total_pnl, opened_positions
@@ -35,11 +36,7 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
         realized_total_pnl += pnl
 
     # unrealized PnL
-    unrealized = 0.0
-    for s, p in user_data_cache.get("positions", {}).items():
-        u = simulate_realtime_pnl(s)
-        if u is not None:
-            unrealized += u
+    unrealized = portfolio_unrealized()
 
     # баланс аккаунта = стартовый капитал + PnL закрытых + PnL открытых
     total_equity = INITIAL_CASH + realized_total_pnl + unrealized
@@ -47,7 +44,7 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
 
     # лог всегда создаётся
     log_entry = {
-        "timestamp": pd.Timestamp.now().isoformat(),
+        "timestamp": datetime.now().isoformat(),
         "action": action,
         "symbol": symbol,
         "side": side,
@@ -97,12 +94,16 @@ def log_position(action, symbol, side, price, qty, pnl=0.0,
 
 
 def get_recent_logs(limit=50):
-    logs = []
     try:
-        with open(POSITIONS_LOG_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()[-limit:]
-            for line in lines:
-                logs.append(json.loads(line))
+        return recent_entries(limit)
     except Exception as e:
         print("Ошибка чтения логов:", e)
-    return logs
+        return []
+
+
+def get_symbol_logs(symbol, since=None):
+    try:
+        return symbol_entries(symbol, since)
+    except Exception as e:
+        print("Ошибка чтения логов:", e)
+        return []
@@ -1,41 +1,54 @@
-import asyncio
 import time
+PROCESS_START = time.perf_counter()  # до остальных импортов - для замера времени старта
+import asyncio
 import traceback
-from binance_client import get_liquid_tickers, fetch_historical_klines, start_websockets
-from data_store import klines_cache
+from binance_client import get_liquid_tickers, start_websockets, on_candle_update, run_ticker_screener
+from event_bus import bus, CandleEvent, CANDLE_UPDATED, CANDLE_CLOSED
+from history_loader import load_history, load_resampled_history
+from kline_disk_cache import remove_cached
+from client_manager import close_client
+from data_store import klines_cache, get_strategy_state, set_strategy_state, load_strategy_state, drop_symbol
 from config import (
-    TIMEFRAME, CHECK_INTERVAL, TOP_N_TICKERS, MIN_PRICE, MIN_VOLUME,
-    MAX_SPREAD_PERCENT, DRY_RUN, USE_BBRSI, USE_BREAKOUT,
-    BBRSI_PARAM_GRID, BREAKOUT_PARAM_GRID, INITIAL_CASH
+    TIMEFRAME, KLINES_LIMIT, TOP_N_TICKERS, MIN_PRICE, MIN_VOLUME,
+    MAX_SPREAD_PERCENT, DRY_RUN, TOP_SYMBOLS, RESAMPLE_ENABLED, BASE_TIMEFRAME,
+    SCREENER_ENABLED, UNIVERSE_REFRESH_INTERVAL, UNIVERSE_DROP_GRACE, SHARD_WORKERS, OPT_SEARCH,
+    FAST_START, REOPT_INTERVAL, KLINE_CACHE_ENABLED
 )
-from strategies import BBRSI_EMA_Strategy, Breakout_Strategy
 from pos_manager import (
-    get_open_position, open_position, close_position
+    get_open_position, get_open_positions, open_position, close_position, check_positions
 )
-from telegram_bot import send_telegram_message
-from backtesting.lib import FractionalBacktest
-from utils import bol_h, bol_l, rsi
+from telegram_bot import send_telegram_message, close_notifier
+from position_log import close_position_log
+from optimizer import run_backtest, optimize_symbols, get_strategy_class, MIN_CANDLES, STRATEGIES
+from reoptimizer import ReoptimizationScheduler
+from sharding import ShardedRuntime
+from metrics import run_metrics
+from signals import get_signals
 from pnl_utils import simulate_realtime_pnl
 
 
 
 # ========== OPTIMIZATION ==========
-def optimize_params_ws(symbol, strategy_class, param_grid):
-    df = klines_cache.get(symbol)
-    if df is None or len(df) < 150:
+def optimize_params_ws(symbol, strategy_class, param_grid, search=OPT_SEARCH):
+    """Лучшие параметры стратегии по свечам символа. search - стратегия поиска
+    (см. param_search.py); для "halving"/"tpe" param_grid не нужен - берётся пространство."""
+    store = klines_cache.get(symbol)
+    if store is None or len(store) < MIN_CANDLES:
         return None
 
+    name = next((n for n in STRATEGIES if issubclass(strategy_class, get_strategy_class(n))), None)
+    if name is not None:
+        best = optimize_symbols([symbol], {name: param_grid}, workers=1, search=search)
+        params, _ = best.get(symbol, {}).get(name, ({}, None))
+        return params
+
+    # стратегия вне STRATEGIES - перебор сетки FractionalBacktest
+    df = store.to_dataframe()
     best_eq = -float("inf")
     best_params = {}
-
     for params in param_grid:
-        class TempStrategy(strategy_class):
-            pass
-        for k, v in params.items():
-            setattr(TempStrategy, k, v)
         try:
-            bt = FractionalBacktest(df, TempStrategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-            stats = bt.run()
+            stats = run_backtest(df, strategy_class, params)
             eq_final = stats.get("Equity Final [$]", None)
             if eq_final is not None and eq_final > best_eq:
                 best_eq = eq_final
@@ -44,243 +57,309 @@ def optimize_params_ws(symbol, strategy_class, param_grid):
             continue
     return best_params
 
-def optimize_and_select_top_ws(symbols):
-    results = []
-    for symbol in symbols:
-        total_equity = 0.0
-        df = klines_cache.get(symbol)
-        if df is None or df.empty:
-            print(f"[WARN] Нет данных по {symbol}")
-            continue
-
-        # BBRSI
-        if USE_BBRSI:
-            try:
-                params = optimize_params_ws(symbol, BBRSI_EMA_Strategy, BBRSI_PARAM_GRID)
-                if params:
-                    BBRSI_EMA_Strategy.bol_period = params["bol_period"]
-                    BBRSI_EMA_Strategy.bol_dev = params["bol_dev"]
-                    BBRSI_EMA_Strategy.rsi_period = params["rsi_period"]
-                bt = FractionalBacktest(df, BBRSI_EMA_Strategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-                stats = bt.run()
-                equity = stats.get("Equity Final [$]", 0.0)
-                total_equity += equity
-                print(f"[INFO] {symbol} BBRSI equity: {equity}")
-            except Exception as e:
-                print(f"[ERROR] BBRSI бэктест {symbol} упал:", e)
-
-        # BREAKOUT
-        if USE_BREAKOUT:
-            try:
-                params_b = optimize_params_ws(symbol, Breakout_Strategy, BREAKOUT_PARAM_GRID)
-                if params_b:
-                    Breakout_Strategy.period = params_b["period"]
-                bt2 = FractionalBacktest(df, Breakout_Strategy, cash=INITIAL_CASH, margin=1, commission=0.005, finalize_trades=True)
-                stats2 = bt2.run()
-                equity2 = stats2.get("Equity Final [$]", 0.0)
-                total_equity += equity2
-                print(f"[INFO] {symbol} BREAKOUT equity: {equity2}")
-            except Exception as e:
-                print(f"[ERROR] BREAKOUT бэктест {symbol} упал:", e)
-
-        results.append((symbol, total_equity))
-
-    # сортируем по equity и выбираем топ-5
-    if not results:
-        print("[WARN] Нет результатов оптимизации, берём первые 5 символов")
-        return symbols[:5]
-
-    results.sort(key=lambda x: x[1], reverse=True)
-    top5 = results[:5]
-    print("[INFO] Top5 монет:", top5)
-    return top5
-
-
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results[:5]
-
 # ========== DRY_RUN HELPERS ==========
-def check_and_close_position(symbol):
-    pos = get_open_position(symbol)
-    if not pos:
-        return False
-
-    df = klines_cache.get(symbol)
-    if df is None or df.empty:
-        return False
-
-    last_price = float(df["Close"].iloc[-1])
-    side = pos["side"]
-    tp = pos["tp"]
-    sl = pos["sl"]
-    trail_percent = pos.get("trail_percent", None)
-    reason = None
-
-    # трейлинг
-    if trail_percent:
-        if side == "BUY":
-            new_sl = last_price * (1 - trail_percent / 100)
-            if sl is not None and new_sl > sl:
-                pos["sl"] = new_sl
-                reason = "Trailing"
-        elif side == "SELL":
-            new_sl = last_price * (1 + trail_percent / 100)
-            if sl is not None and new_sl < sl:
-                pos["sl"] = new_sl
-                reason = "Trailing"
-
-    # проверка TP/SL
-    if side == "BUY":
-        if tp is not None and last_price >= tp:
-            reason = "TP"
-        elif sl is not None and last_price <= sl:
-            reason = "SL"
-    elif side == "SELL":
-        if tp is not None and last_price <= tp:
-            reason = "TP"
-        elif sl is not None and last_price >= sl:
-            reason = "SL"
-
-    if reason in ("TP", "SL"):
-        close_position(symbol, last_price, reason=f"DRY_RUN {reason}", exit_reason=reason)
+def check_and_close_positions(symbols=None) -> list:
+    """Трейлинг и TP/SL по открытым позициям (всем или symbols) одним проходом книги,
+    сработавшие закрываются. Возвращает закрытые символы."""
+    positions = get_open_positions()
+    prices = {}
+    for symbol in positions if symbols is None else symbols:
+        store = klines_cache.get(symbol)
+        if symbol in positions and store is not None and not store.empty:
+            prices[symbol] = store.last_close
+    if not prices:
+        return []
+
+    closed = []
+    for symbol, reason, price in check_positions(prices):
+        close_position(symbol, price, reason=f"DRY_RUN {reason}", exit_reason=reason)
         send_telegram_message(f"✅ Позиция закрыта для {symbol}, причина: {reason}")
-        return True
-    return False
+        closed.append(symbol)
+    return closed
+
+def check_and_close_position(symbol):
+    return bool(check_and_close_positions([symbol]))
 
 def check_entry_signal(symbol):
-    df = klines_cache.get(symbol)
-    if df is None or len(df) < 20:
+    store = klines_cache.get(symbol)
+    if store is None or len(store) < 20:
         return None
+    snap = get_signals(symbol)
+    # здесь BBRSI приоритетнее пробоя
+    return snap.bbrsi or snap.breakout
+
+# ========== СИГНАЛЫ ПО ЗАКРЫТИЮ СВЕЧИ ==========
+def on_candle_closed(event: CandleEvent):
+    """Подписчик CANDLE_CLOSED: для торгуемых символов срабатывает сразу после закрытия свечи"""
+    symbol = event.symbol
+    if event.interval != TIMEFRAME or symbol not in get_strategy_state().symbols:
+        return
+    store = klines_cache.get(symbol)
+    if store is None or len(store) < 20:
+        print(f"{symbol}: данные отсутствуют или мало свечей")
+        return
+
+    # Проверяем, есть ли уже открытая позиция
+    if get_open_position(symbol):
+        return
+
+    # Проверяем сигналы (пробой перекрывает BBRSI)
+    snap = event.signals or get_signals(symbol)
+    price_last = snap.price
+    signal = None
+    if snap.breakout:
+        signal = f"{snap.breakout} (Breakout)"
+    elif snap.bbrsi:
+        signal = f"{snap.bbrsi} (BBRSI)"
+
+    if signal:
+        msg = f"⚡ Сигнал для {symbol}: {signal} | Цена: {price_last}"
+        print(msg)
+        send_telegram_message(msg)
+
+        # Открываем позицию
+        if not DRY_RUN:
+            side = "BUY" if "BUY" in signal else "SELL"
+            try:
+                open_position(symbol, side)  # рыночный ордер
+                send_telegram_message(f"✅ Позиция открыта: {side} для {symbol} @ {price_last}")
+                print(f"{symbol}: Позиция открыта ({side})")
+            except Exception as e:
+                print(f"❌ Ошибка открытия позиции для {symbol}: {e}")
+        else:
+            print(f"{symbol}: DRY_RUN=True, позиция не открыта")
 
-    price_last = float(df["Close"].iloc[-1])
-
-    # BBRSI
-    lower = bol_l(df["Close"])[-1]
-    upper = bol_h(df["Close"])[-1]
-    rsi_val = rsi(df["Close"])[-1]
-
-    if df["Close"].iloc[-2] > lower and df["Close"].iloc[-1] < lower and rsi_val < 30:
-        return "BUY"
-    elif df["Close"].iloc[-2] < upper and df["Close"].iloc[-1] > upper and rsi_val > 70:
-        return "SELL"
-
-    # Breakout
-    period = Breakout_Strategy.period
-    if len(df) > period + 2:
-        highest = df["High"].iloc[-period-1:-1].max()
-        lowest = df["Low"].iloc[-period-1:-1].min()
-        if price_last > highest:
-            return "BUY"
-        elif price_last < lowest:
-            return "SELL"
-    return None
-
-# ========== TRADE LOOP ==========
-async def trade_symbol_loop(symbol):
-    while True:
-        try:
-            df = klines_cache.get(symbol)
-            if df is None or len(df) < 20:
-                print(f"{symbol}: данные отсутствуют или мало свечей")
-                await asyncio.sleep(CHECK_INTERVAL)
-                continue
-
-            # Проверяем, есть ли уже открытая позиция
-            pos = get_open_position(symbol)
-            if pos:
-                # Можно добавить трейлинг или проверку TP/SL
-                await asyncio.sleep(CHECK_INTERVAL)
-                continue
-
-            # Проверяем сигналы
-            price_last = df["Close"].iloc[-1]
-            signal = None
-
-            # ===== BBRSI сигнал =====
-            lower = bol_l(df["Close"])[-1]
-            upper = bol_h(df["Close"])[-1]
-            rsi_val = rsi(df["Close"])[-1]
-
-            if df["Close"].iloc[-2] > lower and df["Close"].iloc[-1] < lower and rsi_val < 30:
-                signal = "BUY (BBRSI)"
-            elif df["Close"].iloc[-2] < upper and df["Close"].iloc[-1] > upper and rsi_val > 70:
-                signal = "SELL (BBRSI)"
-
-            # ===== Breakout сигнал =====
-            period = Breakout_Strategy.period
-            if len(df) > period + 2:
-                highest = df["High"].iloc[-period-1:-1].max()
-                lowest = df["Low"].iloc[-period-1:-1].min()
-                if price_last > highest:
-                    signal = "BUY (Breakout)"
-                elif price_last < lowest:
-                    signal = "SELL (Breakout)"
-
-            if signal:
-                msg = f"⚡ Сигнал для {symbol}: {signal} | Цена: {price_last}"
-                print(msg)
-                send_telegram_message(msg)
-
-                # Открываем позицию
-                if not DRY_RUN:
-                    side = "BUY" if "BUY" in signal else "SELL"
-                    try:
-                        open_position(symbol, side)  # рыночный ордер
-                        send_telegram_message(f"✅ Позиция открыта: {side} для {symbol} @ {price_last}")
-                        print(f"{symbol}: Позиция открыта ({side})")
-                    except Exception as e:
-                        print(f"❌ Ошибка открытия позиции для {symbol}: {e}")
-                else:
-                    print(f"{symbol}: DRY_RUN=True, позиция не открыта")
-
-        except Exception as e:
-            print(f"❌ Ошибка в торговом цикле {symbol}: {e}")
-
-        await asyncio.sleep(CHECK_INTERVAL)
 # ========== MAIN ASYNC ==========
-async def main_async():
+async def main_async(fast_start: bool = FAST_START, started: float = PROCESS_START):
+    try:
+        await run_bot(fast_start, started)
+    finally:
+        await close_client()
+        await close_position_log()
+        await close_notifier()
+
+async def select_symbols() -> list:
     symbols = await get_liquid_tickers(
         top_n=TOP_N_TICKERS,
         min_price=MIN_PRICE,
         min_volume=MIN_VOLUME,
         max_spread_percent=MAX_SPREAD_PERCENT
     )
-    symbols = [s for s in symbols if s  != "USDCUSDT"]
-    if not symbols:
-        print("Не получили ликвидные тикеры, ставим BTCUSDT в список")
-        symbols = ["BTCUSDT"]
-    print("Selected symbols:", symbols)
+    return [s for s in symbols if s  != "USDCUSDT"]
 
-    # загрузка исторических свечей
+def stream_interval() -> str:
+    # при RESAMPLE_ENABLED стрим один - базовый, TIMEFRAME и остальные собираются из него
+    return BASE_TIMEFRAME if RESAMPLE_ENABLED else TIMEFRAME
+
+async def start_symbols(symbols) -> list:
+    """История свечей + стримы для symbols, возвращает задачи стримов"""
+    # загрузка исторических свечей: при RESAMPLE_ENABLED только базовый таймфрейм
     print("Загружаем исторические свечи...")
+    if RESAMPLE_ENABLED:
+        loaded = await load_resampled_history(symbols, TIMEFRAME, limit=KLINES_LIMIT)
+    else:
+        loaded = await load_history(symbols, TIMEFRAME, limit=KLINES_LIMIT)
     for s in symbols:
-        df = await fetch_historical_klines(s, interval=TIMEFRAME, limit=500)
-        if not df.empty:
-            klines_cache[s] = df
-            print(f"✅ {s} loaded {len(df)} candles")
+        if loaded.get(s):
+            print(f"✅ {s} loaded {loaded[s]} candles")
         else:
             print(f"❌ {s} failed to load history")
 
-    # start websocket
-    await start_websockets(symbols, interval=TIMEFRAME)
-    print("Websockets started")
+    # start websocket (задачи работают в фоне)
+    return await start_websockets(symbols, interval=stream_interval())
+
+class SymbolStreams:
+    """Стримы свечей группами: группа - символы одного вызова start_symbols и её задачи.
+    Закрыть стрим символа можно только вместе с группой - оставшиеся в ней символы
+    переподключаются отдельной группой (история у них уже есть)."""
+
+    def __init__(self):
+        self.groups = []  # [(frozenset символов, [задачи])]
+        self._changed = asyncio.Event()
+
+    @property
+    def symbols(self) -> set:
+        return set().union(*(group for group, _ in self.groups))
+
+    def add(self, symbols, tasks: list):
+        self.groups.append((frozenset(symbols), list(tasks)))
+        self._changed.set()
+
+    async def drop(self, symbols):
+        symbols = set(symbols)
+        keep, restart = [], set()
+        for group, tasks in self.groups:
+            if group & symbols:
+                for task in tasks:
+                    task.cancel()
+                restart |= group - symbols
+            else:
+                keep.append((group, tasks))
+        self.groups = keep
+        if restart:
+            self.add(restart, await start_websockets(sorted(restart), interval=stream_interval()))
+        self._changed.set()
+
+    async def wait(self):
+        """Как gather по задачам стримов: ошибка любой из них выходит наружу"""
+        while True:
+            self._changed.clear()
+            changed = asyncio.create_task(self._changed.wait())
+            tasks = {task for _, group_tasks in self.groups for task in group_tasks if not task.done()}
+            done, _ = await asyncio.wait(tasks | {changed}, return_when=asyncio.FIRST_COMPLETED)
+            changed.cancel()
+            for task in done - {changed}:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+
+def release_symbol(symbol: str):
+    """Освобождает буферы свечей, резэмплер, сигналы и дисковый кеш символа"""
+    drop_symbol(symbol)
+    if KLINE_CACHE_ENABLED:
+        try:
+            remove_cached(symbol, stream_interval())
+        except OSError as e:
+            print(f"[WARN] Не удалось удалить кеш свечей {symbol}: {e}")
+
+async def refresh_universe(scheduler: ReoptimizationScheduler, streams: SymbolStreams,
+                           interval: float = UNIVERSE_REFRESH_INTERVAL,
+                           grace: float = UNIVERSE_DROP_GRACE):
+    """Кандидаты из живого скринера: новые символы сразу получают историю и стримы,
+    в отбор попадают со следующей переоптимизации. Выбывшие держатся ещё grace секунд
+    (вдруг вернутся) и, пока по ним открыта позиция или они в активном StrategyState,
+    дольше; потом их стримы и буферы освобождаются - набор стримов не растёт без конца."""
+    last_seen = dict.fromkeys(streams.symbols, time.time())
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            symbols = await select_symbols()
+            now = time.time()
+            last_seen.update(dict.fromkeys(symbols, now))
+            if symbols and symbols != scheduler.symbols:
+                added = [s for s in symbols if s not in streams.symbols]
+                if added:
+                    streams.add(added, await start_symbols(added))
+                removed = sorted(set(scheduler.symbols) - set(symbols))
+                if added or removed:
+                    print(f"[universe] кандидаты: +{added} -{removed}")
+                scheduler.symbols = symbols
+
+            keep = set(scheduler.symbols) | get_strategy_state().symbols | set(get_open_positions())
+            for s in keep:
+                last_seen[s] = now
+            stale = sorted(s for s in streams.symbols if now - last_seen.setdefault(s, now) > grace)
+            if stale:
+                await streams.drop(stale)
+                for s in stale:
+                    release_symbol(s)
+                    del last_seen[s]
+                print(f"[universe] стримы закрыты: {stale}")
+        except Exception as e:
+            print("❌ Ошибка обновления списка символов:", e)
+
+def restore_state():
+    """Быстрый старт: (символы для стримов, пауза до первой переоптимизации) из сохранённого
+    StrategyState или None. Состояние сразу становится активным."""
+    saved = load_strategy_state()
+    if saved is None:
+        print("[fast start] нет свежего сохранённого состояния - обычный старт")
+        return None
+    state, candidates = saved
+    set_strategy_state(state)
+    age = time.time() - state.updated
+    print(f"⚡ Быстрый старт: символы {sorted(state.symbols)}, параметры {age / 60:.0f} мин назад")
+    symbols = list(dict.fromkeys([*candidates, *sorted(state.symbols)]))
+    return symbols, max(0.0, REOPT_INTERVAL - age)
+
+def watch_first_decision(started: float):
+    """Однократно печатает время от старта до первого обработанного обновления свечи"""
+    def first_decision(event: CandleEvent):
+        if event.interval != TIMEFRAME:
+            return
+        bus.unsubscribe(CANDLE_UPDATED, first_decision)
+        print(f"⏱ Первое решение ({event.symbol}) через {time.perf_counter() - started:.2f} с после старта")
+    bus.subscribe(CANDLE_UPDATED, first_decision)  # после on_candle_update
+
+async def run_sharded(symbols, first_delay: float = None, started: float = PROCESS_START):
+    """Свечи и сигналы - в отдельных процессах (sharding.py), здесь позиции, риск и переоптимизация.
+    first_delay - быстрый старт: состояние уже восстановлено, первая оптимизация в фоне."""
+    runtime = ShardedRuntime(symbols)
+    runtime.start()  # воркеры получают текущий StrategyState
+    try:
+        await runtime.wait_ready()
+        bus.clear()
+        bus.subscribe(CANDLE_UPDATED, on_candle_update)
+        watch_first_decision(started)
+        consumer = asyncio.create_task(runtime.run())
+
+        scheduler = ReoptimizationScheduler(symbols, on_state=runtime.broadcast_state)
+        if first_delay is None:
+            print(f"Оптимизация и выбор топ-{TOP_SYMBOLS}...")
+            state = await scheduler.run_once()
+            print("Top symbols:", sorted(state.symbols))
+        bus.subscribe(CANDLE_CLOSED, on_candle_closed)
+
+        # watch падает, если умер ingest или воркер - тогда перезапуск из __main__
+        await asyncio.gather(consumer, scheduler.run_forever(first_delay), run_metrics(), runtime.watch())
+    finally:
+        runtime.stop()
+
+async def run_bot(fast_start: bool = FAST_START, started: float = PROCESS_START):
+    restored = restore_state() if fast_start else None
+    if restored is not None:
+        symbols, first_delay = restored
+    else:
+        first_delay = None
+        symbols = await select_symbols()
+        if not symbols:
+            print("Не получили ликвидные тикеры, ставим BTCUSDT в список")
+            symbols = ["BTCUSDT"]
+    print("Selected symbols:", symbols)
+
+    if SHARD_WORKERS and not DRY_RUN:
+        return await run_sharded(symbols, first_delay, started)
 
-    # optimization & selection
-    print("Оптимизация и выбор топ-5...")
-    top5 = optimize_and_select_top_ws(symbols)
-    top_symbols = [s for s, _ in top5] if top5 else symbols[:5]
-    print("Top symbols:", top_symbols)
+    # обработчик сделок на каждом обновлении свечи - до старта стримов
+    bus.clear()
+    bus.subscribe(CANDLE_UPDATED, on_candle_update)
+    watch_first_decision(started)
+    if restored is not None:
+        # параметры уже есть - сигналы по закрытию свечи с первой же свечи
+        bus.subscribe(CANDLE_CLOSED, on_candle_closed)
 
-    # запуск торговых тасков
-    tasks = [trade_symbol_loop(sym) for sym in top_symbols]
-    await asyncio.gather(*tasks)
+    ws_tasks = await start_symbols(symbols)
+    print("Websockets started")
+
+    # optimization & selection: первый цикл ждём (в пуле процессов, стримы не простаивают),
+    # дальше переоптимизация идёт в фоне и подменяет символы/параметры целиком.
+    # При быстром старте первый цикл - тоже в фоне, когда подойдёт срок.
+    scheduler = ReoptimizationScheduler(symbols)
+    if restored is None:
+        print(f"Оптимизация и выбор топ-{TOP_SYMBOLS}...")
+        state = await scheduler.run_once()
+        print("Top symbols:", sorted(state.symbols))
+        # сигналы по закрытию свечи - для символов из активного StrategyState
+        bus.subscribe(CANDLE_CLOSED, on_candle_closed)
+    else:
+        print(f"Переоптимизация в фоне через {first_delay:.0f} с")
+
+    background = [scheduler.run_forever(first_delay), run_metrics()]
+    if SCREENER_ENABLED and not DRY_RUN:
+        # живой скринер всего рынка и пересмотр кандидатов по нему; стримы выбывших
+        # символов закрываются, поэтому ждём их через SymbolStreams, а не gather
+        streams = SymbolStreams()
+        streams.add(symbols, ws_tasks)
+        background += [run_ticker_screener(), refresh_universe(scheduler, streams), streams.wait()]
+        ws_tasks = []
+    await asyncio.gather(*background, *ws_tasks)
 
 # ========== ENTRY POINT ==========
 if __name__ == "__main__":
     RESTART_DELAY = 10  # секунд
+    fast_start, started = FAST_START, PROCESS_START
     while True:
         try:
-            asyncio.run(main_async())
+            asyncio.run(main_async(fast_start, started))
         except KeyboardInterrupt:
             print("Остановлено вручную")
             break
@@ -288,4 +367,5 @@ if __name__ == "__main__":
             print("Критическая ошибка! Перезапуск через", RESTART_DELAY, "секунд")
             traceback.print_exc()
             time.sleep(RESTART_DELAY)
-
+            # перезапуск - с последних символов и параметров, без выбора и оптимизации заново
+            fast_start, started = True, time.perf_counter()
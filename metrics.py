@@ -0,0 +1,205 @@
+import asyncio
+import functools
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+from aiohttp import web
+from config import (
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_SUMMARY_INTERVAL, LOOP_LAG_INTERVAL
+)
+
+# Задержки горячего пути: гистограммы в стиле HDR (лог-линейные корзины, ~3% точности)
+# по (stage, symbol) плюс сводная по stage (symbol="*"). Значения - в микросекундах.
+# record() - несколько целочисленных операций и инкремент в list, без аллокаций.
+# Снаружи: /metrics (Prometheus text) и /metrics.json на METRICS_HOST:METRICS_PORT,
+# раз в METRICS_SUMMARY_INTERVAL - сводка в stdout.
+
+SUB_BITS = 5
+SUB = 1 << SUB_BITS          # корзин на октаву
+MAX_BUCKETS = SUB * 40       # хватает до ~2^39 мкс
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket(v: int) -> int:
+    if v < SUB:
+        return max(v, 0)
+    shift = v.bit_length() - 1 - SUB_BITS
+    return min(SUB + shift * SUB + (v >> shift) - SUB, MAX_BUCKETS - 1)
+
+
+def _bucket_value(idx: int) -> float:
+    """Середина корзины"""
+    if idx < SUB:
+        return float(idx)
+    shift, m = divmod(idx - SUB, SUB)
+    low = (m + SUB) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * MAX_BUCKETS
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = [0] * MAX_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_us: int):
+        value_us = int(value_us)
+        self.counts[_bucket(value_us)] += 1
+        self.count += 1
+        self.total += value_us
+        if value_us > self.max:
+            self.max = value_us
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentiles(self, quantiles=QUANTILES) -> dict:
+        if not self.count:
+            return {q: 0.0 for q in quantiles}
+        cum = np.cumsum(self.counts)
+        out = {}
+        for q in quantiles:
+            idx = int(np.searchsorted(cum, max(1, int(np.ceil(q * self.count)))))
+            out[q] = min(_bucket_value(idx), float(self.max))
+        return out
+
+    def summary(self) -> dict:
+        p = self.percentiles()
+        return {"count": self.count, "min": self.min or 0, "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0,
+                **{f"p{q * 100:g}": v for q, v in p.items()}}
+
+
+histograms = {}  # (stage, symbol) -> LatencyHistogram
+
+
+def record(stage: str, value_us: float, symbol: str = None):
+    if not METRICS_ENABLED:
+        return
+    for key in ((stage, "*"), (stage, symbol)) if symbol else ((stage, "*"),):
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = LatencyHistogram()
+        hist.record(value_us)
+
+
+@contextmanager
+def timed(stage: str, symbol: str = None):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter_ns() - start) // 1000, symbol)
+
+
+def timed_call(stage: str, symbol_arg: int = 0):
+    """Декоратор: время вызова функции, symbol - из позиционного аргумента symbol_arg"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            symbol = args[symbol_arg] if len(args) > symbol_arg else kwargs.get("symbol")
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, (time.perf_counter_ns() - start) // 1000, symbol)
+        return wrapper
+    return decorator
+
+
+def snapshot(per_symbol: bool = True) -> dict:
+    """{stage: {symbol: summary}}"""
+    out = {}
+    for (stage, symbol), hist in list(histograms.items()):
+        if per_symbol or symbol == "*":
+            out.setdefault(stage, {})[symbol] = hist.summary()
+    return out
+
+
+def prometheus_text() -> str:
+    lines = ["# TYPE latency_us summary"]
+    for (stage, symbol), hist in sorted(histograms.items()):
+        labels = f'stage="{stage}",symbol="{symbol}"'
+        for q, v in hist.percentiles().items():
+            lines.append(f'latency_us{{{labels},quantile="{q}"}} {v:g}')
+        lines.append(f"latency_us_sum{{{labels}}} {hist.total}")
+        lines.append(f"latency_us_count{{{labels}}} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def format_summary() -> str:
+    rows = []
+    for stage, by_symbol in sorted(snapshot(per_symbol=False).items()):
+        s = by_symbol["*"]
+        rows.append(f"  {stage:<20} n={s['count']:<7} p50={s['p50']:.0f} p90={s['p90']:.0f} "
+                    f"p99={s['p99']:.0f} max={s['max']} мкс")
+    return "\n".join(rows)
+
+
+async def _handle_metrics(request):
+    return web.Response(text=prometheus_text(), content_type="text/plain")
+
+
+async def _handle_metrics_json(request):
+    return web.Response(text=json.dumps(snapshot()), content_type="application/json")
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    app.router.add_get("/metrics.json", _handle_metrics_json)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Насколько позже запланированного просыпается event loop - видно зависания"""
+    while True:
+        start = time.perf_counter_ns()
+        await asyncio.sleep(interval)
+        record("loop_lag", max(0, time.perf_counter_ns() - start - int(interval * 1e9)) // 1000)
+
+
+async def report_summary(interval: float = METRICS_SUMMARY_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        text = format_summary()
+        if text:
+            print("[metrics] задержки за всё время:\n" + text)
+
+
+async def run_metrics():
+    """Сервер метрик + мониторинг event loop + периодическая сводка"""
+    if not METRICS_ENABLED:
+        return
+    runner = None
+    try:
+        runner = await start_metrics_server()
+    except OSError as e:
+        print("[WARN] Сервер метрик не запущен:", e)
+    try:
+        await asyncio.gather(monitor_loop_lag(), report_summary())
+    finally:
+        if runner is not None:
+            await runner.cleanup()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import sqlite3
+import time
+import numpy as np
+from config import (
+    COMMISSION, OPT_CACHE_FILE, OPT_CACHE_MAX_ROWS, OPT_CACHE_STALE_CANDLES,
+    OPT_CACHE_TOP_K, OPT_CACHE_TOP_K_CANDLES
+)
+
+# Постоянный кеш результатов оптимизации в SQLite.
+# results: Equity Final по (symbol, strategy, commission, params, fingerprint окна свечей),
+# вытесняются по last_used (LRU) сверх OPT_CACHE_MAX_ROWS.
+# runs: какие окна уже считались и была ли сетка посчитана целиком.
+# plan() решает, что реально пересчитывать:
+#   - тот же отпечаток данных - всё из кеша;
+#   - с последнего полного прогона <= OPT_CACHE_STALE_CANDLES свечей - результаты как есть;
+#   - <= OPT_CACHE_TOP_K_CANDLES свечей - только OPT_CACHE_TOP_K лучших параметров того прогона;
+#   - иначе вся сетка.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    symbol TEXT, strategy TEXT, commission REAL, params TEXT, fingerprint TEXT,
+    equity REAL, last_used REAL,
+    PRIMARY KEY (symbol, strategy, commission, params, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS runs (
+    symbol TEXT, strategy TEXT, commission REAL, fingerprint TEXT,
+    window_end INTEGER, complete INTEGER, created REAL,
+    PRIMARY KEY (symbol, strategy, commission, fingerprint)
+);
+"""
+
+
+def data_fingerprint(open_time: np.ndarray, ohlcv: np.ndarray) -> str:
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(open_time, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(ohlcv, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def params_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+class OptimizationCache:
+    def __init__(self, path: str = OPT_CACHE_FILE, commission: float = COMMISSION,
+                 max_rows: int = OPT_CACHE_MAX_ROWS):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.commission = commission
+        self.max_rows = max_rows
+        self.stats = {"exact": 0, "stale": 0, "top_k": 0, "full": 0}
+
+    def close(self):
+        self.db.close()
+
+    def lookup(self, symbol: str, strategy: str, fingerprint: str) -> dict:
+        rows = self.db.execute(
+            "SELECT params, equity FROM results "
+            "WHERE symbol=? AND strategy=? AND commission=? AND fingerprint=?",
+            (symbol, strategy, self.commission, fingerprint)).fetchall()
+        return dict(rows)
+
+    def latest_complete_run(self, symbol: str, strategy: str):
+        """(fingerprint, window_end) последнего полного прогона сетки или None"""
+        return self.db.execute(
+            "SELECT fingerprint, window_end FROM runs "
+            "WHERE symbol=? AND strategy=? AND commission=? AND complete=1 "
+            "ORDER BY window_end DESC LIMIT 1",
+            (symbol, strategy, self.commission)).fetchone()
+
+    def plan(self, symbol: str, strategy: str, grid: list, fingerprint: str,
+             window_end: int, candle_ms: int):
+        """Возвращает (known: {params_key: equity}, todo: [params, ...])"""
+        keys = [params_key(p) for p in grid]
+        exact = self.lookup(symbol, strategy, fingerprint)
+        if all(k in exact for k in keys):
+            self.stats["exact"] += 1
+            self._touch(symbol, strategy, fingerprint)
+            return {k: exact[k] for k in keys}, []
+
+        run = self.latest_complete_run(symbol, strategy)
+        if run is not None and candle_ms > 0:
+            base = self.lookup(symbol, strategy, run[0])
+            lag = (window_end - run[1]) // candle_ms
+            if all(k in base for k in keys) and 0 <= lag <= OPT_CACHE_TOP_K_CANDLES:
+                if lag <= OPT_CACHE_STALE_CANDLES:
+                    self.stats["stale"] += 1
+                    self._touch(symbol, strategy, run[0])
+                    return {k: base[k] for k in keys}, []
+                ranked = sorted((k for k in keys if base[k] is not None),
+                                key=lambda k: base[k], reverse=True)[:OPT_CACHE_TOP_K]
+                self.stats["top_k"] += 1
+                known = {k: exact[k] for k in ranked if k in exact}
+                return known, [json.loads(k) for k in ranked if k not in known]
+
+        self.stats["full"] += 1
+        return ({k: exact[k] for k in keys if k in exact},
+                [p for p, k in zip(grid, keys) if k not in exact])
+
+    def store(self, symbol: str, strategy: str, fingerprint: str, window_end: int,
+              results: dict, grid: list):
+        """results: {params_key: equity} - только реально посчитанные на этом окне.
+        Окно считается полным прогоном, когда на нём есть результаты всей grid."""
+        if not results:
+            return
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, strategy, self.commission, k, fingerprint, eq, now)
+                 for k, eq in results.items()])
+            stored = self.lookup(symbol, strategy, fingerprint)
+            complete = all(params_key(p) in stored for p in grid)
+            self.db.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (symbol, strategy, commission, fingerprint) "
+                "DO UPDATE SET complete = MAX(complete, excluded.complete)",
+                (symbol, strategy, self.commission, fingerprint, window_end, int(complete), now))
+        self.evict()
+
+    def _touch(self, symbol: str, strategy: str, fingerprint: str):
+        with self.db:
+            self.db.execute(
+                "UPDATE results SET last_used=? "
+                "WHERE symbol=? AND strategy=? AND commission=? AND fingerprint=?",
+                (time.time(), symbol, strategy, self.commission, fingerprint))
+
+    def evict(self):
+        count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count <= self.max_rows:
+            return
+        with self.db:
+            self.db.execute(
+                "DELETE FROM results WHERE rowid IN "
+                "(SELECT rowid FROM results ORDER BY last_used LIMIT ?)", (count - self.max_rows,))
+            self.db.execute(
+                "DELETE FROM runs WHERE NOT EXISTS (SELECT 1 FROM results r "
+                "WHERE r.symbol=runs.symbol AND r.strategy=runs.strategy "
+                "AND r.commission=runs.commission AND r.fingerprint=runs.fingerprint)")
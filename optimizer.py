@@ -0,0 +1,241 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from config import (
+    INITIAL_CASH, COMMISSION, OPTIMIZATION_WORKERS, VECTOR_BACKTEST, TIMEFRAME, OPT_SEARCH,
+    OPT_SEARCH_BUDGET
+)
+from data_store import klines_cache, get_timeframe_store
+from kline_store import COLUMNS
+from optimization_cache import OptimizationCache, data_fingerprint, params_key
+from param_search import SPACES, make_search, search_rng
+
+# Параллельная оптимизация параметров: задания (symbol, strategy, [params, ...], window)
+# раздаются пулу процессов. Массивы свечей передаются каждому воркеру один раз
+# через initializer, сами задания - только имена, словари параметров и длина окна.
+# Что считать, решает стратегия поиска (param_search.py): сетка - один раунд,
+# halving/tpe - несколько раундов в одном и том же пуле.
+# Стратегии из VECTOR_STRATEGIES считаются векторно всей сеткой за одно задание,
+# FractionalBacktest нужен только для полной статистики победителя (best_stats).
+# backtesting, pandas и стратегии импортируются при первом бэктесте - бот стартует без них.
+
+STRATEGIES = {  # имя -> класс в strategies.py
+    "BBRSI": "BBRSI_EMA_Strategy",
+    "BREAKOUT": "Breakout_Strategy",
+}
+VECTOR_STRATEGIES = ("BBRSI", "BREAKOUT")
+MIN_CANDLES = 150
+_MISSING = object()
+
+# состояние процесса-воркера
+_worker_klines = {}  # symbol -> (open_time, ohlcv)
+_worker_frames = {}  # symbol -> pd.DataFrame, строится один раз на воркер
+
+
+def get_strategy_class(name: str):
+    import strategies
+    return getattr(strategies, STRATEGIES[name])
+
+
+def run_backtest(df: "pd.DataFrame", strategy_class, params: dict = None):
+    """Один прогон FractionalBacktest с параметрами стратегии, возвращает stats"""
+    from backtesting.lib import FractionalBacktest
+    class TempStrategy(strategy_class):
+        pass
+    for k, v in (params or {}).items():
+        setattr(TempStrategy, k, v)
+    bt = FractionalBacktest(df, TempStrategy, cash=INITIAL_CASH, margin=1,
+                            commission=COMMISSION, finalize_trades=True)
+    return bt.run()
+
+
+def klines_payload(symbols, window: int = None, interval: str = TIMEFRAME) -> dict:
+    """Копии массивов свечей для передачи в воркеры: symbol -> (open_time, ohlcv).
+    window - только последние window свечей, interval - любой таймфрейм из timeframe_cache."""
+    payload = {}
+    for s in symbols:
+        store = get_timeframe_store(s, interval)
+        if store is not None and len(store) >= MIN_CANDLES:
+            start = -window if window else 0
+            payload[s] = (store.open_time[start:].copy(), store.ohlcv[:, start:].copy())
+    return payload
+
+
+def frame_from_arrays(open_time, ohlcv) -> "pd.DataFrame":
+    import pandas as pd
+    index = pd.to_datetime(open_time, unit="ms")
+    return pd.DataFrame(ohlcv.T, index=index, columns=list(COLUMNS))
+
+
+def _init_worker(klines: dict):
+    global _worker_klines, _worker_frames
+    _worker_klines = klines
+    _worker_frames = {}
+
+
+def _run_job(job):
+    symbol, name, grid, window = job
+    df = _worker_frames.get(symbol)
+    if df is None:
+        df = _worker_frames[symbol] = frame_from_arrays(*_worker_klines[symbol])
+    if window:
+        df = df.iloc[-window:]
+    if VECTOR_BACKTEST and name in VECTOR_STRATEGIES:
+        from vector_backtest import run_grid
+        try:
+            return [float(eq) for eq in run_grid(df, name, grid)]
+        except Exception as e:
+            print(f"[WARN] Векторный бэктест {symbol} {name} упал, считаем по одному:", e)
+    equities = []
+    for params in grid:
+        try:
+            stats = run_backtest(df, get_strategy_class(name), params)
+            equities.append(stats.get("Equity Final [$]", None))
+        except Exception:
+            equities.append(None)
+    return equities
+
+
+def _make_jobs(asks: dict) -> list:
+    """asks: {(symbol, strategy): [(params, window), ...]} -> задания пула.
+    Векторные стратегии - одно задание на (символ, стратегию, окно), остальные - на каждые params."""
+    jobs = []
+    for (s, name), todo in asks.items():
+        by_window = {}
+        for params, window in todo:
+            by_window.setdefault(window, []).append(params)
+        for window, grid in by_window.items():
+            if VECTOR_BACKTEST and name in VECTOR_STRATEGIES:
+                jobs.append((s, name, grid, window))
+            else:
+                jobs.extend((s, name, [params], window) for params in grid)
+    return jobs
+
+
+def best_stats(symbol: str, name: str, params: dict):
+    """Полная статистика FractionalBacktest для выбранных параметров"""
+    store = klines_cache.get(symbol)
+    if store is None or store.empty:
+        return None
+    return run_backtest(store.to_dataframe(), get_strategy_class(name), params)
+
+
+class _JobRunner:
+    """Пул процессов на все раунды поиска; создаётся при первом run().
+    in_process=False - даже с одним воркером считать в отдельном процессе.
+    progress(done, total) вызывается по мере готовности заданий (накопительно по раундам)."""
+
+    def __init__(self, payload: dict, workers: int = None, in_process: bool = True, progress=None):
+        self.payload = payload
+        self.workers = workers
+        self.in_process = in_process
+        self.progress = progress
+        self.pool = None
+        self.started = False
+        self.done = 0
+        self.total = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def run(self, jobs: list) -> list:
+        if not jobs:
+            return []
+        self.total += len(jobs)
+        if not self.started:
+            # размер пула - по первому (обычно самому широкому) раунду
+            self.workers = max(1, min(self.workers or OPTIMIZATION_WORKERS or os.cpu_count() or 1, len(jobs)))
+            self.started = True
+            if self.workers == 1 and self.in_process:
+                _init_worker(self.payload)
+            else:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.payload,))
+        if self.pool is None:
+            results = map(_run_job, jobs)
+        else:
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            results = self.pool.map(_run_job, jobs, chunksize=chunksize)
+        equities = []
+        for eq in results:
+            equities.append(eq)
+            self.done += 1
+            if self.progress:
+                self.progress(self.done, self.total)
+        return equities
+
+
+def optimize_symbols(symbols, grids: dict, workers: int = None, cache: OptimizationCache = None,
+                     payload: dict = None, in_process: bool = True, progress=None,
+                     search: str = OPT_SEARCH, budget: int = OPT_SEARCH_BUDGET,
+                     spaces: dict = None) -> dict:
+    """grids: {"BBRSI": [params, ...], ...} - стратегии и их сетки (для search="grid").
+    search: "grid" | "halving" | "tpe"; для halving/tpe пространства берутся из spaces
+    (по умолчанию param_search.SPACES), budget - бэктестов на символ и стратегию.
+    Возвращает {symbol: {strategy: (best_params, best_equity)}} для символов с данными.
+    С cache пересчитывается только то, чего нет в кеше результатов (см. OptimizationCache.plan).
+    payload - готовый снимок свечей (klines_payload), если вызов не из event loop."""
+    if payload is None:
+        payload = klines_payload(symbols)
+    spaces = spaces or SPACES
+    searches = {}  # (symbol, strategy) -> ParamSearch
+    windows = {}
+    for s, (open_time, ohlcv) in payload.items():
+        if cache is not None:
+            windows[s] = (data_fingerprint(open_time, ohlcv), int(open_time[-1]))
+        for name, grid in grids.items():
+            if search == "grid" and not grid:
+                continue
+            known, todo = {}, grid
+            if cache is not None:
+                fingerprint, window_end = windows[s]
+                if search == "grid":
+                    candle_ms = int(open_time[-1] - open_time[-2])
+                    known, todo = cache.plan(s, name, grid, fingerprint, window_end, candle_ms)
+                else:
+                    known = cache.lookup(s, name, fingerprint)
+            searches[(s, name)] = make_search(search, todo, spaces.get(name), len(open_time), budget,
+                                              known, search_rng(s, name), MIN_CANDLES)
+
+    evaluated = {}  # (symbol, strategy) -> {params_key: equity} на полном окне
+    with _JobRunner(payload, workers, in_process, progress) as runner:
+        while True:
+            asks, answers, pending = {}, {}, {}
+            for key, srch in searches.items():
+                todo = srch.ask()
+                if not todo:
+                    continue
+                asks[key] = todo
+                # результаты полного окна из кеша не пересчитываются
+                answers[key] = [srch.results.get(params_key(p)) if w is None and params_key(p) in srch.results
+                                else _MISSING for p, w in todo]
+                pending[key] = [(p, w) for (p, w), a in zip(todo, answers[key]) if a is _MISSING]
+            if not asks:
+                break
+            jobs = _make_jobs(pending)
+            computed = {}
+            for (symbol, name, grid, window), job_equities in zip(jobs, runner.run(jobs)):
+                for params, eq_final in zip(grid, job_equities):
+                    computed[(symbol, name, params_key(params), window)] = eq_final
+                    if window is None:
+                        evaluated.setdefault((symbol, name), {})[params_key(params)] = eq_final
+            for key, todo in asks.items():
+                searches[key].tell([computed[(*key, params_key(p), w)] if a is _MISSING else a
+                                    for (p, w), a in zip(todo, answers[key])])
+
+    if cache is not None:
+        for (symbol, name), found in evaluated.items():
+            grid = grids[name] if search == "grid" else [json.loads(k) for k in found]
+            cache.store(symbol, name, *windows[symbol], found, grid)
+        print("[optimizer] кеш результатов:", cache.stats)
+
+    best = {}
+    for (symbol, name), srch in searches.items():
+        found = srch.best()
+        if found is not None:
+            best.setdefault(symbol, {})[name] = found
+    return best
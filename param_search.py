@@ -0,0 +1,275 @@
+import json
+import math
+import zlib
+import numpy as np
+from config import (
+    BBRSI_PARAM_SPACE, BREAKOUT_PARAM_SPACE, OPT_SEARCH_BUDGET, OPT_SEARCH_SEED, OPT_HALVING_ETA,
+    OPT_TPE_STARTUP, OPT_TPE_BATCH, OPT_TPE_GAMMA, OPT_TPE_CANDIDATES
+)
+from optimization_cache import params_key
+
+# Стратегии поиска параметров для optimize_symbols. Интерфейс ask/tell:
+#   ask()  -> [(params, window), ...] - что посчитать в этом раунде (window - последние
+#             window свечей, None - всё окно); пустой список - поиск закончен;
+#   tell(equities) - Equity Final [$] в том же порядке (None - бэктест упал).
+# Раунд всех символов считается пулом процессов одним пакетом, поэтому поиск идёт
+# раундами, а не по одной точке.
+#   GridSearch        - полный перебор сетки (как раньше);
+#   SuccessiveHalving - случайные кандидаты на коротком окне, лучшие 1/eta переходят
+#                       на окно в eta раз длиннее, до полного;
+#   TPESearch         - Tree-structured Parzen Estimator: плотности хороших/плохих точек
+#                       по каждому параметру, следующие точки - максимум их отношения.
+# Бюджет - число бэктестов в пересчёте на полное окно.
+
+SPACES = {
+    "BBRSI": BBRSI_PARAM_SPACE,
+    "BREAKOUT": BREAKOUT_PARAM_SPACE,
+}
+
+
+class Dimension:
+    """Параметр пространства: ("int", lo, hi), ("float", lo, hi[, step]), ("choice", [values])"""
+
+    def __init__(self, name: str, spec: tuple):
+        self.name = name
+        self.kind = spec[0]
+        if self.kind == "choice":
+            self.values = list(spec[1])
+        elif self.kind in ("int", "float"):
+            self.lo, self.hi = spec[1], spec[2]
+            self.step = spec[3] if len(spec) > 3 else (1 if self.kind == "int" else None)
+        else:
+            raise ValueError(f"Неизвестный тип параметра {name}: {self.kind}")
+
+    @property
+    def categorical(self) -> bool:
+        return self.kind == "choice"
+
+    def value(self, u: float):
+        """Точка [0, 1] (или индекс варианта) -> значение параметра"""
+        if self.categorical:
+            return self.values[int(u)]
+        x = self.lo + min(max(u, 0.0), 1.0) * (self.hi - self.lo)
+        if self.step:
+            x = self.lo + round((x - self.lo) / self.step) * self.step
+            x = min(max(x, self.lo), self.hi)
+        return int(round(x)) if self.kind == "int" else round(float(x), 10)
+
+    def unit(self, value) -> float:
+        """Обратно: значение -> точка [0, 1] (или индекс варианта)"""
+        if self.categorical:
+            return float(self.values.index(value))
+        return (value - self.lo) / (self.hi - self.lo) if self.hi > self.lo else 0.5
+
+    def sample(self, rng, n: int) -> np.ndarray:
+        if self.categorical:
+            return rng.integers(len(self.values), size=n).astype(float)
+        return rng.random(n)
+
+
+def make_space(spec: dict) -> list:
+    return [Dimension(name, s) for name, s in spec.items()]
+
+
+def search_rng(symbol: str, name: str, seed: int = OPT_SEARCH_SEED):
+    """Детерминированный генератор на (символ, стратегию) - одинаковый в любом процессе"""
+    return np.random.default_rng([seed, zlib.crc32(f"{symbol}:{name}".encode())])
+
+
+class ParamSearch:
+    def __init__(self, known: dict = None):
+        self.results = dict(known or {})  # params_key -> equity на полном окне
+        self._asked = []
+
+    def ask(self) -> list:
+        raise NotImplementedError
+
+    def tell(self, equities):
+        raise NotImplementedError
+
+    def best(self):
+        """(params, equity) лучшего результата на полном окне или None"""
+        found = [(k, eq) for k, eq in self.results.items() if eq is not None]
+        if not found:
+            return None
+        key, eq = max(found, key=lambda x: x[1])
+        return json.loads(key), eq
+
+
+class GridSearch(ParamSearch):
+    def __init__(self, grid: list, known: dict = None):
+        super().__init__(known)
+        self.grid = list(grid)
+
+    def ask(self) -> list:
+        todo, self.grid = self.grid, []
+        self._asked = todo
+        return [(params, None) for params in todo]
+
+    def tell(self, equities):
+        for params, eq in zip(self._asked, equities):
+            self.results[params_key(params)] = eq
+
+
+class _SpaceSearch(ParamSearch):
+    def __init__(self, space: dict, rng, known: dict = None):
+        super().__init__(known)
+        self.dims = make_space(space)
+        self.rng = rng
+
+    def _params(self, point) -> dict:
+        return {d.name: d.value(u) for d, u in zip(self.dims, point)}
+
+    def _random(self, n: int, exclude=()) -> list:
+        """До n различных случайных точек пространства, которых нет в exclude"""
+        seen = set(exclude)
+        out = []
+        for _ in range(10):
+            points = np.column_stack([d.sample(self.rng, n * 2) for d in self.dims])
+            for point in points:
+                params = self._params(point)
+                key = params_key(params)
+                if key not in seen:
+                    seen.add(key)
+                    out.append(params)
+                    if len(out) == n:
+                        return out
+        return out
+
+
+class SuccessiveHalving(_SpaceSearch):
+    def __init__(self, space: dict, candles: int, budget: int = OPT_SEARCH_BUDGET,
+                 eta: int = OPT_HALVING_ETA, min_window: int = 150, rng=None, known: dict = None):
+        super().__init__(space, rng if rng is not None else np.random.default_rng(), known)
+        self.eta = eta
+        # окна от полного вниз: candles, candles/eta, ... пока не меньше min_window
+        windows = [candles]
+        while windows[-1] // eta >= min_window:
+            windows.append(windows[-1] // eta)
+        self.windows = windows[::-1]
+        # на шаге i считается 1/eta^i кандидатов на окне windows[i]
+        cost = sum(w / candles * eta ** -i for i, w in enumerate(self.windows))
+        self.candidates = self._random(max(1, int(budget / cost)))
+        self.rung = 0
+
+    def ask(self) -> list:
+        if self.rung >= len(self.windows) or not self.candidates:
+            return []
+        window = self.windows[self.rung]
+        self._asked = self.candidates
+        return [(params, None if window == self.windows[-1] else window) for params in self.candidates]
+
+    def tell(self, equities):
+        scored = [(eq if eq is not None else -math.inf, i) for i, eq in enumerate(equities)]
+        if self.rung == len(self.windows) - 1:
+            for params, eq in zip(self._asked, equities):
+                self.results[params_key(params)] = eq
+        scored.sort(key=lambda x: x[0], reverse=True)
+        keep = max(1, math.ceil(len(scored) / self.eta))
+        self.candidates = [self._asked[i] for _, i in scored[:keep]]
+        self.rung += 1
+
+
+class TPESearch(_SpaceSearch):
+    def __init__(self, space: dict, budget: int = OPT_SEARCH_BUDGET, startup: int = OPT_TPE_STARTUP,
+                 batch: int = OPT_TPE_BATCH, gamma: float = OPT_TPE_GAMMA,
+                 candidates: int = OPT_TPE_CANDIDATES, rng=None, known: dict = None):
+        super().__init__(space, rng if rng is not None else np.random.default_rng(), known)
+        self.budget = budget
+        self.startup = startup
+        self.batch = batch
+        self.gamma = gamma
+        self.n_candidates = candidates
+        self.spent = 0
+        # наблюдения из кеша результатов - бесплатный тёплый старт модели
+        self.observed = [(json.loads(k), eq) for k, eq in self.results.items()
+                         if set(json.loads(k)) == {d.name for d in self.dims}]
+
+    def ask(self) -> list:
+        left = self.budget - self.spent
+        if left <= 0:
+            return []
+        if len(self.observed) < self.startup:
+            todo = self._random(min(left, self.startup - len(self.observed)), self.results)
+        else:
+            todo = self._suggest(min(left, self.batch))
+        if not todo:
+            return []
+        self.spent += len(todo)
+        self._asked = todo
+        return [(params, None) for params in todo]
+
+    def tell(self, equities):
+        for params, eq in zip(self._asked, equities):
+            self.results[params_key(params)] = eq
+            self.observed.append((params, eq))
+
+    def _suggest(self, n: int) -> list:
+        ranked = sorted(self.observed, key=lambda x: -math.inf if x[1] is None else x[1], reverse=True)
+        n_good = max(1, int(math.ceil(self.gamma * len(ranked))))
+        units = np.array([[d.unit(p[d.name]) for d in self.dims] for p, _ in ranked]).reshape(-1, len(self.dims))
+        good, bad = units[:n_good], units[n_good:]
+
+        points = np.column_stack([self._sample_dim(d, good[:, j], self.n_candidates)
+                                  for j, d in enumerate(self.dims)])
+        score = np.zeros(len(points))
+        for j, d in enumerate(self.dims):
+            score += (np.log(self._density(d, good[:, j], points[:, j]))
+                      - np.log(self._density(d, bad[:, j], points[:, j])))
+
+        out, seen = [], set(self.results)
+        for i in np.argsort(-score):
+            params = self._params(points[i])
+            key = params_key(params)
+            if key not in seen:
+                seen.add(key)
+                out.append(params)
+                if len(out) == n:
+                    return out
+        return out + self._random(n - len(out), seen)
+
+    @staticmethod
+    def _bandwidth(obs: np.ndarray) -> float:
+        if len(obs) < 2:
+            return 0.5
+        return float(np.clip(1.06 * obs.std() * len(obs) ** -0.2, 0.05, 0.5))
+
+    def _sample_dim(self, d: Dimension, obs: np.ndarray, n: int) -> np.ndarray:
+        """Выборка из "хорошей" плотности: смесь гауссиан вокруг наблюдений + равномерный prior"""
+        if d.categorical:
+            return self.rng.choice(len(d.values), size=n, p=self._weights(d, obs)).astype(float)
+        centers = np.r_[obs, np.nan]
+        pick = centers[self.rng.integers(len(centers), size=n)]
+        prior = np.isnan(pick)
+        x = pick + self.rng.normal(0, self._bandwidth(obs), n)
+        x[prior] = self.rng.random(prior.sum())
+        return np.clip(x, 0.0, 1.0)
+
+    @staticmethod
+    def _weights(d: Dimension, obs: np.ndarray) -> np.ndarray:
+        counts = np.bincount(obs.astype(int), minlength=len(d.values)) + 1.0
+        return counts / counts.sum()
+
+    def _density(self, d: Dimension, obs: np.ndarray, x: np.ndarray) -> np.ndarray:
+        if d.categorical:
+            return self._weights(d, obs)[x.astype(int)]
+        # равномерный prior на [0, 1] как ещё одна компонента смеси
+        dens = np.ones(len(x))
+        if len(obs):
+            bw = self._bandwidth(obs)
+            z = (x[:, None] - obs[None, :]) / bw
+            dens = dens + (np.exp(-0.5 * z ** 2) / (bw * math.sqrt(2 * math.pi))).sum(axis=1)
+        return dens / (len(obs) + 1)
+
+
+def make_search(kind: str, grid: list = None, space: dict = None, candles: int = 0,
+                budget: int = OPT_SEARCH_BUDGET, known: dict = None, rng=None,
+                min_window: int = 150) -> ParamSearch:
+    """kind: "grid" | "halving" | "tpe" (см. OPT_SEARCH в config)"""
+    if kind == "grid":
+        return GridSearch(grid or [], known)
+    if kind == "halving":
+        return SuccessiveHalving(space, candles, budget, min_window=min_window, rng=rng, known=known)
+    if kind == "tpe":
+        return TPESearch(space, budget, rng=rng, known=known)
+    raise ValueError(f"Неизвестная стратегия поиска {kind}")
@@ -1,51 +1,158 @@
+import numpy as np
 from data_store import klines_cache, user_data_cache
 
+# Нереализованный PnL открытых позиций с трейлингом.
+# PositionPnL хранит состояние трейлинга по закрытым свечам с момента открытия позиции
+# (экстремум цены, активен ли трейлинг, зафиксированный TP/SL/трейлинг-выход) и догоняет
+# его только новыми свечами; текущая (незакрытая) свеча оценивается без изменения состояния.
+# vectorized_pnl - полный пересчёт сразу для всех позиций матрицей (позиции x свечи).
+# TP/SL/трейлинг перечитываются из позиции на каждом пересчёте (в обоих путях):
+# PositionBook двигает sl трейлинг-стопом прямо в той же записи.
+# Цены переводятся в "выгодные" единицы x = sign * price, тогда лонг и шорт считаются одинаково.
+
+TRAIL_ACTIVATION = 0.002
+
+
+def _position_params(pos: dict):
+    """(sign, entry, qty, tp, sl, trail) с теми же значениями по умолчанию, что у open_position"""
+    entry = pos["entry"]
+    sign = 1.0 if pos["side"] == "BUY" else -1.0
+    tp = pos.get("tp", entry * (1 + 0.01 * sign))
+    sl = pos.get("sl", entry * (1 - 0.02 * sign))
+    trail = pos.get("trail_percent", 0.5) / 100.0
+    return sign, entry, pos["qty"], tp, sl, trail
+
+
+class PositionPnL:
+    """Инкрементальный PnL одной позиции"""
+
+    def __init__(self, pos: dict):
+        self.pos = pos
+        self.sign, self.entry, self.qty, self.tp, self.sl, self.trail = _position_params(pos)
+        self.extreme = self.sign * self.entry
+        self.trailing = False
+        self.locked = None         # PnL, зафиксированный первым сработавшим событием
+        self.last_time = None      # open_time последней учтённой закрытой свечи
+
+    def _step(self, price: float):
+        """Один шаг по цене: (extreme, trailing, pnl события или None)"""
+        s, entry = self.sign, self.entry
+        x = s * price
+        extreme = max(self.extreme, x)
+        trailing = self.trailing or x >= s * entry * (1 + s * TRAIL_ACTIVATION)
+        if self.tp is not None and x >= s * self.tp:
+            return extreme, trailing, s * (self.tp - entry) * self.qty
+        if self.sl is not None and x <= s * self.sl:
+            return extreme, trailing, s * (self.sl - entry) * self.qty
+        if trailing and x < extreme * (1 - s * self.trail):
+            pnl = s * (price - entry) * self.qty
+            if pnl > 0:
+                return extreme, trailing, pnl
+        return extreme, trailing, None
+
+    def commit(self, price: float):
+        """Закрытая свеча - двигает состояние"""
+        if self.locked is None:
+            self.extreme, self.trailing, self.locked = self._step(price)
+
+    def evaluate(self, price: float) -> float:
+        """PnL при текущей цене, состояние не меняется"""
+        if self.locked is not None:
+            return self.locked
+        _, _, pnl = self._step(price)
+        return pnl if pnl is not None else self.sign * (price - self.entry) * self.qty
+
+    def sync(self, store) -> float:
+        """Догоняет закрытые свечи из store и оценивает последнюю"""
+        _, _, _, self.tp, self.sl, self.trail = _position_params(self.pos)
+        times = store.open_time
+        closes = store.close
+        start_time = self.pos.get("open_time", times[-1])
+        if self.last_time is not None:
+            start_time = max(start_time, self.last_time + 1)
+        first = int(np.searchsorted(times, start_time))
+        for i in range(first, len(times) - 1):
+            self.commit(float(closes[i]))
+            self.last_time = int(times[i])
+        return self.evaluate(float(closes[-1]))
+
+
+_states = {}  # symbol -> PositionPnL
+
+
 def simulate_realtime_pnl(symbol: str):
     pos = user_data_cache.get("positions", {}).get(symbol)
     if not pos:
+        _states.pop(symbol, None)
         return None
 
-    df = klines_cache.get(symbol)
-    if df is None or df.empty:
+    store = klines_cache.get(symbol)
+    if store is None or store.empty:
         return None
 
-    prices = df["Close"].to_numpy()
-    entry = pos["entry"]
-    qty = pos["qty"]
-    side = pos["side"]
-    tp = pos.get("tp", entry * (1.01 if side == "BUY" else 0.99))
-    sl = pos.get("sl", entry * (0.98 if side == "BUY" else 1.02))
-    trail_percent = pos.get("trail_percent", 0.5) / 100.0
-    trail_activation = 0.002
-    trailing_active = False
-
-    if side == "BUY":
-        max_price = entry
-        for price in prices:
-            max_price = max(max_price, price)
-            if not trailing_active and price >= entry * (1 + trail_activation):
-                trailing_active = True
-            if tp is not None and price >= tp:
-                return (tp - entry) * qty
-            if sl is not None and price <= sl:
-                return (sl - entry) * qty
-            if trailing_active and price < max_price * (1 - trail_percent):
-                pnl = (price - entry) * qty
-                if pnl > 0:
-                    return pnl
-        return (prices[-1] - entry) * qty
-    else:  # SELL
-        min_price = entry
-        for price in prices:
-            min_price = min(min_price, price)
-            if not trailing_active and price <= entry * (1 - trail_activation):
-                trailing_active = True
-            if tp is not None and tp <= price:
-                return (entry - tp) * qty
-            if sl is not None and price >= sl:
-                return (entry - sl) * qty
-            if trailing_active and price > min_price * (1 + trail_percent):
-                pnl = (entry - price) * qty
-                if pnl > 0:
-                    return pnl
-        return (entry - prices[-1]) * qty
+    state = _states.get(symbol)
+    if state is None or state.pos is not pos:
+        state = _states[symbol] = PositionPnL(pos)
+    return state.sync(store)
+
+
+def portfolio_unrealized(full: bool = False) -> float:
+    """Сумма нереализованного PnL по всем открытым позициям.
+    full - полный векторный пересчёт (batch_unrealized) вместо инкрементального"""
+    if full:
+        return sum(batch_unrealized().values())
+    total = 0.0
+    for symbol in list(user_data_cache.get("positions", {})):
+        pnl = simulate_realtime_pnl(symbol)
+        if pnl is not None:
+            total += pnl
+    return total
+
+
+def vectorized_pnl(sign, entry, qty, tp, sl, trail, prices) -> np.ndarray:
+    """Полный пересчёт для P позиций. Параметры - массивы (P,), tp/sl = NaN если не заданы;
+    prices (P, n) - цены с момента открытия, выровненные вправо (слева NaN)."""
+    sign, entry, qty = (np.asarray(a, dtype=np.float64)[:, None] for a in (sign, entry, qty))
+    tp, sl, trail = (np.asarray(a, dtype=np.float64)[:, None] for a in (tp, sl, trail))
+    x = sign * np.asarray(prices, dtype=np.float64)
+    base = sign * entry
+
+    extreme = np.fmax.accumulate(np.concatenate([base, x], axis=1), axis=1)[:, 1:]
+    with np.errstate(invalid="ignore"):
+        trailing = np.logical_or.accumulate(x >= base * (1 + sign * TRAIL_ACTIVATION), axis=1)
+        gain = (x - base) * qty
+        tp_hit = x >= sign * tp
+        sl_hit = x <= sign * sl
+        trail_hit = trailing & (x < extreme * (1 - sign * trail)) & (gain > 0)
+    event = tp_hit | sl_hit | trail_hit
+
+    rows = np.arange(len(x))
+    first = event.argmax(axis=1)
+    at_event = np.where(tp_hit[rows, first], sign[:, 0] * (tp[:, 0] - entry[:, 0]) * qty[:, 0],
+                        np.where(sl_hit[rows, first], sign[:, 0] * (sl[:, 0] - entry[:, 0]) * qty[:, 0],
+                                 gain[rows, first]))
+    return np.where(event.any(axis=1), at_event, gain[:, -1])
+
+
+def batch_unrealized(positions: dict = None) -> dict:
+    """PnL всех позиций одним векторным пересчётом: {symbol: pnl}.
+    TP/SL/трейлинг берутся из записей позиций на момент вызова"""
+    positions = user_data_cache.get("positions", {}) if positions is None else positions
+    rows, series = [], []
+    for symbol, pos in positions.items():
+        store = klines_cache.get(symbol)
+        if store is None or store.empty:
+            continue
+        first = int(np.searchsorted(store.open_time, pos.get("open_time", store.last_open_time)))
+        rows.append((symbol, _position_params(pos)))
+        series.append(store.close[first:])
+    if not rows:
+        return {}
+
+    width = max(len(s) for s in series)
+    prices = np.full((len(series), width), np.nan)
+    for i, s in enumerate(series):
+        prices[i, width - len(s):] = s
+    params = np.array([[np.nan if v is None else v for v in p] for _, p in rows], dtype=np.float64).T
+    pnl = vectorized_pnl(*params, prices)
+    return {symbol: float(v) for (symbol, _), v in zip(rows, pnl)}
@@ -1,7 +1,9 @@
-from data_store import klines_cache, user_data_cache
-from config import LEVERAGE, INITIAL_CASH, RISK_FRACTION, DRY_RUN
+from data_store import klines_cache, user_data_cache, get_strategy_state
+from config import LEVERAGE, INITIAL_CASH, RISK_FRACTION, DRY_RUN, MAX_OPEN_POSITIONS, ATR_PERIOD
 from utils import _quantize_to_step
+from indicators import get_indicators
 from logger import log_position
+from metrics import timed_call
 
 def get_open_positions():
     return user_data_cache.get("positions", {})
@@ -16,13 +18,18 @@ def calculate_qty(price: float, equity: float = None, risk_fraction: float = RIS
     return qty
 
 # Открыть сделку (только в DRY RUN)
+@timed_call("open_position")
 def open_position(symbol: str, side: str, equity: float = None, risk_fraction: float = RISK_FRACTION):
-    df = klines_cache.get(symbol)
-    if df is None or df.empty:
+    store = klines_cache.get(symbol)
+    if store is None or store.empty:
         print(f"[open_position] нет свечей для {symbol}")
         return None
+    positions = get_open_positions()
+    if symbol not in positions and len(positions) >= MAX_OPEN_POSITIONS:
+        print(f"[open_position] лимит открытых позиций ({MAX_OPEN_POSITIONS}), {symbol} пропущен")
+        return None
 
-    price = float(df["Close"].iloc[-1])
+    price = store.last_close
     if equity is None:
         equity = INITIAL_CASH
 
@@ -33,6 +40,16 @@ def open_position(symbol: str, side: str, equity: float = None, risk_fraction: f
     # тейк-профит и стоп-лосс
     tp = price * (1.01 if side.upper() == "BUY" else 0.99)
     sl = price * (0.98 if side.upper() == "BUY" else 1.02)
+    # стоп в ATR, если его подобрала оптимизация BBRSI (atr_stop в параметрах символа).
+    # Уровень тот же, что в бэктесте, но срабатывает иначе: в BBRSI_EMA_Strategy выход -
+    # по Close за уровнем на открытии следующей свечи, здесь это обычный sl: проверяется
+    # по текущей цене внутри свечи (check_positions) и дальше подтягивается трейлингом.
+    bbrsi = (get_strategy_state().params.get(symbol) or {}).get("BBRSI") or {}
+    period = bbrsi.get("atr_period", ATR_PERIOD)
+    if bbrsi.get("atr_stop") and len(store) >= period:
+        dist = bbrsi["atr_stop"] * get_indicators(symbol).atr(period).value
+        if dist > 0:
+            sl = price - dist if side.upper() == "BUY" else price + dist
 
     # трейлинг стоп (0.5%)
     trail_percent = 0.5
@@ -44,6 +61,7 @@ def open_position(symbol: str, side: str, equity: float = None, risk_fraction: f
         "tp": tp,
         "sl": sl,
         "trail_percent": trail_percent,
+        "open_time": store.last_open_time,  # с этой свечи считается трейлинг в pnl_utils
         "status": "OPEN"
     }
 
@@ -54,48 +72,35 @@ def open_position(symbol: str, side: str, equity: float = None, risk_fraction: f
     return pos_dict
 
 
-# Проверка сделки (DRY RUN)
-def check_position(symbol: str, price: float):
-    pos = user_data_cache.get("positions", {}).get(symbol)
-    if not pos or pos["status"] != "OPEN":
-        return
-
-    side = pos["side"]
-    sl = pos["sl"]
-    tp = pos["tp"]
-    trail = pos["trail_percent"]
-
-    reason = None
-
-    # --- трейлинг стоп ---
-    if side == "BUY":
-        new_sl = price * (1 - trail / 100)
-        if new_sl > sl:  # подтягиваем стоп
-            pos["sl"] = new_sl
-            print(f"[TRAIL] {symbol} stop moved to {new_sl:.2f}")
-    else:  # SELL
-        new_sl = price * (1 + trail / 100)
-        if new_sl < sl:
-            pos["sl"] = new_sl
-            print(f"[TRAIL] {symbol} stop moved to {new_sl:.2f}")
-
-    # --- TP / SL ---
-    if side == "BUY":
-        if tp is not None and price >= tp:
-            reason = "TP"
-        elif sl is not None and price <= sl:
-            reason = "SL"
-    else:  # SELL
-        if tp is not None and price <= tp:
-            reason = "TP"
-        elif sl is not None and price >= sl:
-            reason = "SL"
-
-    if reason:
+# Проверка сделок (DRY RUN): трейлинг и TP/SL по всем позициям книги одним векторным проходом
+def check_positions(prices: dict = None) -> list:
+    """prices - {symbol: цена}, по умолчанию последние close из klines_cache.
+    Сработавшие позиции помечаются status=CLOSED. Возвращает [(symbol, reason, price)]."""
+    book = user_data_cache.get("positions")
+    if not book:
+        return []
+    if prices is None:
+        prices = {s: klines_cache[s].last_close for s in book
+                  if s in klines_cache and not klines_cache[s].empty}
+    vector = book.price_vector(prices)
+    trailed, exits = book.evaluate(vector)
+    for symbol in trailed:
+        print(f"[TRAIL] {symbol} stop moved to {book[symbol]['sl']:.2f}")
+    closed = []
+    for symbol, reason in exits:
+        pos = book[symbol]
         pos["status"] = "CLOSED"
-        print(f"[DRY RUN] CLOSE {symbol} {side} @ {price} by {reason}")
+        price = prices[symbol]
+        print(f"[DRY RUN] CLOSE {symbol} {pos['side']} @ {price} by {reason}")
+        closed.append((symbol, reason, price))
+    return closed
+
+
+def check_position(symbol: str, price: float):
+    return check_positions({symbol: price})
 
 
+@timed_call("close_position")
 def close_position(symbol: str, exit_price: float, reason="DRY_RUN", exit_reason=None):
     pos = get_open_position(symbol)
     if not pos:
@@ -0,0 +1,208 @@
+from collections.abc import MutableMapping
+import numpy as np
+
+# Книга открытых позиций на NumPy-массивах: side/qty/entry/tp/sl/trail/open_time лежат
+# в непрерывных массивах по слотам символов. user_data_cache["positions"] - экземпляр
+# PositionBook, снаружи он ведёт себя как прежний dict {symbol: {...}}: позиция отдаётся
+# как PositionRecord (view на слот с __slots__, читается и пишется как dict).
+# evaluate() за один векторный проход подтягивает трейлинг-стопы и находит сработавшие
+# TP/SL для всех позиций сразу.
+
+NO_TIME = np.iinfo(np.int64).min  # open_time не задан
+FIELDS = ("side", "qty", "entry", "tp", "sl", "trail_percent", "open_time")
+
+
+class PositionRecord:
+    """Позиция в книге. После удаления из книги хранит копию значений и остаётся читаемой."""
+    __slots__ = ("_book", "_slot", "_detached")
+
+    def __init__(self, book, slot: int):
+        self._book = book
+        self._slot = slot
+        self._detached = None
+
+    def _detach(self):
+        self._detached = dict(self.items())
+        self._book = None
+
+    def __getitem__(self, key):
+        if self._detached is not None:
+            return self._detached[key]
+        book, i = self._book, self._slot
+        if key == "side":
+            return "BUY" if book.sign[i] > 0 else "SELL"
+        if key in ("qty", "entry"):
+            return float(getattr(book, key)[i])
+        if key == "trail_percent":
+            if np.isnan(book.trail[i]):
+                raise KeyError(key)
+            return float(book.trail[i])
+        if key in ("tp", "sl"):
+            v = getattr(book, key)[i]
+            return None if np.isnan(v) else float(v)
+        if key == "open_time":
+            if book.open_time[i] == NO_TIME:
+                raise KeyError(key)
+            return int(book.open_time[i])
+        return book.extras[i][key]
+
+    def __setitem__(self, key, value):
+        if self._detached is not None:
+            self._detached[key] = value
+        else:
+            self._book._set_field(self._slot, key, value)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        if self._detached is not None:
+            return list(self._detached)
+        book, i = self._book, self._slot
+        fields = [f for f in FIELDS if not (f == "open_time" and book.open_time[i] == NO_TIME
+                                            or f == "trail_percent" and np.isnan(book.trail[i]))]
+        return fields + list(book.extras[i])
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class PositionBook(MutableMapping):
+    def __init__(self, capacity: int = 64):
+        self.slots = {}         # symbol -> slot
+        self.symbols = []       # slot -> symbol или None
+        self.records = []       # slot -> PositionRecord
+        self.extras = []        # slot -> прочие ключи позиции (status, exit_reason, ...)
+        self._free = []
+        self.size = 0           # занятая часть массивов (включая освободившиеся слоты)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        old = self.size
+        def grow(name, dtype, fill):
+            arr = np.full(capacity, fill, dtype=dtype)
+            if old:
+                arr[:old] = getattr(self, name)[:old]
+            setattr(self, name, arr)
+        for name in ("qty", "entry", "tp", "sl", "trail"):
+            grow(name, np.float64, np.nan)
+        grow("sign", np.float64, 0.0)
+        grow("open_time", np.int64, NO_TIME)
+        grow("active", bool, False)   # слот занят
+        grow("closed", bool, False)   # status != "OPEN" - в проверках не участвует
+        self.capacity = capacity
+
+    def _set_field(self, i: int, key: str, value):
+        if key == "side":
+            self.sign[i] = 1.0 if str(value).upper() == "BUY" else -1.0
+        elif key == "open_time":
+            self.open_time[i] = NO_TIME if value is None else int(value)
+        elif key not in FIELDS:
+            self.extras[i][key] = value
+            if key == "status":
+                self.closed[i] = value != "OPEN"
+        else:
+            getattr(self, "trail" if key == "trail_percent" else key)[i] = np.nan if value is None else value
+
+    # ---------- dict-интерфейс ----------
+    def __getitem__(self, symbol):
+        return self.records[self.slots[symbol]]
+
+    def __setitem__(self, symbol, pos):
+        if symbol in self.slots:
+            del self[symbol]
+        if self._free:
+            i = self._free.pop()
+        else:
+            if self.size == self.capacity:
+                self._allocate(self.capacity * 2)
+            i = self.size
+            self.size += 1
+            self.symbols.append(None)
+            self.records.append(None)
+            self.extras.append(None)
+        self.sign[i] = 0.0
+        self.qty[i] = self.entry[i] = self.tp[i] = self.sl[i] = self.trail[i] = np.nan
+        self.open_time[i] = NO_TIME
+        self.closed[i] = False
+        self.extras[i] = {}
+        for key, value in dict(pos).items():
+            self._set_field(i, key, value)
+        self.active[i] = True
+        self.slots[symbol] = i
+        self.symbols[i] = symbol
+        self.records[i] = PositionRecord(self, i)
+
+    def __delitem__(self, symbol):
+        i = self.slots.pop(symbol)
+        self.records[i]._detach()
+        self.active[i] = False
+        self.symbols[i] = self.records[i] = self.extras[i] = None
+        self._free.append(i)
+
+    def __iter__(self):
+        return iter(list(self.slots))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, symbol):
+        return symbol in self.slots
+
+    def clear(self):
+        for symbol in list(self.slots):
+            del self[symbol]
+
+    def __repr__(self):
+        return repr({s: self.records[i].to_dict() for s, i in self.slots.items()})
+
+    # ---------- векторная проверка ----------
+    def price_vector(self, prices: dict) -> np.ndarray:
+        """{symbol: price} -> массив по слотам (NaN там, где цены нет)"""
+        out = np.full(self.size, np.nan)
+        for symbol, price in prices.items():
+            i = self.slots.get(symbol)
+            if i is not None and price is not None:
+                out[i] = price
+        return out
+
+    def evaluate(self, prices: np.ndarray):
+        """Трейлинг и TP/SL для всех позиций с ценой в prices (массив по слотам).
+        Сначала подтягивается стоп (как в check_position), потом проверяются выходы.
+        Возвращает (символы с подвинутым стопом, [(symbol, "TP"/"SL"), ...])."""
+        n = self.size
+        p = np.asarray(prices, dtype=np.float64)[:n]
+        s, sl, tp = self.sign[:n], self.sl[:n], self.tp[:n]
+        live = self.active[:n] & ~self.closed[:n] & ~np.isnan(p)
+        with np.errstate(invalid="ignore"):
+            new_sl = p * (1 - s * self.trail[:n] / 100)
+            # для шорта s = -1: "выгоднее" значит ниже, поэтому сравнение в единицах s * price
+            moved = live & (self.trail[:n] > 0) & (s * new_sl > s * sl)
+            sl[moved] = new_sl[moved]
+            x = s * p
+            tp_hit = live & (x >= s * tp)
+            sl_hit = live & ~tp_hit & (x <= s * sl)
+        symbols = self.symbols
+        trailed = [symbols[i] for i in np.flatnonzero(moved)]
+        exits = [(symbols[i], "TP") for i in np.flatnonzero(tp_hit)]
+        exits += [(symbols[i], "SL") for i in np.flatnonzero(sl_hit)]
+        return trailed, exits
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from config import (
+    POSITIONS_LOG_FILE, LOG_FLUSH_ENTRIES, LOG_FLUSH_INTERVAL, LOG_FSYNC, LOG_FSYNC_INTERVAL
+)
+
+# Журнал позиций (JSON Lines) с буферизованной записью и индексом-спутником.
+# Запись: в event loop записи копятся в буфере и сбрасываются фоновой задачей
+# по размеру (LOG_FLUSH_ENTRIES) или по времени (LOG_FLUSH_INTERVAL); fsync - по LOG_FSYNC.
+# Чтение: <log>.idx - записи фиксированной длины (ts, offset, length, crc32(symbol)),
+# поэтому "последние N" - один seek, а "символ X с момента T" - бинарный поиск по ts.
+# Индекс догоняет файл при первом обращении, если журнал дописывали без него.
+# Сброс буфера целиком (запись журнала, индекса и fsync) идёт в потоке; файлы журнала
+# и индекса защищены _io_lock. Недописанная после падения последняя строка отрезается
+# перед следующей записью, чтобы не склеиться с новой.
+
+INDEX_DTYPE = np.dtype([("ts", "<i8"), ("offset", "<i8"), ("length", "<u4"), ("sym", "<u4")])
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_io_lock = threading.RLock()
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def _symbol_key(symbol) -> int:
+    return zlib.crc32(str(symbol).encode("utf-8"))
+
+
+def _ts_ms(ts) -> int:
+    """ISO-время (str или datetime) -> мс epoch; без часового пояса считается UTC"""
+    try:
+        dt = ts if isinstance(ts, datetime) else datetime.fromisoformat(str(ts))
+    except (ValueError, TypeError):
+        return -1
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def _read_index(path: str):
+    ipath = index_path(path)
+    if not os.path.exists(ipath):
+        return np.empty(0, dtype=INDEX_DTYPE)
+    rows = os.path.getsize(ipath) // INDEX_DTYPE.itemsize
+    if rows == 0:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    return np.memmap(ipath, dtype=INDEX_DTYPE, mode="r", shape=(rows,))
+
+
+def _index_records(lines, offset: int, prev_ts: int = -1) -> np.ndarray:
+    """lines - список (entry, bytes) подряд начиная с offset"""
+    records = np.empty(len(lines), dtype=INDEX_DTYPE)
+    for i, (entry, raw) in enumerate(lines):
+        ts = _ts_ms(entry.get("timestamp")) if entry else -1
+        prev_ts = max(prev_ts, ts)  # ts в индексе неубывающий - для бинарного поиска
+        records[i] = (prev_ts, offset, len(raw), _symbol_key(entry.get("symbol")) if entry else 0)
+        offset += len(raw)
+    return records
+
+
+def sync_index(path: str = POSITIONS_LOG_FILE):
+    """Дописывает в индекс строки журнала, которых в нём ещё нет. Возвращает индекс."""
+    with _io_lock:
+        return _sync_index(path)
+
+
+def _sync_index(path: str):
+    idx = _read_index(path)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    end = int(idx["offset"][-1] + idx["length"][-1]) if len(idx) else 0
+    if end > size:
+        # журнал обрезали или заменили - перестраиваем индекс целиком
+        del idx
+        open(index_path(path), "wb").close()
+        idx, end = np.empty(0, dtype=INDEX_DTYPE), 0
+    if end == size:
+        return idx
+
+    lines = []
+    with open(path, "rb") as f:
+        f.seek(end)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # недописанная строка
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                entry = None
+            lines.append((entry, raw))
+    if lines:
+        prev_ts = int(idx["ts"][-1]) if len(idx) else -1
+        with open(index_path(path), "ab") as f:
+            f.write(_index_records(lines, end, prev_ts).tobytes())
+    return _read_index(path)
+
+
+def _repair_tail(path: str, block: int = 8192):
+    """Отрезает недописанную последнюю строку (падение посреди записи)"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r+b") as f:
+        pos = f.seek(0, os.SEEK_END)
+        if pos == 0:
+            return
+        f.seek(pos - 1)
+        if f.read(1) == b"\n":
+            return
+        end = pos
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            nl = f.read(step).rfind(b"\n")
+            if nl >= 0:
+                pos += nl + 1
+                break
+        print(f"[WARN] Журнал {path}: отрезана недописанная строка ({end - pos} байт)")
+        f.truncate(pos)
+
+
+def write_entries(path: str, entries: list):
+    """Синхронно дописывает записи в журнал и индекс (без fsync)"""
+    lines = [(e, (json.dumps(e, ensure_ascii=False) + "\n").encode("utf-8")) for e in entries]
+    with _io_lock:
+        _repair_tail(path)
+        idx = _sync_index(path)
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(b"".join(raw for _, raw in lines))
+        prev_ts = int(idx["ts"][-1]) if len(idx) else -1
+        with open(index_path(path), "ab") as f:
+            f.write(_index_records(lines, offset, prev_ts).tobytes())
+
+
+def _fsync(path: str):
+    for p in (path, index_path(path)):
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def tail_lines(path: str, n: int, block: int = 8192) -> list:
+    """Последние n строк файла чтением блоков с конца (без индекса)"""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return [line for line in data.splitlines() if line.strip()][-n:]
+
+
+def _read_span(f, records) -> list:
+    entries = []
+    for rec in records:
+        f.seek(int(rec["offset"]))
+        try:
+            entries.append(json.loads(f.read(int(rec["length"]))))
+        except ValueError:
+            pass
+    return entries
+
+
+def read_recent(limit: int = 50, path: str = POSITIONS_LOG_FILE) -> list:
+    if limit <= 0 or not os.path.exists(path):
+        return []
+    with _io_lock:
+        try:
+            recs = _sync_index(path)[-limit:]
+        except OSError as e:
+            print("[WARN] Индекс журнала недоступен, читаем хвост файла:", e)
+            return [json.loads(line) for line in tail_lines(path, limit)]
+        if not len(recs):
+            return []
+        start = int(recs["offset"][0])
+        end = int(recs["offset"][-1] + recs["length"][-1])
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def read_symbol(symbol: str, since=None, path: str = POSITIONS_LOG_FILE) -> list:
+    """Записи по символу, начиная с момента since (str / Timestamp / None)"""
+    if not os.path.exists(path):
+        return []
+    with _io_lock:
+        idx = _sync_index(path)
+        start = int(np.searchsorted(idx["ts"], _ts_ms(since), side="left")) if since is not None else 0
+        tail = idx[start:]
+        recs = tail[tail["sym"] == _symbol_key(symbol)]
+        with open(path, "rb") as f:
+            return [e for e in _read_span(f, recs) if e.get("symbol") == symbol]
+
+
+class PositionLogWriter:
+    """Буфер записей журнала с фоновым сбросом на диск"""
+
+    def __init__(self, path: str = POSITIONS_LOG_FILE):
+        self.path = path
+        self.pending = []
+        self.writing = []  # пачка, которую сейчас пишет поток (ещё может не быть в файле)
+        self._wakeup = asyncio.Event()
+        self._last_fsync = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    def append(self, entry: dict):
+        self.pending.append(entry)
+        if len(self.pending) >= LOG_FLUSH_ENTRIES:
+            self._wakeup.set()
+
+    def _write(self, batch: list):
+        with _io_lock:
+            write_entries(self.path, batch)
+            self.writing = []  # под той же блокировкой - читатель не увидит записи дважды
+
+    async def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.writing = batch
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except OSError as e:
+                print("Ошибка записи журнала позиций:", e)
+                self.writing = []
+                self.pending[:0] = batch
+                return
+        now = time.monotonic()
+        if LOG_FSYNC == "always" or (LOG_FSYNC == "periodic"
+                                     and now - self._last_fsync >= LOG_FSYNC_INTERVAL):
+            self._last_fsync = now
+            if os.path.exists(self.path):
+                await asyncio.to_thread(_fsync, self.path)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        if os.path.exists(self.path) and LOG_FSYNC != "never":
+            await asyncio.to_thread(_fsync, self.path)
+
+
+_writer = None
+_writer_loop = None
+
+
+def _get_writer():
+    global _writer, _writer_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    if _writer is None or _writer_loop is not loop:
+        _writer = PositionLogWriter()
+        _writer_loop = loop
+    return _writer
+
+
+def append_entry(entry: dict):
+    writer = _get_writer()
+    if writer is None:
+        write_entries(POSITIONS_LOG_FILE, [entry])
+        if LOG_FSYNC == "always":
+            _fsync(POSITIONS_LOG_FILE)
+    else:
+        writer.append(entry)
+
+
+def _unsaved() -> list:
+    """Записи, которых ещё нет в файле (вызывать под _io_lock)"""
+    return _writer.writing + _writer.pending if _writer is not None else []
+
+
+def recent_entries(limit: int = 50) -> list:
+    """Последние limit записей, включая ещё не сброшенные на диск"""
+    with _io_lock:
+        pending = _unsaved()
+        if len(pending) >= limit:
+            return list(pending[-limit:])
+        return read_recent(limit - len(pending)) + list(pending)
+
+
+def symbol_entries(symbol: str, since=None) -> list:
+    since_ms = _ts_ms(since) if since is not None else None
+    with _io_lock:
+        extra = [e for e in _unsaved() if e.get("symbol") == symbol
+                 and (since_ms is None or _ts_ms(e.get("timestamp")) >= since_ms)]
+        return read_symbol(symbol, since) + extra
+
+
+async def close_position_log():
+    global _writer, _writer_loop
+    writer = _writer
+    _writer = _writer_loop = None
+    if writer is not None:
+        await writer.close()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from config import (
+    USE_BBRSI, USE_BREAKOUT, BBRSI_PARAM_GRID, BREAKOUT_PARAM_GRID, OPTIMIZATION_WORKERS,
+    OPT_CACHE_ENABLED, REOPT_INTERVAL, REOPT_WINDOW_CANDLES, TOP_SYMBOLS
+)
+from data_store import StrategyState, get_strategy_state, set_strategy_state, save_strategy_state
+from optimization_cache import OptimizationCache
+from optimizer import optimize_symbols, klines_payload
+from telegram_bot import send_telegram_message
+
+# Фоновая переоптимизация по скользящему окну (walk-forward): раз в REOPT_INTERVAL
+# снимок последних REOPT_WINDOW_CANDLES свечей оптимизируется в пуле процессов
+# (ожидание - в отдельном потоке, event loop свободен), после чего параметры по символам
+# и набор торгуемых символов подменяются одним присваиванием StrategyState.
+
+
+def strategy_grids() -> dict:
+    grids = {}
+    if USE_BBRSI:
+        grids["BBRSI"] = BBRSI_PARAM_GRID
+    if USE_BREAKOUT:
+        grids["BREAKOUT"] = BREAKOUT_PARAM_GRID
+    return grids
+
+
+def rank_symbols(best: dict, symbols, grids: dict, top_n: int = TOP_SYMBOLS) -> list:
+    """[(symbol, суммарный equity по стратегиям), ...] - лучшие top_n"""
+    results = []
+    for symbol in symbols:
+        if symbol not in best:
+            print(f"[WARN] Нет данных по {symbol}")
+            continue
+        total_equity = 0.0
+        for name in grids:
+            params, equity = best[symbol].get(name, (None, 0.0))
+            if params:
+                total_equity += equity
+                print(f"[INFO] {symbol} {name} equity: {equity}")
+            else:
+                print(f"[ERROR] {name} бэктест {symbol} не дал результата")
+        results.append((symbol, total_equity))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:top_n]
+
+
+class ReoptimizationScheduler:
+    def __init__(self, symbols, interval: float = REOPT_INTERVAL,
+                 window: int = REOPT_WINDOW_CANDLES, top_n: int = TOP_SYMBOLS, on_state=None):
+        self.symbols = list(symbols)
+        self.on_state = on_state  # вызывается с новым StrategyState (раздача воркерам шардов)
+        self.interval = interval
+        self.window = window
+        self.top_n = top_n
+        self.progress = {"cycle": 0, "state": "idle", "done": 0, "total": 0,
+                         "started": None, "duration": None}
+
+    def _on_progress(self, done: int, total: int):
+        # вызывается из потока оптимизации - только простые присваивания
+        self.progress["done"] = done
+        self.progress["total"] = total
+
+    def _optimize(self, payload: dict, grids: dict) -> dict:
+        cache = OptimizationCache() if OPT_CACHE_ENABLED else None
+        try:
+            return optimize_symbols(list(payload), grids, workers=OPTIMIZATION_WORKERS, cache=cache,
+                                    payload=payload, in_process=False, progress=self._on_progress)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def run_once(self) -> StrategyState:
+        grids = strategy_grids()
+        payload = klines_payload(self.symbols, window=self.window)  # снимок в потоке loop
+        self.progress.update(cycle=self.progress["cycle"] + 1, state="running", done=0, total=0,
+                             started=time.time())
+        started = time.perf_counter()
+        try:
+            best = await asyncio.to_thread(self._optimize, payload, grids)
+        finally:
+            self.progress.update(state="idle", duration=time.perf_counter() - started)
+
+        top = rank_symbols(best, self.symbols, grids, self.top_n)
+        old = get_strategy_state()
+        if top:
+            symbols = frozenset(s for s, _ in top)
+            params = {s: {name: p for name, (p, _) in best[s].items()} for s in symbols}
+        else:
+            print(f"[WARN] Нет результатов оптимизации, берём первые {self.top_n} символов")
+            symbols, params = frozenset(self.symbols[:self.top_n]), {}
+        state = StrategyState(old.version + 1, symbols, params, time.time())
+        set_strategy_state(state)
+        try:
+            save_strategy_state(state, self.symbols)  # для быстрого старта / перезапуска
+        except OSError as e:
+            print("[WARN] Состояние стратегий не сохранено:", e)
+        if self.on_state is not None:
+            self.on_state(state)
+
+        added, removed = symbols - old.symbols, old.symbols - symbols
+        print(f"[reopt] цикл {self.progress['cycle']} за {self.progress['duration']:.1f} с, "
+              f"символы: {sorted(symbols)}")
+        if old.version and (added or removed):
+            send_telegram_message(f"🔄 Переоптимизация: +{sorted(added)} -{sorted(removed)}")
+        return state
+
+    async def run_forever(self, first_delay: float = None):
+        """first_delay - пауза до первого цикла (по умолчанию interval)"""
+        delay = self.interval if first_delay is None else first_delay
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.interval
+            try:
+                await self.run_once()
+            except Exception as e:
+                print("❌ Ошибка переоптимизации:", e)
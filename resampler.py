@@ -0,0 +1,144 @@
+import numpy as np
+from config import BASE_TIMEFRAME, DERIVED_TIMEFRAMES, TIMEFRAME, RESAMPLE_ENABLED
+from data_store import get_timeframe_store, resampler_cache
+from utils import interval_ms
+
+# Старшие таймфреймы из одного базового стрима (BASE_TIMEFRAME, обычно 1m).
+# На каждый таймфрейм хранится агрегат уже закрытых базовых свечей текущего бакета
+# (open, high, low, volume); текущая базовая свеча накладывается сверху, поэтому
+# обновление - O(1) на таймфрейм и одна запись в его KlineStore.
+# Бакеты выровнены по epoch (как у Binance для m/h/d).
+# TIMEFRAME собирается всегда, даже если его нет в DERIVED_TIMEFRAMES: иначе при
+# RESAMPLE_ENABLED у бота не было бы рабочих свечей вовсе.
+
+
+def target_timeframes(timeframe: str = TIMEFRAME, derived=DERIVED_TIMEFRAMES,
+                      base: str = BASE_TIMEFRAME) -> tuple:
+    """Таймфреймы резэмплера: DERIVED_TIMEFRAMES + TIMEFRAME (если это не сам базовый).
+    ValueError, если какой-то из них не собрать из базового"""
+    intervals = tuple(dict.fromkeys([*derived, timeframe]))
+    intervals = tuple(i for i in intervals if i != base)
+    for i in intervals:
+        if interval_ms(i) % interval_ms(base):
+            raise ValueError(f"Таймфрейм {i} не собирается из базового {base}")
+    return intervals
+
+
+TARGET_TIMEFRAMES = target_timeframes() if RESAMPLE_ENABLED else tuple(DERIVED_TIMEFRAMES)
+
+
+class _Target:
+    __slots__ = ("interval", "ms", "store", "bucket", "o", "h", "l", "v")
+
+    def __init__(self, interval: str, store):
+        self.interval = interval
+        self.ms = interval_ms(interval)
+        self.store = store
+        self.bucket = None
+        self.reset(None)
+
+    def reset(self, bucket):
+        self.bucket = bucket
+        self.o = None
+        self.h = -np.inf
+        self.l = np.inf
+        self.v = 0.0
+
+
+class SymbolResampler:
+    def __init__(self, symbol: str, intervals=TARGET_TIMEFRAMES, base: str = BASE_TIMEFRAME):
+        self.symbol = symbol
+        self.base = base
+        self.base_ms = interval_ms(base)
+        self.targets = [_Target(i, get_timeframe_store(symbol, i, create=True)) for i in intervals]
+        self.cur = None       # (t, o, h, l, c, v) текущей базовой свечи
+        self.folded = True    # текущая базовая свеча уже учтена в агрегатах
+
+    def _fold(self):
+        _, o, h, l, _, v = self.cur
+        for tg in self.targets:
+            if tg.o is None:
+                tg.o = o
+            tg.h = max(tg.h, h)
+            tg.l = min(tg.l, l)
+            tg.v += v
+        self.folded = True
+
+    def update(self, open_time: int, o: float, h: float, l: float, c: float, v: float,
+               closed: bool = False) -> list:
+        """Обновление базовой свечи. Возвращает [(interval, open_time, close, new_candle, closed)]
+        по затронутым таймфреймам; запоздавшие обновления старых базовых свечей пропускаются."""
+        if self.cur is not None:
+            if open_time < self.cur[0] or open_time == self.cur[0] and self.folded:
+                return []  # запоздавшая или уже закрытая и учтённая свеча (повтор после переподключения)
+            if open_time > self.cur[0] and not self.folded:
+                self._fold()  # закрытие предыдущей свечи не пришло (переподключение)
+        self.cur = (open_time, o, h, l, c, v)
+        self.folded = False
+
+        updates = []
+        base_end = open_time + self.base_ms
+        for tg in self.targets:
+            bucket = open_time - open_time % tg.ms
+            new_candle = bucket != tg.bucket
+            if new_candle:
+                tg.reset(bucket)
+            tg.store.update(bucket, o if tg.o is None else tg.o, max(tg.h, h), min(tg.l, l), c, tg.v + v)
+            updates.append((tg.interval, bucket, c, new_candle, closed and base_end >= bucket + tg.ms))
+        if closed:
+            self._fold()
+        return updates
+
+
+def resample_arrays(open_times, ohlcv, target_ms: int):
+    """Пакетная агрегация: (open_times (n,), ohlcv (n, 5)) -> то же для target_ms"""
+    open_times = np.asarray(open_times, dtype=np.int64)
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    if not len(open_times):
+        return open_times, ohlcv.reshape(0, 5)
+    buckets = open_times - open_times % target_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    out = np.column_stack([
+        ohlcv[starts, 0],
+        np.maximum.reduceat(ohlcv[:, 1], starts),
+        np.minimum.reduceat(ohlcv[:, 2], starts),
+        ohlcv[ends, 3],
+        np.add.reduceat(ohlcv[:, 4], starts),
+    ])
+    return buckets[starts], out
+
+
+def get_resampler(symbol: str) -> SymbolResampler:
+    resampler = resampler_cache.get(symbol)
+    if resampler is None:
+        resampler = resampler_cache[symbol] = SymbolResampler(symbol)
+    return resampler
+
+
+def seed_resampler(symbol: str) -> SymbolResampler:
+    """Готовит резэмплер после загрузки истории (history_loader.load_resampled_history):
+    таймфреймы без своей истории собираются из самого подробного загруженного более мелкого,
+    затем базовые свечи текущего бакета самого длинного таймфрейма прогоняются через update -
+    с них резэмплер продолжает живой стрим"""
+    base_store = get_timeframe_store(symbol, BASE_TIMEFRAME)
+    resampler = resampler_cache[symbol] = SymbolResampler(symbol)
+    if base_store is None or base_store.empty:
+        return resampler
+    sources = [(resampler.base_ms, base_store)] + [(tg.ms, tg.store) for tg in resampler.targets]
+    for tg in sorted(resampler.targets, key=lambda t: t.ms):
+        if not tg.store.empty:
+            continue
+        usable = [(len(store) * ms // tg.ms, ms, store) for ms, store in sources
+                  if ms < tg.ms and tg.ms % ms == 0 and not store.empty]
+        if usable:
+            _, _, store = max(usable, key=lambda x: x[:2])
+            times, candles = resample_arrays(store.open_time, store.ohlcv.T, tg.ms)
+            tg.store.extend(times, candles)
+    open_times, ohlcv = base_store.open_time, base_store.ohlcv.T
+    # состояние текущих бакетов: прогоняем базовые свечи самого длинного бакета
+    longest = max((tg.ms for tg in resampler.targets), default=resampler.base_ms)
+    first = int(np.searchsorted(open_times, open_times[-1] - open_times[-1] % longest))
+    for i in range(first, len(open_times)):
+        resampler.update(int(open_times[i]), *map(float, ohlcv[i]), closed=i < len(open_times) - 1)
+    return resampler
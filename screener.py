@@ -0,0 +1,106 @@
+import time
+import numpy as np
+from config import SCREENER_ROW_TTL
+
+# Скринер всего рынка: таблица на NumPy-массивах (цена, объём в котируемой валюте, high/low)
+# по слотам символов. Обновляется тикерами потока !ticker@arr (раз в секунду по изменившимся
+# символам) или REST-снимком futures_ticker - оба формата понимает update().
+# top() - фильтры MIN_PRICE/MIN_VOLUME/MAX_SPREAD_PERCENT масками и argpartition по объёму;
+# результат кешируется до следующего обновления таблицы.
+# Инкрементальный индекс по объёму (куча/сортированный список) здесь не нужен: фильтры
+# задаются в самом запросе, поэтому индекс всё равно пришлось бы обходить с проверкой
+# каждого символа, а update пришлось бы переставлять его на каждый тикер (!ticker@arr
+# шлёт почти весь рынок раз в секунду). Полный проход масками и argpartition по таблице
+# - ~20 мкс на 600 символов и ~50 мкс на 5000, и он считается не чаще раза на update.
+# Символы, по которым тикеров нет дольше SCREENER_ROW_TTL (делистинг, остановка торгов),
+# в top() не попадают - поток про них просто перестаёт сообщать.
+
+# поля тикера: поток (24hrTicker) и REST (/fapi/v1/ticker/24hr)
+_WS_FIELDS = ("s", "c", "q", "h", "l")
+_REST_FIELDS = ("symbol", "lastPrice", "quoteVolume", "highPrice", "lowPrice")
+
+
+class TickerScreener:
+    def __init__(self, quote: str = "USDT", capacity: int = 512, row_ttl: float = SCREENER_ROW_TTL):
+        self.quote = quote
+        self.row_ttl = row_ttl
+        self.slots = {}      # symbol -> slot
+        self.symbols = []    # slot -> symbol
+        self.size = 0
+        self.version = 0     # растёт при каждом update
+        self.updated = 0.0   # time.time() последнего update
+        self._top_key = None
+        self._top = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        for name in ("price", "volume", "high", "low", "seen"):
+            arr = np.zeros(capacity)
+            if self.size:
+                arr[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, arr)
+        quoted = np.zeros(capacity, dtype=bool)
+        if self.size:
+            quoted[:self.size] = self.quoted[:self.size]
+        self.quoted = quoted
+        self.capacity = capacity
+
+    def _slot(self, symbol: str) -> int:
+        i = self.slots.get(symbol)
+        if i is None:
+            if self.size == self.capacity:
+                self._allocate(self.capacity * 2)
+            i = self.slots[symbol] = self.size
+            self.symbols.append(symbol)
+            self.quoted[i] = self.quote in symbol
+            self.size += 1
+        return i
+
+    def update(self, tickers) -> int:
+        """Обновляет таблицу тикерами (список dict). Возвращает число принятых тикеров."""
+        count = 0
+        now = time.time()
+        for t in tickers:
+            fields = _WS_FIELDS if "s" in t else _REST_FIELDS
+            symbol = t.get(fields[0])
+            if not symbol:
+                continue
+            try:
+                values = [float(t.get(f, 0)) for f in fields[1:]]
+            except (TypeError, ValueError):
+                continue
+            i = self._slot(symbol)
+            self.price[i], self.volume[i], self.high[i], self.low[i] = values
+            self.seen[i] = now
+            count += 1
+        if count:
+            self.version += 1
+            self.updated = now
+        return count
+
+    def age(self) -> float:
+        """Секунд с последнего обновления (inf, если данных не было)"""
+        return time.time() - self.updated if self.updated else float("inf")
+
+    def top(self, n: int, min_price: float = 0.0, min_volume: float = 0.0,
+            max_spread_percent: float = 100.0) -> list:
+        """Лучшие n символов по объёму среди прошедших фильтры"""
+        key = (self.version, n, min_price, min_volume, max_spread_percent)
+        if key == self._top_key:
+            return list(self._top)
+        k = self.size
+        price, volume = self.price[:k], self.volume[:k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread = np.where(price > 0, (self.high[:k] - self.low[:k]) / price * 100, 100.0)
+        mask = self.quoted[:k] & (price >= min_price) & (volume >= min_volume) & (spread <= max_spread_percent)
+        mask &= self.seen[:k] >= self.updated - self.row_ttl  # давно без тикеров - выбыл
+        idx = np.flatnonzero(mask)
+        if len(idx) > n > 0:
+            idx = idx[np.argpartition(-volume[idx], n - 1)[:n]]
+        idx = idx[np.argsort(-volume[idx], kind="stable")][:max(n, 0)]
+        self._top = [self.symbols[i] for i in idx]
+        self._top_key = key
+        return list(self._top)
+
+
+screener = TickerScreener()
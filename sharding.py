@@ -0,0 +1,252 @@
+import asyncio
+import bisect
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import threading
+import numpy as np
+from config import SHARD_WORKERS, SHARD_VNODES, SHARD_WATCHDOG_INTERVAL, TIMEFRAME, KLINES_LIMIT
+from data_store import klines_cache, StrategyState, get_strategy_state, set_strategy_state
+from event_bus import bus, CANDLE_UPDATED, CANDLE_CLOSED
+from kline_store import KlineStore
+from shared_kline_store import SharedKlineStore
+from signals import get_signals
+
+# Многопроцессный режим (SHARD_WORKERS > 0):
+#   ingest   - один процесс: история + стримы свечей, пишет в SharedKlineStore (shared memory)
+#              и пересылает события свечей воркеру-владельцу символа;
+#   shard-N  - воркеры: символы распределены консистентным хешированием (HashRing); под
+#              seqlock копируют изменившиеся свечи из общей памяти в свой буфер (_Mirror)
+#              и уже по копии считают сигналы (get_signals) - индикаторы не видят
+#              недописанных свечей;
+#   главный  - координатор: владеет книгой позиций и лимитами риска, получает события
+#              вместе с готовыми снимками сигналов (CandleEvent.signals) и прогоняет их через
+#              свою шину событий - on_candle_update / on_candle_closed сигналы не пересчитывают.
+# Процессы стартуют через spawn, блоки памяти создаёт и удаляет координатор.
+# Координатор следит за процессами (watch): если ingest или воркер умер, бросается
+# исключение и бот перезапускается целиком - иначе его символы молча замолкают.
+
+BATCH = 1000  # событий за одну выборку из очереди воркера
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хеширование: при смене числа воркеров переезжает ~1/N символов"""
+
+    def __init__(self, nodes: int, vnodes: int = SHARD_VNODES):
+        points = sorted((_hash(f"{node}:{v}"), node) for node in range(nodes) for v in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def node(self, key: str) -> int:
+        return self._nodes[bisect.bisect(self._keys, _hash(key)) % len(self._keys)]
+
+
+# ---------- ingest ----------
+def _ingest_main(symbols, names, worker_queues, ready):
+    try:
+        asyncio.run(_ingest(symbols, names, worker_queues, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _ingest(symbols, names, worker_queues, ready):
+    from main import start_symbols  # история + стримы - как в однопроцессном режиме
+
+    shared = {s: SharedKlineStore.attach(names[s]) for s in symbols}
+    klines_cache.update(shared)  # резэмплер пишет TIMEFRAME сразу в общую память
+    ring = HashRing(len(worker_queues))
+
+    def forward(event):
+        if event.interval == TIMEFRAME:
+            worker_queues[ring.node(event.symbol)].put(event)
+
+    bus.clear()
+    bus.subscribe(CANDLE_UPDATED, forward)
+    bus.subscribe(CANDLE_CLOSED, forward)
+    tasks = await start_symbols(symbols)
+    for s, store in shared.items():
+        local = klines_cache.get(s)
+        if local is not None and local is not store:
+            # load_history положил историю в свой буфер - переносим в общий
+            store.clear()
+            store.extend(local.open_time, local.ohlcv.T)
+        klines_cache[s] = store
+    ready.set()
+    await asyncio.gather(*tasks)
+
+
+# ---------- воркер ----------
+def _read_changes(store, last_time, rewrites):
+    """Копия свечей store начиная с last_time (весь буфер, если были перезаписи или буфер
+    не продолжает копию). Без побочных эффектов - можно повторять под seqlock.
+    -> (full, rewrites, open_times, ohlcv (n, 5))"""
+    times = store.open_time
+    full = last_time is None or store.rewrites != rewrites
+    start = 0
+    if not full:
+        start = int(np.searchsorted(times, last_time))
+        if start >= len(times) or times[start] != last_time:
+            full, start = True, 0
+    return full, store.rewrites, np.array(times[start:]), np.array(store.ohlcv[:, start:].T)
+
+
+class _Mirror:
+    """Локальная копия SharedKlineStore воркера: догоняется согласованными кусками"""
+
+    def __init__(self, shared: SharedKlineStore):
+        self.shared = shared
+        self.local = KlineStore(capacity=shared.capacity)
+        self.rewrites = None
+
+    def sync(self) -> KlineStore:
+        local = self.local
+        last = None if local.empty else local.last_open_time
+        full, self.rewrites, times, ohlcv = self.shared.read_consistent(
+            lambda: _read_changes(self.shared, last, self.rewrites))
+        if full:
+            local.clear()
+            local.extend(times, ohlcv)
+        else:
+            for t, row in zip(times, ohlcv):
+                local.update(int(t), *row)
+        return local
+
+
+def _worker_main(index, names, in_queue, out_queue, state):
+    stores = {s: SharedKlineStore.attach(n) for s, n in names.items()}
+    mirrors = {s: _Mirror(store) for s, store in stores.items()}
+    klines_cache.update({s: m.local for s, m in mirrors.items()})  # сигналы - по копиям
+    set_strategy_state(state)
+    print(f"[shard-{index}] символов: {len(stores)}")
+
+    while True:
+        batch = [in_queue.get()]
+        try:
+            while len(batch) < BATCH:
+                batch.append(in_queue.get_nowait())
+        except queue.Empty:
+            pass
+        pending = {}
+        for item in batch:
+            if item is None:
+                return
+            if isinstance(item, StrategyState):
+                set_strategy_state(item)
+                continue
+            # обновления одной и той же свечи схлопываются до последнего
+            key = (item.symbol, item.kind, item.open_time)
+            prev = pending.pop(key, None)
+            if prev is not None and prev.new_candle:
+                item = item._replace(new_candle=True)
+            pending[key] = item
+        for event in pending.values():
+            mirror = mirrors.get(event.symbol)
+            if mirror is None:
+                continue
+            mirror.sync()
+            out_queue.put(event._replace(signals=get_signals(event.symbol)))
+
+
+# ---------- координатор ----------
+class ShardedRuntime:
+    def __init__(self, symbols, workers: int = SHARD_WORKERS):
+        self.symbols = list(symbols)
+        self.workers = max(1, workers)
+        self.ring = HashRing(self.workers)
+        self.prefix = f"bb{os.getpid()}"
+        self.ctx = mp.get_context("spawn")
+        self.worker_queues = [self.ctx.Queue() for _ in range(self.workers)]
+        self.decisions = self.ctx.Queue()
+        self.ready = self.ctx.Event()
+        self.stores = {}
+        self.processes = []
+        self.stats = {"events": 0}
+
+    def shards(self) -> dict:
+        """{номер воркера: [символы]}"""
+        out = {i: [] for i in range(self.workers)}
+        for s in self.symbols:
+            out[self.ring.node(s)].append(s)
+        return out
+
+    def start(self):
+        for s in self.symbols:
+            store = self.stores[s] = SharedKlineStore.create(f"{self.prefix}_{s}", KLINES_LIMIT)
+            klines_cache[s] = store  # координатор читает ту же память (позиции, переоптимизация)
+        names = {s: store.name for s, store in self.stores.items()}
+        state = get_strategy_state()
+        for i, own in self.shards().items():
+            self.processes.append(self.ctx.Process(
+                target=_worker_main, name=f"shard-{i}", daemon=True,
+                args=(i, {s: names[s] for s in own}, self.worker_queues[i], self.decisions, state)))
+        self.processes.append(self.ctx.Process(
+            target=_ingest_main, name="ingest", daemon=True,
+            args=(self.symbols, names, self.worker_queues, self.ready)))
+        for p in self.processes:
+            p.start()
+        print(f"✅ Шарды: {len(self.symbols)} символов на {self.workers} воркерах + ingest")
+
+    async def wait_ready(self):
+        """Ждёт, пока ingest загрузит историю"""
+        ingest = self.processes[-1]
+        while not await asyncio.to_thread(self.ready.wait, 0.5):
+            if not ingest.is_alive():
+                raise RuntimeError(f"ingest-процесс завершился (код {ingest.exitcode})")
+
+    def dead(self) -> list:
+        """[(имя, код выхода)] завершившихся процессов"""
+        return [(p.name, p.exitcode) for p in self.processes if not p.is_alive()]
+
+    async def watch(self, interval: float = SHARD_WATCHDOG_INTERVAL):
+        """Проверяет процессы каждые interval с; RuntimeError, если какой-то завершился"""
+        while True:
+            await asyncio.sleep(interval)
+            dead = self.dead()
+            if dead:
+                raise RuntimeError("процессы шардов завершились: " +
+                                   ", ".join(f"{name} (код {code})" for name, code in dead))
+
+    def broadcast_state(self, state: StrategyState):
+        for q in self.worker_queues:
+            q.put(state)
+
+    async def run(self):
+        """События от воркеров (с готовым снимком сигналов в CandleEvent.signals) -> шина"""
+        loop = asyncio.get_running_loop()
+        inbox = asyncio.Queue()
+
+        def pump():
+            # mp.Queue блокирующая - читаем в потоке и передаём в event loop
+            while True:
+                item = self.decisions.get()
+                loop.call_soon_threadsafe(inbox.put_nowait, item)
+                if item is None:
+                    return
+
+        threading.Thread(target=pump, name="shard-decisions", daemon=True).start()
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            self.stats["events"] += 1
+            await bus.publish(item)
+
+    def stop(self):
+        if self.processes and self.processes[-1].is_alive():
+            self.processes[-1].terminate()  # ingest - единственный писатель, останавливаем первым
+        for q in self.worker_queues:
+            q.put(None)
+        self.decisions.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        for s, store in self.stores.items():
+            klines_cache.pop(s, None)
+            store.release()
+        self.stores.clear()
@@ -0,0 +1,126 @@
+from multiprocessing import shared_memory
+import numpy as np
+from config import KLINES_LIMIT
+from kline_store import KlineStore, COLUMNS
+
+# KlineStore в multiprocessing.shared_memory: один процесс пишет (ingest), остальные
+# подключаются по имени и читают те же массивы без копирования.
+# Блок памяти: заголовок int64[HEADER] | open time int64[2 * capacity] | данные float64[5, 2 * capacity].
+# Счётчики буфера (_pos, _len, revision, ...) живут в заголовке, поэтому видны всем процессам.
+# Запись защищена seqlock: seq нечётный, пока идёт запись; читатель повторяет чтение,
+# если seq изменился (см. read_consistent).
+
+HEADER = 8
+_CAPACITY, _SEQ, _POS, _LEN, _REVISION, _REWRITES, _UPDATED = range(7)
+NO_TIME = np.iinfo(np.int64).min
+
+
+def _header_field(index: int):
+    def getter(self):
+        return int(self._header[index])
+
+    def setter(self, value):
+        self._header[index] = value
+    return property(getter, setter)
+
+
+def _writer(method):
+    """Публичная запись - одна транзакция seqlock (вложенные вызовы не считаются)"""
+    def wrapper(self, *args, **kwargs):
+        if self._writing:
+            return method(self, *args, **kwargs)
+        self._writing = True
+        self._header[_SEQ] += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._header[_SEQ] += 1
+            self._writing = False
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+class SharedKlineStore(KlineStore):
+    _pos = _header_field(_POS)
+    _len = _header_field(_LEN)
+    revision = _header_field(_REVISION)
+    rewrites = _header_field(_REWRITES)
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self._writing = False
+        self._header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        capacity = int(self._header[_CAPACITY])
+        self.capacity = capacity
+        offset = HEADER * 8
+        self._time = np.ndarray((2 * capacity,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 2 * capacity * 8
+        self._data = np.ndarray((len(COLUMNS), 2 * capacity), dtype=np.float64, buffer=shm.buf,
+                                offset=offset)
+
+    @staticmethod
+    def nbytes(capacity: int) -> int:
+        return (HEADER + 2 * capacity + len(COLUMNS) * 2 * capacity) * 8
+
+    @classmethod
+    def create(cls, name: str, capacity: int = KLINES_LIMIT):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.nbytes(capacity))
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY] = capacity
+        header[_UPDATED] = NO_TIME
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        # дочерние процессы multiprocessing делят resource_tracker с создателем,
+        # поэтому повторная регистрация блока безвредна, а удаляет его только владелец
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def updated_open_time(self):
+        v = int(self._header[_UPDATED])
+        return None if v == NO_TIME else v
+
+    @updated_open_time.setter
+    def updated_open_time(self, value):
+        self._header[_UPDATED] = NO_TIME if value is None else value
+
+    @property
+    def seq(self) -> int:
+        return int(self._header[_SEQ])
+
+    append = _writer(KlineStore.append)
+    update = _writer(KlineStore.update)
+    extend = _writer(KlineStore.extend)
+    clear = _writer(KlineStore.clear)
+
+    def read_consistent(self, fn, retries: int = 5):
+        """fn() по согласованному состоянию: повтор, если во время чтения шла запись"""
+        for _ in range(retries):
+            seq = self.seq
+            if seq % 2 == 0:
+                result = fn()
+                if self.seq == seq:
+                    return result
+        return fn()
+
+    def release(self):
+        """Отключиться от блока (владелец ещё и удаляет его)"""
+        self._header = self._time = self._data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # где-то ещё живут view на буфер - память освободится при выходе процесса
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,94 @@
+from typing import NamedTuple
+from data_store import klines_cache, signals_cache, get_strategy_state
+from indicators import get_indicators
+from metrics import timed
+from config import BBRSI_DEFAULT_PARAMS, BREAKOUT_DEFAULT_PARAMS
+
+# Единый расчёт сигналов BBRSI и пробоя для всех потребителей (обработчики событий свечей,
+# check_entry_signal). Снимок считается один раз на (open time, revision буфера, параметры)
+# и отдаётся из signals_cache, пока свеча не изменилась.
+# Параметры - по символу из StrategyState (их подменяет reoptimizer), по умолчанию - из config
+# (те же, что у классов стратегий; backtesting на горячем пути не импортируется).
+
+cache_stats = {"hits": 0, "misses": 0}
+
+
+class SignalSnapshot(NamedTuple):
+    symbol: str
+    open_time: int
+    revision: int
+    price: float
+    bbrsi: str        # "BUY" / "SELL" / None
+    breakout: str     # "BUY" / "SELL" / None
+    lower: float
+    upper: float
+    rsi: float
+    highest: float
+    lowest: float
+    period: int
+
+    @property
+    def signal(self):
+        """Пробой перекрывает BBRSI"""
+        return self.breakout or self.bbrsi
+
+
+def strategy_params(symbol: str = None) -> tuple:
+    """Параметры символа из активного StrategyState, иначе значения по умолчанию стратегий"""
+    params = get_strategy_state().params.get(symbol) or {}
+    bbrsi = params.get("BBRSI") or {}
+    breakout = params.get("BREAKOUT") or {}
+    return (bbrsi.get("bol_period", BBRSI_DEFAULT_PARAMS["bol_period"]),
+            bbrsi.get("bol_dev", BBRSI_DEFAULT_PARAMS["bol_dev"]),
+            bbrsi.get("rsi_period", BBRSI_DEFAULT_PARAMS["rsi_period"]),
+            breakout.get("period", BREAKOUT_DEFAULT_PARAMS["period"]))
+
+
+def _compute(symbol: str, store, params: tuple) -> SignalSnapshot:
+    bol_period, bol_dev, rsi_period, period = params
+    ind = get_indicators(symbol)
+    close = store.close
+    price = float(close[-1])
+    nan = float("nan")
+
+    bbrsi = None
+    lower = upper = rsi_val = nan
+    if len(store) > 2:
+        bb = ind.bollinger(bol_period, bol_dev)
+        lower, upper = bb.lband, bb.hband
+        rsi_val = ind.rsi(rsi_period).value
+        if close[-2] > lower and close[-1] < lower and rsi_val < 30:
+            bbrsi = "BUY"
+        elif close[-2] < upper and close[-1] > upper and rsi_val > 70:
+            bbrsi = "SELL"
+
+    breakout = None
+    highest = lowest = nan
+    if len(store) > period + 2:
+        highest = ind.highest(period).prev
+        lowest = ind.lowest(period).prev
+        if price > highest:
+            breakout = "BUY"
+        elif price < lowest:
+            breakout = "SELL"
+
+    return SignalSnapshot(symbol, store.last_open_time, store.revision, price, bbrsi, breakout,
+                          lower, upper, rsi_val, highest, lowest, period)
+
+
+def get_signals(symbol: str):
+    """Снимок сигналов по последней свече символа или None, если свечей нет"""
+    store = klines_cache.get(symbol)
+    if store is None or store.empty:
+        return None
+    params = strategy_params(symbol)
+    key = (store.last_open_time, store.revision, params)
+    cached = signals_cache.get(symbol)
+    if cached is not None and cached[0] == key:
+        cache_stats["hits"] += 1
+        return cached[1]
+    cache_stats["misses"] += 1
+    with timed("signals", symbol):
+        snapshot = _compute(symbol, store, params)
+    signals_cache[symbol] = (key, snapshot)
+    return snapshot
@@ -1,47 +1,75 @@
-import pandas as pd
 from backtesting import Strategy
-from utils import ema200, bol_h, bol_l, rsi
+from indicator_cache import get_matrix
 from pos_manager import calculate_qty
-from config import RISK_FRACTION
+from config import RISK_FRACTION, ATR_PERIOD, BBRSI_DEFAULT_PARAMS, BREAKOUT_DEFAULT_PARAMS
+
+# Индикаторы берутся из общей матрицы окна (indicator_cache.get_matrix): при оптимизации
+# каждый ряд (индикатор, период) считается один раз на все комбинации параметров.
 
 def adjust_size_for_backtest(size):
     return size if size < 1 else max(1, int(size))
 
+def _series(arr):
+    return arr
+
+def _matrix(data):
+    return get_matrix(data.High, data.Low, data.Close)
+
 class BBRSI_EMA_Strategy(Strategy):
-    bol_period = 40
-    bol_dev = 2
-    rsi_period = 14
+    bol_period = BBRSI_DEFAULT_PARAMS["bol_period"]
+    bol_dev = BBRSI_DEFAULT_PARAMS["bol_dev"]
+    rsi_period = BBRSI_DEFAULT_PARAMS["rsi_period"]
+    atr_stop = 0      # стоп в ATR от цены сигнала: закрытие по Close за уровнем, 0 - без стопа
+    atr_period = ATR_PERIOD
 
     def init(self):
-        self.bol_h = self.I(bol_h, self.data.Close, self.bol_period, self.bol_dev)
-        self.bol_l = self.I(bol_l, self.data.Close, self.bol_period, self.bol_dev)
-        self.rsi = self.I(rsi, self.data.Close, self.rsi_period)
-        self.ema200 = self.I(ema200, self.data.Close)
+        m = _matrix(self.data)
+        self.bol_h = self.I(_series, m.bol_h(self.bol_period, self.bol_dev), name="bol_h")
+        self.bol_l = self.I(_series, m.bol_l(self.bol_period, self.bol_dev), name="bol_l")
+        self.rsi = self.I(_series, m.rsi(self.rsi_period), name="rsi")
+        self.ema200 = self.I(_series, m.ema(200), name="ema200")
+        if self.atr_stop:
+            self.atr = self.I(_series, m.atr(self.atr_period), name="atr")
+        self.stop_price = None
+
+    def _set_stop(self, price, sign):
+        dist = self.atr_stop * self.atr[-1] if self.atr_stop else 0
+        self.stop_price = price - sign * dist if dist > 0 else None
 
     def next(self):
         price = float(self.data.Close[-1])
+        if self.position and self.stop_price is not None:
+            if self.position.is_long and price < self.stop_price or self.position.is_short and price > self.stop_price:
+                self.position.close()
+                self.stop_price = None
+                return
         size = adjust_size_for_backtest(calculate_qty(price, self.equity, RISK_FRACTION))
         if price > self.ema200[-1]:
             if self.data.Close[-3] > self.bol_l[-3] and self.data.Close[-2] < self.bol_l[-2] and self.rsi[-1] < 30:
                 if not self.position:
                     self.buy(size=size)
+                    self._set_stop(price, 1)
                 elif self.position.is_short:
                     self.position.close()
                     self.buy(size=size)
+                    self._set_stop(price, 1)
         elif price < self.ema200[-1]:
             if self.data.Close[-3] < self.bol_h[-3] and self.data.Close[-2] > self.bol_h[-2] and self.rsi[-1] > 70:
                 if not self.position:
                     self.sell(size=size)
+                    self._set_stop(price, -1)
                 elif self.position.is_long:
                     self.position.close()
                     self.sell(size=size)
+                    self._set_stop(price, -1)
 
 class Breakout_Strategy(Strategy):
-    period = 20
+    period = BREAKOUT_DEFAULT_PARAMS["period"]
 
     def init(self):
-        self.highest = self.I(lambda x: pd.Series(x).rolling(self.period).max(), self.data.High)
-        self.lowest = self.I(lambda x: pd.Series(x).rolling(self.period).min(), self.data.Low)
+        m = _matrix(self.data)
+        self.highest = self.I(_series, m.highest(self.period), name="highest")
+        self.lowest = self.I(_series, m.lowest(self.period), name="lowest")
 
     def next(self):
         price = float(self.data.Close[-1])
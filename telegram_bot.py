@@ -1,11 +1,28 @@
+import asyncio
+import json
+import re
 import time
-import requests
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+import aiohttp
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_QUEUE_SIZE, TELEGRAM_BATCH_WINDOW,
+    TELEGRAM_MIN_INTERVAL, TELEGRAM_FLUSH_TIMEOUT
+)
 
-def send_telegram_message(text: str):
-    if not TELEGRAM_BOT_TOKEN:
-        print("[Telegram disabled] " + text)
-        return
+# Уведомления не должны тормозить торговлю: внутри event loop send_telegram_message
+# только кладёт текст в очередь, а фоновая задача склеивает всплески в одно сообщение,
+# держит лимит Telegram на чат и при переполнении очереди отбрасывает лишнее (со сводкой).
+
+MAX_MESSAGE_LEN = 4096  # лимит Telegram на длину текста
+_MARKDOWN_ESCAPE = re.compile(r"\\([_*\[\]()~`>#+\-=|{}.!])")
+
+
+def unescape_markdown(text: str) -> str:
+    """Убирает экранирование logger.escape_markdown - для отправки простым текстом"""
+    return _MARKDOWN_ESCAPE.sub(r"\1", text)
+
+
+def _send_sync(text: str):
+    import requests
     try:
         url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
         data = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "Markdown"}
@@ -17,7 +34,185 @@ def send_telegram_message(text: str):
     except Exception as e:
         print(f"Ошибка отправки Telegram: {e}")
 
+
+class TelegramNotifier:
+    """Очередь уведомлений с фоновой отправкой через одну aiohttp-сессию"""
+
+    def __init__(self, token: str = TELEGRAM_BOT_TOKEN, chat_id: int = TELEGRAM_CHAT_ID,
+                 previous: "TelegramNotifier" = None):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.queue = asyncio.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+        self.sent = 0
+        self.dropped = 0
+        self._reported = 0      # сколько отброшенных уже упомянуто в сводке
+        self._carry = []        # тексты, забранные из очереди, но ещё не отправленные
+        self._last_send = 0.0
+        self._session = None
+        if previous is not None:
+            # замена упавшего notifier: забираем неотправленное вместе с очередью
+            self.queue, self._carry = previous.queue, previous._carry
+            self.sent, self.dropped, self._reported = previous.sent, previous.dropped, previous._reported
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, text: str) -> bool:
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def _fill(self):
+        while len(self._carry) < TELEGRAM_QUEUE_SIZE:
+            try:
+                self._carry.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    def _batch(self):
+        """Начало _carry, которое влезает в одно сообщение до MAX_MESSAGE_LEN. Возвращает (parts, count)"""
+        parts = []
+        if self.dropped > self._reported:
+            parts.append(f"⚠️ Очередь Telegram переполнена, пропущено сообщений: "
+                         f"{self.dropped - self._reported}")
+        size = sum(len(p) + 2 for p in parts)
+        count = 0
+        for text in self._carry:
+            if count and size + len(text) > MAX_MESSAGE_LEN:
+                break
+            text = text[:max(MAX_MESSAGE_LEN - size, 0)]
+            parts.append(text)
+            size += len(text) + 2
+            count += 1
+        return parts, count
+
+    async def _post(self, text: str, parse_mode: str = "Markdown"):
+        """Отправка с повтором при 429 и сетевых ошибках. Возвращает HTTP-статус (None - не дошли)"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=2, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=10))
+        data = {"chat_id": self.chat_id, "text": text}
+        if parse_mode:
+            data["parse_mode"] = parse_mode
+        status = None
+        for attempt in range(3):
+            wait = self._last_send + TELEGRAM_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_send = time.monotonic()
+            try:
+                async with self._session.post(self.url, data=data) as resp:
+                    status = resp.status
+                    if status == 200:
+                        self.sent += 1
+                        print("✅ Telegram sent:", text)
+                        return status
+                    raw = await resp.text()
+                    try:
+                        body = json.loads(raw)
+                    except ValueError:
+                        body = {}  # не JSON - например, HTML-страница 502 от прокси
+                    if status != 429:
+                        print(f"Ошибка Telegram: {status} {body or raw[:200]}")
+                        return status
+                    retry_after = ((body.get("parameters") or {}).get("retry_after", 1)
+                                   if isinstance(body, dict) else 1)
+                    print(f"Telegram: лимит, повтор через {retry_after} с")
+                    await asyncio.sleep(retry_after)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Ошибка отправки Telegram: {e!r}")
+                await asyncio.sleep(1)
+        return status
+
+    async def _send_batch(self):
+        dropped = self.dropped
+        parts, count = self._batch()
+        try:
+            if await self._post("\n\n".join(parts)) == 400:
+                # ошибка разметки в одном из сообщений не должна терять всю пачку:
+                # каждое - снова Markdown, и только не прошедшее - простым текстом
+                for part in parts:
+                    if len(parts) == 1 or await self._post(part) == 400:
+                        await self._post(unescape_markdown(part), parse_mode=None)
+        finally:
+            del self._carry[:count]
+            self._reported = dropped
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._carry:
+                    self._carry.append(await self.queue.get())
+                    await asyncio.sleep(TELEGRAM_BATCH_WINDOW)  # собираем всплеск
+                self._fill()
+                await self._send_batch()
+            except Exception as e:
+                print(f"Ошибка фоновой отправки Telegram: {e!r}")
+                await asyncio.sleep(1)
+
+    async def close(self, timeout: float = TELEGRAM_FLUSH_TIMEOUT):
+        """Досылает очередь (не дольше timeout) и закрывает сессию"""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+        async def flush():
+            self._fill()
+            while self._carry or self.dropped > self._reported:
+                await self._send_batch()
+                self._fill()
+        try:
+            await asyncio.wait_for(flush(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Telegram: не досланы {len(self._carry) + self.queue.qsize()} сообщений")
+        if self._session is not None:
+            await self._session.close()
+
+
+_notifier = None
+_notifier_loop = None
+
+
+def get_notifier():
+    """Notifier текущего event loop (после перезапуска main_async создаётся заново)"""
+    global _notifier, _notifier_loop
+    loop = asyncio.get_running_loop()
+    if _notifier is None or _notifier_loop is not loop:
+        _notifier = TelegramNotifier()
+        _notifier_loop = loop
+    elif _notifier._task.done():
+        # фоновая задача всё-таки завершилась - новая забирает неотправленные сообщения
+        print("Telegram: задача отправки остановилась, перезапуск")
+        dead = _notifier
+        _notifier = TelegramNotifier(previous=dead)
+        if dead._session is not None:
+            loop.create_task(dead._session.close())
+    return _notifier
+
+
+async def close_notifier():
+    global _notifier, _notifier_loop
+    notifier = _notifier
+    _notifier = _notifier_loop = None
+    if notifier is not None:
+        await notifier.close()
+
+
+def send_telegram_message(text: str):
+    if not TELEGRAM_BOT_TOKEN:
+        print("[Telegram disabled] " + text)
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # вне event loop (например, listen_channel) - отправляем сразу
+        _send_sync(text)
+        return
+    get_notifier().submit(text)
+
 def get_updates(offset=None):
+    import requests
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
     params = {"timeout": 10}
     if offset:
@@ -0,0 +1,80 @@
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("websockets")
+
+import binance_client
+from exchange_sim import ExchangeSimulator
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_combined_stream_urls_chunking():
+    streams = [f"s{i}usdt@kline_1m" for i in range(5)]
+    urls = binance_client.combined_stream_urls(streams, per_connection=2, base_url="ws://host")
+    assert urls == [
+        "ws://host/stream?streams=s0usdt@kline_1m/s1usdt@kline_1m",
+        "ws://host/stream?streams=s2usdt@kline_1m/s3usdt@kline_1m",
+        "ws://host/stream?streams=s4usdt@kline_1m",
+    ]
+    assert binance_client.combined_stream_urls([], per_connection=2, base_url="ws://host") == []
+
+
+async def _wait_for(predicate, timeout: float = 10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "не дождались"
+        await asyncio.sleep(0.05)
+
+
+def test_multiplexed_streams_against_simulator():
+    async def scenario():
+        port = _free_port()
+        sim = ExchangeSimulator(symbols=5, history=10, speed=4, seed=3)
+        server = asyncio.create_task(sim.serve("127.0.0.1", port))
+        symbols = sorted(sim.feeds)
+        received = {s: [] for s in symbols}
+
+        def collector(symbol):
+            async def handler(data):
+                received[symbol].append(data)
+            return handler
+
+        # у последнего символа нет обработчика - его сообщения диспетчер пропускает
+        handlers = {s: collector(s) for s in symbols[:-1]}
+        tasks = []
+        try:
+            await asyncio.sleep(0.2)  # сервер поднимается
+            tasks = await binance_client.start_multiplexed_websockets(
+                symbols, interval=sim.interval, handlers=handlers, per_connection=2,
+                base_url=f"ws://127.0.0.1:{port}")
+            # 5 стримов по 2 на соединение -> 3 соединения и один диспетчер
+            assert len(tasks) == 4
+            await _wait_for(lambda: sim.stats["connections"] == 3 and len(sim.connections) == 3)
+            await _wait_for(lambda: all(received[s] for s in symbols[:-1]))
+
+            for symbol in symbols[:-1]:
+                assert {d["s"] for d in received[symbol]} == {symbol}
+                assert all(d["e"] == "kline" for d in received[symbol])
+            assert received[symbols[-1]] == []
+
+            # разрыв всех соединений: ридеры переподключаются, поток не теряется
+            before = {s: len(received[s]) for s in symbols[:-1]}
+            await sim.disconnect_all()
+            await _wait_for(lambda: sim.stats["connections"] == 6 and len(sim.connections) == 3)
+            await _wait_for(lambda: all(len(received[s]) > before[s] for s in symbols[:-1]))
+            assert all(not t.done() for t in tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+
+    asyncio.run(scenario())
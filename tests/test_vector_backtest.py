@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("backtesting")
+
+import optimizer
+import pos_manager
+import vector_backtest
+
+
+def _klines(n: int = 1500, seed: int = 7) -> pd.DataFrame:
+    """Тренд с волнами и шумом - обе стратегии успевают открыть и перевернуть позиции"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    close = 100 * np.exp(0.0002 * t + 0.08 * np.sin(t / 40) + np.cumsum(rng.normal(0, 0.006, n)))
+    open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.001, n))
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    index = pd.date_range("2024-01-01", periods=n, freq="5min")
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.uniform(1, 10, n),
+    }, index=index)
+
+
+@pytest.fixture(autouse=True)
+def leverage_1(monkeypatch):
+    # при LEVERAGE=5 ордер на equity * RISK_FRACTION * LEVERAGE не проходит по марже
+    # (margin=1) и брокер отменяет все сделки - сравнивать было бы нечего
+    monkeypatch.setattr(vector_backtest, "LEVERAGE", 1)
+    monkeypatch.setattr(pos_manager, "LEVERAGE", 1)
+
+
+@pytest.mark.parametrize("strategy, grid", [
+    ("BBRSI", [
+        {"bol_period": 20, "bol_dev": 1, "rsi_period": 12},
+        {"bol_period": 25, "bol_dev": 1.5, "rsi_period": 14},
+        {"bol_period": 20, "bol_dev": 1, "rsi_period": 12, "atr_stop": 1.5},
+        {"bol_period": 25, "bol_dev": 1.5, "rsi_period": 14, "atr_stop": 1},
+    ]),
+    ("BREAKOUT", [{"period": p} for p in (10, 15, 20, 30)]),
+])
+def test_run_grid_matches_fractional_backtest(strategy, grid):
+    df = _klines()
+    vector = vector_backtest.run_grid(df, strategy, grid)
+    strategy_class = optimizer.get_strategy_class(strategy)
+    trades = 0
+    for params, equity in zip(grid, vector):
+        stats = optimizer.run_backtest(df, strategy_class, params)
+        trades += stats["# Trades"]
+        assert equity == pytest.approx(stats["Equity Final [$]"], rel=1e-9, abs=1e-6), params
+    assert trades > 0
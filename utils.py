@@ -1,37 +1,50 @@
-import pandas as pd
 import numpy as np
-import ta
 from decimal import Decimal, ROUND_DOWN
 
+# pandas и ta импортируются в самих индикаторах: горячему пути (interval_ms,
+# _quantize_to_step) они не нужны
+
 def ema200(arr):
+    import pandas as pd
     s = pd.Series(arr)
     return s.ewm(span=200, adjust=False).mean().to_numpy()
 
 def bol_h(arr, period=40, dev=2):
+    import pandas as pd, ta
     s = pd.Series(arr) if not isinstance(arr, pd.Series) else arr
     bb = ta.volatility.BollingerBands(s, window=period, window_dev=dev)
     return bb.bollinger_hband().to_numpy()
 
 def bol_l(arr, period=40, dev=2):
+    import pandas as pd, ta
     s = pd.Series(arr) if not isinstance(arr, pd.Series) else arr
     bb = ta.volatility.BollingerBands(s, window=period, window_dev=dev)
     return bb.bollinger_lband().to_numpy()
 
 def rsi(arr, period=14):
+    import pandas as pd, ta
     s = pd.Series(arr) if not isinstance(arr, pd.Series) else arr
     return ta.momentum.RSIIndicator(s, window=period).rsi().to_numpy()
 
 def atr(arr_high, arr_low, arr_close, period=14):
+    import pandas as pd, ta
     df = pd.DataFrame({"high": arr_high, "low": arr_low, "close": arr_close})
     return ta.volatility.AverageTrueRange(df["high"], df["low"], df["close"], window=period).average_true_range().to_numpy()
 
+_INTERVAL_UNITS_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+def interval_ms(interval: str) -> int:
+    """Длительность интервала Binance ("1m", "5m", "1h", "4h", "1d") в миллисекундах"""
+    return int(interval[:-1]) * _INTERVAL_UNITS_MS[interval[-1]]
+
 def _quantize_to_step(value: float, step: float) -> float:
     d_val = Decimal(str(value))
     d_step = Decimal(str(step))
     steps = (d_val / d_step).to_integral_value(rounding=ROUND_DOWN)
     return float(steps * d_step)
 
-def clean_klines(df: pd.DataFrame) -> pd.DataFrame:
+def clean_klines(df: "pd.DataFrame") -> "pd.DataFrame":
+    import pandas as pd
     if df is None or df.empty:
         return pd.DataFrame()
     df = df.dropna(subset=["Open", "High", "Low", "Close", "Volume"])
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+from config import INITIAL_CASH, COMMISSION, RISK_FRACTION, LEVERAGE, ATR_PERIOD
+from indicator_cache import IndicatorMatrix, get_matrix
+
+# Векторный бэктест BBRSI_EMA_Strategy и Breakout_Strategy сразу для всей сетки параметров.
+# Сигналы считаются матрицами (params x bars), позиции/комиссия/equity - операциями над
+# вектором параметров, причём только на барах, где у какой-то комбинации есть сигнал.
+# Семантика повторяет FractionalBacktest(cash, margin=1, commission, finalize_trades=True):
+# цены в сатоши, рыночные ордера исполняются по Open следующего бара, ордер без маржи
+# отменяется брокером, в конце позиция закрывается по Open последнего бара.
+# Стоп по ATR (atr_stop в параметрах BBRSI): уровень от Close бара сигнала, закрытие
+# рыночным ордером после Close за уровнем - бары срабатывания ищутся при открытии позиции.
+# Ряды индикаторов - из матрицы окна (indicator_cache), общей с FractionalBacktest.
+
+FRACTIONAL_UNIT = 1 / 100e6
+
+
+def _warmup(*indicators) -> int:
+    """Как backtesting._indicator_warmup_nbars: первый не-NaN индекс самого медленного индикатора"""
+    return max(int(np.isnan(ind).argmin()) for ind in indicators)
+
+
+def _shift(arr, k):
+    """arr[..., i - k] на позиции i (NaN в начале)"""
+    out = np.full(arr.shape, np.nan)
+    out[..., k:] = arr[..., :-k]
+    return out
+
+
+def bbrsi_signals(close: np.ndarray, grid: list, matrix: IndicatorMatrix = None):
+    """close - уже в масштабе FRACTIONAL_UNIT. Возвращает (long, short, start)"""
+    n = len(close)
+    m = matrix if matrix is not None else IndicatorMatrix(close, close, close)
+    ema = m.ema(200)
+    lower = np.empty((len(grid), n))
+    upper = np.empty((len(grid), n))
+    rsi_m = np.empty((len(grid), n))
+    start = np.empty(len(grid), dtype=np.int64)
+    for p, params in enumerate(grid):
+        lower[p] = m.bol_l(params["bol_period"], params["bol_dev"])
+        upper[p] = m.bol_h(params["bol_period"], params["bol_dev"])
+        rsi_m[p] = m.rsi(params["rsi_period"])
+        start[p] = 1 + _warmup(lower[p], upper[p], rsi_m[p], ema)
+
+    close_1, close_2 = _shift(close, 1), _shift(close, 2)
+    with np.errstate(invalid="ignore"):
+        long_sig = ((close > ema)
+                    & (close_2 > _shift(lower, 2)) & (close_1 < _shift(lower, 1))
+                    & (rsi_m < 30))
+        short_sig = ((close < ema)
+                     & (close_2 < _shift(upper, 2)) & (close_1 > _shift(upper, 1))
+                     & (rsi_m > 70))
+    return long_sig, short_sig, start
+
+
+def atr_stops(matrix: IndicatorMatrix, grid: list):
+    """Расстояние до стопа (params x bars): atr_stop * ATR, NaN - без стопа. None, если стопов нет"""
+    if not any(params.get("atr_stop") for params in grid):
+        return None
+    stop = np.full((len(grid), len(matrix.close)), np.nan)
+    for p, params in enumerate(grid):
+        if params.get("atr_stop"):
+            stop[p] = params["atr_stop"] * matrix.atr(params.get("atr_period", ATR_PERIOD))
+    stop[~(stop > 0)] = np.nan
+    return stop
+
+
+def breakout_signals(high: np.ndarray, low: np.ndarray, close: np.ndarray, grid: list,
+                     matrix: IndicatorMatrix = None):
+    n = len(close)
+    m = matrix if matrix is not None else IndicatorMatrix(high, low, close)
+    highest = np.empty((len(grid), n))
+    lowest = np.empty((len(grid), n))
+    start = np.empty(len(grid), dtype=np.int64)
+    for p, params in enumerate(grid):
+        highest[p] = m.highest(params["period"])
+        lowest[p] = m.lowest(params["period"])
+        start[p] = 1 + _warmup(highest[p], lowest[p])
+    with np.errstate(invalid="ignore"):
+        long_sig = close > _shift(highest, 1)
+        short_sig = ~long_sig & (close < _shift(lowest, 1))
+    return long_sig, short_sig, start
+
+
+def simulate(open_, close, long_sig, short_sig, start, cash=INITIAL_CASH, commission=COMMISSION,
+             stop=None):
+    """Симуляция позиций для всех параметров сразу. Цены - в масштабе FRACTIONAL_UNIT.
+    stop - расстояния до стопа (atr_stops) или None. Возвращает массив Equity Final [$]
+    по строкам сигналов."""
+    P, n = long_sig.shape
+    bars_idx = np.arange(n)
+    active = bars_idx >= start[:, None]
+    long_sig = long_sig & active
+    short_sig = short_sig & active
+
+    cash_ = np.full(P, float(cash))
+    size = np.zeros(P)   # со знаком, в единицах FRACTIONAL_UNIT
+    entry = np.zeros(P)
+    pend_close = np.zeros(P, dtype=bool)
+    pend_size = np.zeros(P)
+    pend_level = np.full(P, np.nan)  # уровень стопа для ордера в очереди
+    stop_bar = np.full(P, n)         # бар срабатывания стопа открытой позиции
+
+    def set_stops(idx, b):
+        for p in idx:
+            level = pend_level[p]
+            if np.isnan(level):
+                stop_bar[p] = n
+                continue
+            hit = close[b:] < level if size[p] > 0 else close[b:] > level
+            j = int(hit.argmax())
+            stop_bar[p] = b + j if hit[j] else n
+
+    def execute(price, b=None, close_all=False):
+        nonlocal pend_close, pend_size
+        # закрытие позиции (position.close() / finalize_trades)
+        closing = (pend_close | close_all) & (size != 0)
+        if closing.any():
+            cash_[closing] += (size[closing] * (price - entry[closing])
+                               - np.abs(size[closing]) * price * commission)
+            size[closing] = 0
+            entry[closing] = 0
+        # новые рыночные ордера
+        ordering = pend_size != 0
+        if ordering.any():
+            ns = pend_size[ordering]
+            apc = price + (np.abs(ns) * price * commission) / np.abs(ns)
+            # к этому моменту позиция по этим строкам уже закрыта, margin_available = cash
+            margin = np.maximum(0, cash_[ordering])
+            relative = np.abs(ns) < 1
+            ns = np.where(relative, np.copysign(np.floor((margin * np.abs(ns)) // apc), ns), ns)
+            ok = (ns != 0) & ~(np.abs(ns) * apc > margin)
+            idx = np.flatnonzero(ordering)[ok]
+            size[idx] = ns[ok]
+            entry[idx] = price
+            cash_[idx] -= np.abs(ns[ok]) * price * commission
+            if stop is not None and b is not None:
+                set_stops(idx, b)
+        pend_close = np.zeros(P, dtype=bool)
+        pend_size = np.zeros(P)
+
+    signal_bars = np.flatnonzero((long_sig | short_sig).any(axis=0))
+    bars = np.union1d(signal_bars, signal_bars + 1)
+    bars = bars[bars < n]
+    is_signal = np.zeros(n, dtype=bool)
+    is_signal[signal_bars] = True
+
+    snap_bars, snap_cash, snap_size, snap_entry = [], [], [], []
+    i, b = 0, -1
+    while True:
+        # следующий бар: сигнал (или исполнение после него), исполнение стопа, срабатывание стопа
+        candidates = []
+        if i < len(bars):
+            candidates.append(bars[i])
+        if stop is not None:
+            if pend_close.any():
+                candidates.append(b + 1)
+            held = size != 0
+            if held.any():
+                candidates.append(stop_bar[held].min())
+        if not candidates:
+            break
+        b = int(min(candidates))
+        if b >= n:
+            break
+        while i < len(bars) and bars[i] <= b:
+            i += 1
+        if pend_close.any() or (pend_size != 0).any():
+            execute(open_[b], b)
+        snap_bars.append(b)
+        snap_cash.append(cash_.copy())
+        snap_size.append(size.copy())
+        snap_entry.append(entry.copy())
+        stopping = np.zeros(P, dtype=bool)
+        if stop is not None:
+            stopping = (size != 0) & (stop_bar == b)
+            stop_bar[stopping] = n
+            pend_close = stopping
+        if not is_signal[b]:
+            continue
+        price = close[b]
+        equity = cash_ + (price * size - size * entry)
+        qty = np.maximum(1e-8, (equity * RISK_FRACTION * LEVERAGE) / price)
+        qty = np.where(qty < 1, qty, np.maximum(1, np.floor(qty)))
+        buy = long_sig[:, b] & (size <= 0) & ~stopping
+        sell = short_sig[:, b] & (size >= 0) & ~stopping
+        pend_close = stopping | (buy & (size < 0)) | (sell & (size > 0))
+        pend_size = np.where(buy, qty, np.where(sell, -qty, 0.0))
+        if stop is not None:
+            pend_level = np.where(buy, price - stop[:, b], np.where(sell, price + stop[:, b], np.nan))
+
+    # кривая equity по снимкам состояния - для проверки "кончились деньги"
+    if snap_bars:
+        k = np.searchsorted(np.array(snap_bars), bars_idx, side="right") - 1
+        known = k >= 0
+        k = np.maximum(k, 0)
+        c = np.array(snap_cash).T[:, k]
+        s = np.array(snap_size).T[:, k]
+        e = np.array(snap_entry).T[:, k]
+        eq_curve = np.where(known, c + (close * s - s * e), float(cash))
+        broke = ((eq_curve <= 0) & active).any(axis=1)
+    else:
+        broke = np.zeros(P, dtype=bool)
+
+    # finalize_trades: закрытие по Open последнего бара + ордера последней итерации
+    execute(open_[n - 1], close_all=True)
+    final = cash_ + (close[n - 1] * size - size * entry)
+    final = np.where(broke | (final <= 0), 0.0, final)
+    return np.where(start < n, final, float(cash))
+
+
+def run_grid(df: pd.DataFrame, strategy: str, grid: list, cash=INITIAL_CASH, commission=COMMISSION):
+    """Equity Final [$] для каждой комбинации grid. strategy: "BBRSI" или "BREAKOUT"."""
+    o = df["Open"].to_numpy(dtype=np.float64) * FRACTIONAL_UNIT
+    h = df["High"].to_numpy(dtype=np.float64) * FRACTIONAL_UNIT
+    l = df["Low"].to_numpy(dtype=np.float64) * FRACTIONAL_UNIT
+    c = df["Close"].to_numpy(dtype=np.float64) * FRACTIONAL_UNIT
+    matrix = get_matrix(h, l, c)  # ряды индикаторов окна - общие для всех вызовов по нему
+    stop = None
+    if strategy == "BBRSI":
+        long_sig, short_sig, start = bbrsi_signals(c, grid, matrix)
+        stop = atr_stops(matrix, grid)
+    elif strategy == "BREAKOUT":
+        long_sig, short_sig, start = breakout_signals(h, l, c, grid, matrix)
+    else:
+        raise ValueError(f"Нет векторной версии стратегии {strategy}")
+    return simulate(o, c, long_sig, short_sig, start, cash, commission, stop)